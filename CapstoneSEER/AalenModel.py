@@ -0,0 +1,246 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+def model_key(model):
+    ''' model_key(model)
+        params: model - fitted AalenModel, AalenFitter, lifelines AalenAdditiveFitter or CoxFitter
+        returns: hex string that identifies the fit by its hazards, the 'key' in the model's meta when
+                 it has one so a saved or coarsened model keeps the key of the fit it came from
+    '''
+    meta = getattr(model, 'meta', None) or {}
+    if 'key' in meta:
+        return meta['key']
+
+    if hasattr(model, 'cumulative_hazards_'):
+        frames = [model.cumulative_hazards_]
+    else:
+        frames = [model.baseline_cumulative_hazard_, model.params_.to_frame()]
+
+    h = hashlib.sha1()
+    for frame in frames:
+        h.update(','.join(map(str, frame.columns)).encode())
+        h.update(np.ascontiguousarray(frame.index.values, dtype=np.float64).tobytes())
+        # float32 so a model saved as float32 has the same key as the one in memory
+        h.update(np.ascontiguousarray(frame.values, dtype=np.float32).tobytes())
+
+    return h.hexdigest()
+
+
+def intercept_position(columns, fit_intercept):
+    ''' intercept_position(columns, fit_intercept)
+        params: columns - covariate names in fit order
+                fit_intercept - the fitter added its own column of ones
+        returns: position of the fitter's column of ones in columns, None if it has none.  AalenFitter and
+                 lifelines 0.8 call it 'baseline', lifelines 0.30 calls it 'Intercept' and puts it after
+                 the covariates, so after patsy's own 'Intercept' when the frame already had one
+    '''
+    if not fit_intercept:
+        return None
+
+    columns = list(columns)
+    for name in ('baseline', 'Intercept'):
+        if name in columns:
+            return len(columns) - 1 - columns[::-1].index(name)
+
+    return None
+
+
+def design_rows(X, columns, fit_intercept):
+    ''' design_rows(X, columns, fit_intercept)
+        params: X - dataframe with the covariate columns, or numpy array with the columns in fit order,
+                    with or without the fitter's own intercept
+                columns - covariate names in fit order, including the fitter's intercept if fit_intercept
+                fit_intercept - the fitter added its own column of ones, see intercept_position()
+        returns: numpy array of rows to multiply with the cumulative hazards, and the row index
+    '''
+    pos = intercept_position(columns, fit_intercept)
+
+    if isinstance(X, pd.DataFrame):
+        cols = [c for i, c in enumerate(columns) if i != pos]
+        index = X.index
+        X = X[cols].values.astype(np.float64)
+    else:
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        index = np.arange(len(X))
+        # rows that already have every column are used as they are
+        if X.shape[1] == len(columns):
+            pos = None
+
+    if pos is not None:
+        X = np.insert(X, pos, 1., axis=1)
+
+    return X, index
+
+
+class AalenModel(object):
+    ''' a fitted lifelines AalenAdditiveFitter reduced to what prediction needs, the covariate names,
+        the event times and the cumulative hazards of every covariate.
+
+        saved as an uncompressed .npz so loading is a few reads with no training data, no lifelines
+        fit state and no pickle.  the predict functions return the same frames as the fitter's.
+    '''
+
+    def __init__(self, columns, timeline, cumulative_hazards, fit_intercept=True, meta=None):
+        ''' params: columns - covariate names in fit order, including the fitter's intercept if fit_intercept
+                    timeline - event times
+                    cumulative_hazards - array of event times x covariates
+                    fit_intercept - the fitter added its own column of ones, see intercept_position()
+                    meta - dict stored with the model, i.e. the settings it was fit with
+        '''
+        self.fit_intercept = bool(fit_intercept)
+        self.meta = meta or {}
+        self.cumulative_hazards_ = pd.DataFrame(np.asarray(cumulative_hazards, dtype=np.float64),
+                                                index=np.asarray(timeline, dtype=np.float64), columns=list(columns))
+
+    @classmethod
+    def from_fitter(cls, aaf, meta=None):
+        ''' from_fitter(aaf, meta)
+            params: aaf - fitted AalenFitter or lifelines AalenAdditiveFitter
+                    meta - dict stored with the model
+            returns: AalenModel with the fitter's cumulative hazards
+        '''
+        ch = aaf.cumulative_hazards_
+        return cls(ch.columns, ch.index.values, ch.values, getattr(aaf, 'fit_intercept', False), meta)
+
+    def coarsen(self, knots):
+        ''' coarsen(knots)
+            params: knots - months to keep, i.e. from TimeGrid.grid_knots()
+            returns: AalenModel with the cumulative hazards at the knots, stepped like the full model
+                     and ending at the last event time so the expected survival covers the same months
+        '''
+        ch = self.cumulative_hazards_
+        t = ch.index.values
+        knots = np.asarray(knots, dtype=np.float64)
+        knots = np.unique(np.r_[knots[knots < t[-1]], t[-1]])
+
+        # value at the last event time at or before each knot, 0 before the first event
+        idx = np.searchsorted(t, knots, side='right') - 1
+        values = np.where(idx[:, np.newaxis] >= 0, ch.values[np.maximum(idx, 0)], 0.)
+
+        return AalenModel(ch.columns, knots, values, self.fit_intercept, dict(self.meta, time_grid=knots.tolist()))
+
+    def save(self, fname, dtype=None):
+        ''' save(fname, dtype)
+            write the model to a .npz file, see load()
+
+            params: dtype - type the cumulative hazards are stored as, None stores a model on a time grid
+                            as float32 and a full resolution one as float64
+        '''
+        ch = self.cumulative_hazards_
+        if dtype is None:
+            dtype = np.float32 if 'time_grid' in self.meta else np.float64
+
+        with open(fname, 'wb') as f:
+            np.savez(f, columns=np.array(ch.columns, dtype=str), timeline=ch.index.values, cumulative_hazards=ch.values.astype(dtype),
+                     fit_intercept=np.array(self.fit_intercept), meta=np.array(json.dumps(self.meta, default=str)))
+
+    @classmethod
+    def load(cls, fname):
+        ''' load(fname)
+            returns: AalenModel read from a file written by save()
+        '''
+        with np.load(fname) as f:
+            return cls(f['columns'], f['timeline'], f['cumulative_hazards'], bool(f['fit_intercept']), json.loads(str(f['meta'])))
+
+    def _design(self, X):
+        return design_rows(X, self.cumulative_hazards_.columns, self.fit_intercept)
+
+    def predict_cumulative_hazard(self, X):
+        ''' predict_cumulative_hazard(X)
+            params: X - dataframe with the covariate columns, or numpy array with the columns in fit order
+            returns: dataframe of cumulative hazard, one row per event time and one column per patient
+        '''
+        X, index = self._design(X)
+        return pd.DataFrame(np.dot(self.cumulative_hazards_.values, X.T), index=self.cumulative_hazards_.index, columns=index)
+
+    def predict_survival_function(self, X):
+        ''' returns: dataframe of survival, one row per event time and one column per patient '''
+        return np.exp(-self.predict_cumulative_hazard(X))
+
+    def predict_expectation(self, X):
+        ''' returns: dataframe of the expected lifetime of every patient, area under the survival function '''
+        S = self.predict_survival_function(X)
+        # trapezoid rule over the event times
+        dt = np.diff(S.index.values)
+        return pd.DataFrame(np.dot(dt, (S.values[1:] + S.values[:-1]) / 2), index=S.columns)
+
+
+class AalenBootstrap(object):
+    ''' cumulative hazards of Aalen models refit on bootstrap resamples of the cohort, all on one timeline,
+        made by Bootstrap.fit_bootstrap().
+
+        the replicates are one array of replicates x event times x covariates, so the survival of a
+        patient under every replicate is one matrix product and intervals for later patients cost no
+        refitting.  saved as an .npz with the hazards as float32.
+    '''
+
+    def __init__(self, columns, timeline, cumulative_hazards, fit_intercept=True, meta=None):
+        ''' params: columns - covariate names in fit order, including the fitter's intercept if fit_intercept
+                    timeline - event times shared by all replicates
+                    cumulative_hazards - array of replicates x event times x covariates
+                    fit_intercept - the fitter added its own column of ones, see intercept_position()
+                    meta - dict stored with the replicates, i.e. the settings they were fit with
+        '''
+        self.columns = list(columns)
+        self.timeline = np.asarray(timeline, dtype=np.float64)
+        self.cumulative_hazards = np.asarray(cumulative_hazards, dtype=np.float32)
+        self.fit_intercept = bool(fit_intercept)
+        self.meta = meta or {}
+
+    def save(self, fname):
+        ''' save(fname)
+            write the replicates to a .npz file, see load()
+        '''
+        with open(fname, 'wb') as f:
+            np.savez(f, columns=np.array(self.columns, dtype=str), timeline=self.timeline, cumulative_hazards=self.cumulative_hazards,
+                     fit_intercept=np.array(self.fit_intercept), meta=np.array(json.dumps(self.meta, default=str)))
+
+    @classmethod
+    def load(cls, fname):
+        ''' load(fname)
+            returns: AalenBootstrap read from a file written by save()
+        '''
+        with np.load(fname) as f:
+            return cls(f['columns'], f['timeline'], f['cumulative_hazards'], bool(f['fit_intercept']), json.loads(str(f['meta'])))
+
+    def predict_survival_function(self, X):
+        ''' predict_survival_function(X)
+            params: X - dataframe with the covariate columns, or numpy array with the columns in fit order
+            returns: array of replicates x event times x patients of survival
+        '''
+        X, _ = design_rows(X, self.columns, self.fit_intercept)
+        # the product is taken in float64, the YR_BRTH and baseline terms are large and mostly cancel
+        return np.exp(-np.einsum('rtc,pc->rtp', self.cumulative_hazards, X))
+
+    def predict_expectation(self, X):
+        ''' returns: array of replicates x patients of expected lifetime, area under the survival function '''
+        return self._expectation(self.predict_survival_function(X))
+
+    def _expectation(self, S):
+        # trapezoid rule over the event times, the same as AalenModel
+        return np.einsum('t,rtp->rp', np.diff(self.timeline), (S[:, 1:] + S[:, :-1]) / 2)
+
+    def confidence_interval(self, X, alpha=0.95):
+        ''' confidence_interval(X, alpha)
+            percentile bootstrap intervals of every patient's expected survival and survival curve
+
+            params: X - patients, see predict_survival_function()
+                    alpha - confidence level
+            returns: dataframe with one row per patient of the 'lower' and 'upper' expected survival in
+                     months, and dataframes of the lower and upper survival, one row per event time and
+                     one column per patient
+        '''
+        _, index = design_rows(X, self.columns, self.fit_intercept)
+        q = [50 * (1 - alpha), 50 * (1 + alpha)]
+
+        S = self.predict_survival_function(X)
+        exp = self._expectation(S)
+
+        exp_ci = pd.DataFrame(np.percentile(exp, q, axis=0).T, index=index, columns=['lower', 'upper'])
+        sf_lower, sf_upper = np.percentile(S, q, axis=0)
+
+        return (exp_ci, pd.DataFrame(sf_lower, index=self.timeline, columns=index),
+                pd.DataFrame(sf_upper, index=self.timeline, columns=index))
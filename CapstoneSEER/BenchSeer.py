@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import argparse
+import platform
+import subprocess
+import multiprocessing as mp
+from queue import Empty
+import numpy as np
+import pandas as pd
+import patsy as pt
+from ParallelSeer import peak_rss_mb
+
+
+# estimators from test_models() and the Aalen model from ProjectSeer1
+ESTIMATORS = ['RandomForestClassifier', 'KNeighborsRegressor', 'Lasso', 'Ridge', 'MultinomialNB', 'BernoulliNB', 'AalenAdditiveFitter']
+
+# default sample size ladder
+SIZES = [5000, 20000, 100000, 250000, 1000000]
+
+FEATURES = ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS','RACE']
+
+
+def synthetic_cohort(n, seed=0):
+    ''' synthetic_cohort(n, seed)
+        params: n - number of patients
+                seed - random seed
+        returns: dataframe shaped like the cleaned ProjectSeer1 cohort, with SRV_TIME_MON and CENSORED
+
+        covariate codes follow clean_recode_data(), survival is exponential with a hazard that
+        depends on age, stage and receptor status so the models have something to find.
+    '''
+    rng = np.random.RandomState(seed)
+
+    df = pd.DataFrame({'YR_BRTH': rng.randint(1900, 1990, n),
+                       'AGE_DX': rng.randint(20, 95, n),
+                       'RADIATN': rng.randint(0, 2, n),
+                       'HISTREC': rng.randint(0, 20, n),
+                       'ERSTATUS': rng.randint(0, 3, n),
+                       'PRSTATUS': rng.randint(0, 3, n),
+                       'BEHANAL': rng.choice([2, 3], n, p=[.2, .8]),
+                       'HST_STGA': rng.choice([0, 1, 2, 4], n, p=[.2, .4, .3, .1]),
+                       'NUMPRIMS': rng.choice([1, 2], n, p=[.85, .15]),
+                       'RACE': rng.choice([101, 102, 103, 107, 108, 109], n)})
+
+    hazard = 0.004 * np.exp(0.03 * (df.AGE_DX.values - 60) + 0.5 * df.HST_STGA.values - 0.3 * (df.ERSTATUS.values == 2))
+    event = rng.exponential(1 / hazard)
+    follow_up = rng.uniform(0, 480, n)
+
+    df['SRV_TIME_MON'] = np.floor(np.minimum(event, follow_up))
+    df['CENSORED'] = event < follow_up      # same meaning as clean_recode_data(), True when the death was observed
+
+    return df
+
+
+def real_cohort(n, path=r'./data/', seed=0):
+    ''' real_cohort(n, path, seed)
+        returns: n cleaned rows of the seer database using the ProjectSeer1 cohort query
+    '''
+    from ProjectSeer1 import ProjectSeer1
+
+    seer = ProjectSeer1(path=path, verbose=False, sample_size=n, seed=seed, use_registry=False)
+    df, _ = seer.load_and_clean_data()
+    del seer
+
+    return df
+
+
+def make_estimator(name):
+    from sklearn.linear_model import Lasso, Ridge
+    from sklearn.naive_bayes import MultinomialNB, BernoulliNB
+    from sklearn.neighbors import KNeighborsRegressor
+    from sklearn.ensemble import RandomForestClassifier
+    from lifelines import AalenAdditiveFitter
+
+    # the patsy design matrix has its own Intercept, the same fit as ProjectSeer1.prepare_model()
+    if name == 'AalenAdditiveFitter':
+        return AalenAdditiveFitter(fit_intercept=False)
+
+    return {'RandomForestClassifier': RandomForestClassifier, 'KNeighborsRegressor': KNeighborsRegressor,
+            'Lasso': Lasso, 'Ridge': Ridge, 'MultinomialNB': MultinomialNB, 'BernoulliNB': BernoulliNB}[name]()
+
+
+def run_case(name, size, real, path, seed, queue):
+    ''' runs one estimator at one sample size, called in a fresh process so peak memory is its own '''
+    try:
+        df = real_cohort(size, path, seed) if real else synthetic_cohort(size, seed)
+
+        # 80/20 split, the same for every estimator at this size
+        n_train = int(len(df) * .8)
+        train, test = df.iloc[:n_train], df.iloc[n_train:]
+
+        rss_base = peak_rss_mb()
+        mdl = make_estimator(name)
+
+        if name == 'AalenAdditiveFitter':
+            from ProjectSeer1 import ProjectSeer1
+
+            X = pt.dmatrix(ProjectSeer1.MODELSPEC, train, return_type='dataframe')
+            X = X.join(train[['SRV_TIME_MON', 'CENSORED']])
+            X_test = pt.dmatrix(ProjectSeer1.MODELSPEC, test, return_type='dataframe')
+
+            t0 = time.perf_counter()
+            mdl.fit(X, 'SRV_TIME_MON', 'CENSORED')
+            fit_sec = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            mdl.predict_expectation(X_test)
+            predict_sec = time.perf_counter() - t0
+        else:
+            # same target as test_models(), survival bucket at 60 months
+            y_train = (train.SRV_TIME_MON.values >= 60).astype(int)
+
+            t0 = time.perf_counter()
+            mdl.fit(train[FEATURES].values, y_train)
+            fit_sec = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            mdl.predict(test[FEATURES].values)
+            predict_sec = time.perf_counter() - t0
+
+        rss_peak = peak_rss_mb()
+
+        queue.put({'estimator': name, 'size': size, 'rows': len(df), 'fit_sec': fit_sec, 'predict_sec': predict_sec,
+                   'predictions_per_sec': len(test) / predict_sec if predict_sec > 0 else None,
+                   'peak_rss_mb': rss_peak, 'rss_delta_mb': None if rss_peak is None else rss_peak - rss_base,
+                   'error': None})
+    except Exception as err:
+        queue.put({'estimator': name, 'size': size, 'error': repr(err)})
+
+
+class BenchSeer(object):
+    ''' benchmark of fit and predict time and memory for the modeling estimators over a ladder of sample sizes.
+        results are written to a json report that can be compared with a report from another commit.
+    '''
+
+    def __init__(self, estimators=ESTIMATORS, sizes=SIZES, real=False, path=r'./data/', seed=0, max_fit_sec=300, max_case_sec=1800,
+                 verbose=True):
+        ''' params: estimators - list of estimator names to run, see ESTIMATORS
+                    sizes - list of sample sizes
+                    real - use the seer database instead of a synthetic cohort
+                    path - path to the seer database for real cohorts
+                    seed - seed for the synthetic cohort or the database sample
+                    max_fit_sec - once a fit takes longer than this, larger sizes of that estimator are skipped
+                    max_case_sec - a case still running after this many seconds is terminated and recorded as an
+                                   error, and larger sizes of that estimator are skipped
+                    verbose - prints status messages
+        '''
+        self.estimators = estimators
+        self.sizes = sorted(sizes)
+        self.real = real
+        self.path = path
+        self.seed = seed
+        self.max_fit_sec = max_fit_sec
+        self.max_case_sec = max_case_sec
+        self.verbose = verbose
+
+    def run(self):
+        ''' returns: list of result dicts, one per estimator and size '''
+        # spawn gives every case a clean process so its peak memory is not inherited from this one
+        ctx = mp.get_context('spawn')
+        res = []
+
+        for name in self.estimators:
+            too_slow = False
+            for size in self.sizes:
+                if too_slow:
+                    res.append({'estimator': name, 'size': size, 'error': 'skipped, smaller size was over max_fit_sec or max_case_sec'})
+                    continue
+
+                queue = ctx.Queue()
+                proc = ctx.Process(target=run_case, args=(name, size, self.real, self.path, self.seed, queue))
+                proc.start()
+                t0 = time.perf_counter()
+                rec = None
+                timed_out = False
+                while rec is None:
+                    try:
+                        rec = queue.get(timeout=1)
+                    except Empty:
+                        # the case was killed, most likely out of memory
+                        if not proc.is_alive():
+                            rec = {'estimator': name, 'size': size, 'error': 'process exited with code {0}'.format(proc.exitcode)}
+                        elif time.perf_counter() - t0 > self.max_case_sec:
+                            proc.terminate()
+                            timed_out = True
+                            rec = {'estimator': name, 'size': size, 'error': 'terminated after {0:.0f} sec'.format(self.max_case_sec)}
+                proc.join()
+
+                res.append(rec)
+                if self.verbose:
+                    if rec['error']:
+                        print('{0:24} {1:>8}  ERROR {2}'.format(name, size, rec['error']))
+                    else:
+                        print('{0:24} {1:>8}  fit {2:8.3f} sec  predict {3:8.3f} sec  {4:12.0f} pred/sec  peak {5} MB'.format(
+                              name, size, rec['fit_sec'], rec['predict_sec'], rec['predictions_per_sec'] or 0,
+                              'n/a' if rec['peak_rss_mb'] is None else '{0:.0f}'.format(rec['peak_rss_mb'])))
+
+                too_slow = timed_out or (rec['error'] is None and rec['fit_sec'] > self.max_fit_sec)
+
+        return res
+
+    def report(self, fname='bench_report.json'):
+        ''' run the benchmark and write the json report
+            returns: the report dict
+        '''
+        try:
+            commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+        except Exception:
+            commit = None
+
+        rep = {'commit': commit,
+               'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'cohort': 'real' if self.real else 'synthetic',
+               'seed': self.seed,
+               'results': self.run()}
+
+        with open(fname, 'w') as f:
+            json.dump(rep, f, indent=2)
+
+        if self.verbose:
+            print('Benchmark report saved to {0}'.format(fname))
+
+        return rep
+
+
+def compare(old_fname, new_fname):
+    ''' compare(old_fname, new_fname)
+        prints the ratio of new to old fit time, predict time and peak memory for every case in both reports,
+        below 1.0 means the new commit is faster or smaller.
+    '''
+    with open(old_fname) as f:
+        old = json.load(f)
+    with open(new_fname) as f:
+        new = json.load(f)
+
+    old_res = {(r['estimator'], r['size']): r for r in old['results'] if not r['error']}
+
+    print('{0:24} {1:>8} {2:>8} {3:>8} {4:>8}'.format('estimator', 'size', 'fit', 'predict', 'memory'))
+    for r in new['results']:
+        o = old_res.get((r['estimator'], r['size']))
+        if o is None or r['error']:
+            continue
+
+        ratios = []
+        for col in ('fit_sec', 'predict_sec', 'peak_rss_mb'):
+            ratios.append(r[col] / o[col] if r[col] is not None and o[col] else float('nan'))
+
+        print('{0:24} {1:>8} {2:8.2f} {3:8.2f} {4:8.2f}'.format(r['estimator'], r['size'], *ratios))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='benchmark the SEER modeling estimators over sample sizes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--estimators', nargs='+', default=ESTIMATORS)
+    parser.add_argument('--real', action='store_true', help='use the seer database instead of a synthetic cohort')
+    parser.add_argument('--max-fit-sec', type=float, default=300)
+    parser.add_argument('--max-case-sec', type=float, default=1800, help='terminate a case that runs longer than this')
+    parser.add_argument('--out', default='bench_report.json')
+    parser.add_argument('--compare', help='earlier report to compare the new one with')
+    args = parser.parse_args()
+
+    bench = BenchSeer(estimators=args.estimators, sizes=args.sizes, real=args.real, max_fit_sec=args.max_fit_sec,
+                      max_case_sec=args.max_case_sec)
+    bench.report(args.out)
+
+    if args.compare:
+        compare(args.compare, args.out)
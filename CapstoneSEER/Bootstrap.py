@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from AalenFitter import AalenFitter
+from AalenModel import AalenBootstrap
+from ParallelSeer import ParallelSeer
+from TimeGrid import grid_knots, coarsen
+
+
+def fit_replicate(data, task):
+    ''' fit_replicate(data, task)
+        refits the Aalen model on one resample of the cohort, module level so it can run in a worker process
+
+        params: data - dict of shared 'X', 'T', 'E' and 'timeline' arrays
+                task - tuple of (replicate number, seed, fitter class, dict of its parameters, column names)
+        returns: the fitted model's column names, and float32 array of the replicate's cumulative hazards at
+                 every time of the shared timeline
+    '''
+    b, seed, fitter, params, columns = task
+
+    # one stream per replicate, so a replicate is the same whichever worker or order it runs in
+    rng = np.random.RandomState([seed, b])
+    idx = rng.randint(0, len(data['T']), len(data['T']))
+
+    frame = pd.DataFrame(np.asarray(data['X'][idx]), columns=columns)
+    frame['SRV_TIME_MON'] = data['T'][idx]
+    frame['CENSORED'] = data['E'][idx]
+
+    model = fitter(**params).fit(frame, 'SRV_TIME_MON', 'CENSORED')
+
+    # the resample's death times are a subset of the cohort's, step its cumulative hazards onto them
+    ch = model.cumulative_hazards_
+    pos = np.searchsorted(ch.index.values, data['timeline'], side='right') - 1
+    return list(ch.columns), np.where(pos[:, np.newaxis] >= 0, ch.values[np.maximum(pos, 0)], 0.).astype(np.float32)
+
+
+def fit_bootstrap(frame, duration_col='SRV_TIME_MON', event_col='CENSORED', fitter=AalenFitter, params={}, n_boot=100, seed=0,
+                  n_jobs=1, meta=None, verbose=True):
+    ''' fit_bootstrap(frame, duration_col, event_col, fitter, params, n_boot, seed, n_jobs, meta, verbose)
+        fits the Aalen model on n_boot resamples of the cohort, drawn with replacement, in parallel
+
+        params: frame - covariates plus the duration and event columns, i.e. ProjectSeer1.model_frame()
+                duration_col, event_col - names of the survival time and death observed columns
+                fitter - Aalen fitter class, the one the point model was fit with so the interval is of
+                         the same estimator, AalenFitter or lifelines' AalenAdditiveFitter
+                params - dict of fitter parameters
+                n_boot - number of replicates
+                seed - seed of the resamples
+                n_jobs - number of worker processes, -1 uses every cpu
+                meta - dict stored with the replicates
+        returns: AalenBootstrap of every replicate's cumulative hazards
+    '''
+    columns = [c for c in frame.columns if c not in (duration_col, event_col)]
+    T = frame[duration_col].values.astype(np.float64)
+    E = frame[event_col].values.astype(bool)
+
+    # the cohort's death times, on the fitter's time grid if it has one
+    knots = grid_knots(params.get('time_grid'), T.max())
+    if knots is not None:
+        Tc, Ec = coarsen(T, E, knots)
+        timeline = np.unique(Tc[Ec])
+    else:
+        timeline = np.unique(T[E])
+
+    data = {'X': frame[columns].values.astype(np.float64), 'T': T, 'E': E, 'timeline': timeline}
+    tasks = [(b, seed, fitter, params, columns) for b in range(n_boot)]
+
+    executor = ParallelSeer(n_jobs=n_jobs, chunk_size=1, verbose=verbose)
+    res = executor.run(fit_replicate, tasks, data)
+
+    # the fitted columns, with the fitter's own intercept if it added one
+    columns = res[0][0]
+    hazards = np.stack([h for _, h in res])
+
+    return AalenBootstrap(columns, timeline, hazards, params.get('fit_intercept', True), meta)
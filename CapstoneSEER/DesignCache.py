@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import patsy as pt
+
+
+class DesignCache(object):
+    ''' disk cache of cleaned cohorts and their patsy design matrices.
+
+        each entry is a directory named by a key made from the query, recode version, formula and
+        database fingerprint.  the cleaned cohort is pickled, the design matrix is saved as a .npy file
+        that is memory mapped on load, and meta.json is written last so a half written entry is never used.
+        patsy can not pickle a DesignInfo, so it is rebuilt from the cached cohort once per process.
+    '''
+
+    # entries already loaded in this process, key: (df, X, design_info), least recently used first.
+    # only the latest MEMO_SIZE are kept so a long running process does not hold every cohort it ever loaded
+    MEMO_SIZE = 4
+    _memo = OrderedDict()
+
+    def __init__(self, path=r'./data/design/', verbose=True):
+        ''' params: path - directory the entries are stored in, created if missing
+                    verbose - prints status messages
+        '''
+        if path[-1] != '/':
+            path += '/'
+
+        self.path = path
+        self.verbose = verbose
+
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(meta):
+        ''' key(meta)
+            params: meta - dict of everything the cohort depends on, i.e. query, recode version,
+                           sample size, seed and database fingerprint
+            returns: hex string key
+        '''
+        return hashlib.sha1(json.dumps(meta, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _save(self, fname, save_fnc):
+        tmp = '{0}.{1}.tmp'.format(fname, os.getpid())
+        save_fnc(tmp)
+        os.replace(tmp, fname)
+
+    @staticmethod
+    def _dump_json(obj, fname):
+        with open(fname, 'w') as f:
+            json.dump(obj, f, default=str)
+
+    def cohort(self, meta, load_fnc):
+        ''' cohort(meta, load_fnc)
+            params: meta - dict the key is made from, see key()
+                    load_fnc - function with no arguments that queries and cleans the cohort
+            returns: cleaned dataframe, from the cache if it was built before
+        '''
+        return self.design(meta, None, load_fnc)[0]
+
+    def design(self, meta, formula, load_fnc):
+        ''' design(meta, formula, load_fnc)
+            params: meta - dict the key is made from, see key()
+                    formula - patsy formula, None to only cache the cleaned cohort
+                    load_fnc - function with no arguments that queries and cleans the cohort
+            returns: cleaned dataframe, read only design matrix (numpy array, memory mapped from disk)
+                     and its patsy DesignInfo.  the matrix and DesignInfo are None if formula is None.
+        '''
+        key = self.key(dict(meta, formula=formula))
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+
+        entry = self.path + key + '/'
+        if os.path.exists(entry + 'meta.json'):
+            df = pd.read_pickle(entry + 'cohort.pkl')
+            X, design_info = None, None
+            if formula is not None:
+                X = np.load(entry + 'design.npy', mmap_mode='r')
+                design_info = self.design_info(formula, df)
+
+            if self.verbose:
+                print('Loaded cached design from {0}'.format(entry))
+        else:
+            df = load_fnc()
+            X, design_info = None, None
+            if formula is not None:
+                dm = pt.dmatrix(formula, df)
+                design_info = dm.design_info
+                X = np.asarray(dm)
+
+            os.makedirs(entry, exist_ok=True)
+            self._save(entry + 'cohort.pkl', lambda f: df.to_pickle(f))
+            if X is not None:
+                # np.save adds .npy to names without it, so the temp name has to end in .npy too
+                tmp = '{0}design.{1}.tmp.npy'.format(entry, os.getpid())
+                np.save(tmp, X)
+                os.replace(tmp, entry + 'design.npy')
+                X = np.load(entry + 'design.npy', mmap_mode='r')
+
+            info = dict(meta, formula=formula, rows=len(df),
+                        columns=None if design_info is None else list(design_info.column_names))
+            self._save(entry + 'meta.json', lambda f: self._dump_json(info, f))
+
+        self._memo[key] = (df, X, design_info)
+        while len(self._memo) > self.MEMO_SIZE:
+            self._memo.popitem(last=False)
+
+        return df, X, design_info
+
+    @staticmethod
+    def design_info(formula, df):
+        ''' design_info(formula, df)
+            params: formula - patsy formula
+                    df - data the formula was built on, used for categorical levels and stateful transforms
+            returns: patsy DesignInfo without building the full matrix
+        '''
+        builder = pt.incr_dbuilder(formula, lambda: iter([df]))
+        # patsy before 0.5 returns a builder that holds the DesignInfo
+        return getattr(builder, 'design_info', builder)
+
+    @staticmethod
+    def transform(design_info, data):
+        ''' transform(design_info, data)
+            params: design_info - DesignInfo from design()
+                    data - dataframe of new rows with the formula's columns, i.e. one patient
+            returns: numpy design matrix of the new rows
+        '''
+        return np.asarray(pt.build_design_matrices([design_info], data)[0])
@@ -0,0 +1,241 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+from TimeGrid import grid_knots, coarsen
+
+
+class EventIndex(object):
+    ''' survival times of a cohort sorted once into a shared index of unique times.
+
+        every grouping of the cohort, by one column or several, is counted against the same index
+        with a single bincount, so Kaplan-Meier curves and log-rank tests for any number of groups
+        come out of one vectorized pass instead of one sort per group.
+    '''
+
+    def __init__(self, durations, event_observed=None, time_grid=None):
+        ''' params: durations - array or Series of survival times, i.e. SRV_TIME_MON
+                    event_observed - array or Series, True when the death was observed, i.e. CENSORED.
+                                     None means every death was observed.
+                    time_grid - None keeps every distinct time, otherwise times are moved up to the
+                                knots of the grid, see TimeGrid.grid_knots()
+        '''
+        durations = np.asarray(durations, dtype=np.float64).ravel()
+        if event_observed is None:
+            event_observed = np.ones(len(durations), dtype=bool)
+
+        knots = grid_knots(time_grid, durations.max())
+        if knots is not None:
+            durations, event_observed = coarsen(durations, np.asarray(event_observed).ravel(), knots)
+
+        # like lifelines, everybody is at risk from time 0 (or the earliest time if it is negative)
+        times, self.tcode = np.unique(np.r_[min(0., durations.min()), durations], return_inverse=True)
+        self.tcode = self.tcode[1:]
+        self.timeline = times
+        self.observed = np.asarray(event_observed).ravel().astype(bool)
+        self.n = len(durations)
+
+    def factorize(self, groups=None):
+        ''' factorize(groups)
+            params: groups - None for the whole cohort, an array or Series of group labels, or a dataframe
+                             of columns to group by together (labels are then tuples)
+            returns: group number of every row and the list of group labels, sorted
+        '''
+        if groups is None:
+            return np.zeros(self.n, dtype=np.intp), ['all']
+
+        if isinstance(groups, pd.DataFrame):
+            if groups.shape[1] == 1:
+                groups = groups.iloc[:, 0]
+            else:
+                codes, labels = zip(*[pd.factorize(groups[c], sort=True) for c in groups.columns])
+                labels = [list(l) for l in labels]
+                shape = [len(l) for l in labels]
+                # a row missing any of the columns is left out
+                missing = np.any([c < 0 for c in codes], axis=0)
+                flat = np.ravel_multi_index([np.where(missing, 0, c) for c in codes], shape)
+                used, code = np.unique(flat[~missing], return_inverse=True)
+                full = np.full(self.n, -1, dtype=np.intp)
+                full[~missing] = code
+                return full, [tuple(l[i] for l, i in zip(labels, pos)) for pos in zip(*np.unravel_index(used, shape))]
+
+        code, labels = pd.factorize(np.asarray(groups), sort=True)
+        return code, list(labels)
+
+    @classmethod
+    def from_arrays(cls, timeline, tcode, observed):
+        ''' from_arrays(timeline, tcode, observed)
+            params: timeline, tcode, observed - the arrays of an existing index, i.e. attached from shared memory
+            returns: EventIndex over the same cohort without sorting again
+        '''
+        index = cls.__new__(cls)
+        index.timeline = timeline
+        index.tcode = tcode
+        index.observed = observed
+        index.n = len(tcode)
+        return index
+
+    def tables(self, code, num_groups):
+        ''' tables(code, num_groups)
+            params: code - group number of every row, -1 leaves the row out
+                    num_groups - number of groups
+            returns: arrays of groups x unique times of the deaths, the number removed (deaths and censored)
+                     and the number at risk at every time
+        '''
+        G, U = num_groups, len(self.timeline)
+
+        keep = code >= 0
+        flat = code[keep] * U + self.tcode[keep]
+        removed = np.bincount(flat, minlength=G * U).reshape(G, U).astype(np.float64)
+        deaths = np.bincount(flat, weights=self.observed[keep], minlength=G * U).reshape(G, U)
+
+        # at risk at a time is everyone in the group less the ones removed at earlier times
+        at_risk = removed.sum(axis=1)[:, np.newaxis] - np.c_[np.zeros(G), np.cumsum(removed, axis=1)[:, :-1]]
+
+        return deaths, removed, at_risk
+
+    def counts(self, groups=None):
+        ''' counts(groups)
+            params: groups - see factorize()
+            returns: group labels, and the deaths, removed and at risk arrays from tables()
+        '''
+        # rows with a missing group label have code -1 and are left out
+        code, labels = self.factorize(groups)
+        return (labels,) + self.tables(code, len(labels))
+
+    def logrank(self, groups):
+        ''' logrank(groups)
+            params: groups - see factorize()
+            returns: dict of the k-sample log-rank 'statistic', its degrees of freedom 'df' and 'p_value',
+                     and dataframes 'pairwise_statistic' and 'pairwise_p' of the two sample test between every
+                     pair of groups (not corrected for the number of pairs)
+        '''
+        labels, deaths, removed, at_risk = self.counts(groups)
+        return logrank_result(labels, *logrank_tables(deaths, at_risk))
+
+    def kaplan_meier(self, groups=None, alpha=0.95):
+        ''' kaplan_meier(groups, alpha)
+            params: groups - see factorize()
+                    alpha - confidence level of the bands
+            returns: KaplanMeierCurves with one curve per group
+        '''
+        labels, deaths, removed, at_risk = self.counts(groups)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # product limit in log space, times with no deaths do not change the curve
+            log_step = np.where(deaths > 0, np.log(at_risk - deaths) - np.log(at_risk), 0.)
+            log_surv = np.cumsum(log_step, axis=1)
+
+            # greenwood sums, lifelines counts the step where everyone dies as 0
+            var_step = np.where(deaths > 0, deaths / (at_risk * (at_risk - deaths)), 0.)
+            var_step[~np.isfinite(var_step)] = 0.
+            cum_var = np.cumsum(var_step, axis=1)
+
+            # exponential greenwood bands on log(-log(S)), the same as lifelines
+            z = stats.norm.ppf((1. + alpha) / 2.)
+            upper = np.exp(-np.exp(np.log(-log_surv) + z * np.sqrt(cum_var) / log_surv))
+            lower = np.exp(-np.exp(np.log(-log_surv) - z * np.sqrt(cum_var) / log_surv))
+
+        # the band is undefined where survival is 1, lifelines makes it 1
+        upper[np.isnan(upper)] = 1.
+        lower[np.isnan(lower)] = 1.
+
+        return KaplanMeierCurves(self.timeline, labels, np.exp(log_surv), lower, upper, at_risk, deaths, removed, alpha)
+
+
+def logrank_tables(deaths, at_risk):
+    ''' logrank_tables(deaths, at_risk)
+        params: deaths, at_risk - arrays of groups x unique times from EventIndex.tables()
+        returns: k-sample chi square statistic, its p value, and groups x groups arrays of the
+                 pairwise chi square statistics and p values (0 and 1 on the diagonal)
+    '''
+    G = len(deaths)
+    D, N = deaths.sum(axis=0), at_risk.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # observed less expected deaths of every group
+        Z = deaths.sum(axis=1) - np.nansum(at_risk * D / N, axis=1)
+
+        # hypergeometric covariance with the ties correction, times with one at risk add nothing
+        w = np.where(N > 1, D * (N - D) / ((N - 1) * N * N), 0.)
+        nw = at_risk * w
+        V = np.diag(np.dot(nw, N)) - np.dot(nw, at_risk.T)
+
+    # the groups sum to zero so drop the last one
+    statistic = float(np.dot(Z[:-1], np.dot(np.linalg.pinv(V[:-1, :-1]), Z[:-1]))) if G > 1 else 0.
+    p_value = stats.chi2.sf(statistic, G - 1) if G > 1 else 1.
+
+    # every pair at once for one group against all the others, only G x times in memory at a time
+    pair_stat = np.zeros((G, G))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for a in range(G - 1):
+            n_a, n_b = at_risk[a], at_risk[a + 1:]
+            d_a, d_b = deaths[a], deaths[a + 1:]
+            n, d = n_a + n_b, d_a + d_b
+            z = np.nansum(d_a - n_a * d / n, axis=1)
+            v = np.sum(np.where(n > 1, n_a * n_b * d * (n - d) / (n * n * (n - 1)), 0.), axis=1)
+            pair_stat[a, a + 1:] = np.where(v > 0, z * z / v, 0.)
+
+    pair_stat += pair_stat.T
+    pair_p = stats.chi2.sf(pair_stat, 1)
+
+    return statistic, G - 1, p_value, pair_stat, pair_p
+
+
+def logrank_result(labels, statistic, df, p_value, pair_stat, pair_p):
+    ''' returns: the dict of EventIndex.logrank() from the output of logrank_tables() '''
+    return {'statistic': statistic, 'df': df, 'p_value': p_value,
+            'pairwise_statistic': pd.DataFrame(pair_stat, index=labels, columns=labels),
+            'pairwise_p': pd.DataFrame(pair_p, index=labels, columns=labels)}
+
+
+class KaplanMeierCurves(object):
+    ''' Kaplan-Meier curves of several groups on one shared timeline, made by EventIndex.kaplan_meier().
+
+        survival_function_, lower_, upper_, at_risk_ and observed_ are dataframes indexed by time with
+        one column per group.  curve(label) gives one group the way lifelines' KaplanMeierFitter does.
+    '''
+
+    def __init__(self, timeline, labels, survival, lower, upper, at_risk, deaths, removed, alpha):
+        frame = lambda values: pd.DataFrame(values.T, index=pd.Index(timeline, name='timeline'), columns=labels)
+
+        self.labels = labels
+        self.alpha = alpha
+        self.survival_function_ = frame(survival)
+        self.lower_ = frame(lower)
+        self.upper_ = frame(upper)
+        self.at_risk_ = frame(at_risk)
+        self.observed_ = frame(deaths)
+        self.removed_ = frame(removed)
+
+    def curve(self, label, name=None):
+        ''' curve(label, name)
+            params: label - group label
+                    name - column name, defaults to the label
+            returns: survival function and confidence interval dataframes on the group's own times,
+                     the same as KaplanMeierFitter's survival_function_ and confidence_interval_
+        '''
+        name = str(label) if name is None else name
+
+        # by position, labels can be True/False which pandas would take as a mask
+        g = self.labels.index(label)
+
+        # the group's own timeline is time 0 and every time one of its members was removed
+        times = self.removed_.values[:, g] > 0
+        times[0] = True
+
+        index = self.survival_function_.index[times]
+        sf = pd.DataFrame(self.survival_function_.values[times, g], index=index, columns=[name])
+        labels = ['%s_lower_%g' % (name, self.alpha), '%s_upper_%g' % (name, self.alpha)]
+        ci = pd.DataFrame(np.c_[self.lower_.values[times, g], self.upper_.values[times, g]], index=index, columns=labels)
+        return sf, ci
+
+    def plot(self, ax, label, name=None, ci=True, **kwargs):
+        ''' plot(ax, label, name, ci)
+            draws one group's survival as a step curve with its confidence band shaded
+        '''
+        sf, band = self.curve(label, name)
+        lines = ax.step(sf.index.values, sf.values[:, 0], where='post', label=sf.columns[0], **kwargs)
+        if ci:
+            ax.fill_between(sf.index.values, band.values[:, 0], band.values[:, 1], step='post', alpha=0.25,
+                            color=lines[0].get_color())
+        return ax
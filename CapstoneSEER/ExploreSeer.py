@@ -1,14 +1,110 @@
 import time
+import pickle
+import hashlib
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from MasterSeer import MasterSeer
+from ParallelSeer import ParallelSeer
+from sklearn.metrics import f1_score, accuracy_score, r2_score
+from sklearn.base import is_classifier
 from sklearn.feature_selection import SelectPercentile, f_classif, SelectFromModel
 from sklearn.linear_model import LinearRegression
 from lifelines.plotting import plot_lifetimes
-from lifelines import KaplanMeierFitter
+from EventIndex import EventIndex, logrank_tables, logrank_result
 from numpy.random import uniform, exponential
 
+
+# fitted model unpickled from the shared bytes, kept per worker process so it is only loaded once
+_perm_model = None
+_perm_model_key = None
+
+# rows predicted at one time by permute_score(), each worker copies only this many rows of X
+PERM_BATCH = 50000
+
+
+def score_model(model, X, y, scoring):
+    """ score_model(model, X, y, scoring)
+        params: model - fitted estimator
+                X, y - data to score on
+                scoring - None uses the model's own score(), accuracy for classifiers and R^2 for regressors.
+                          'f1' rounds the predictions to buckets like test_models() and uses binary f1 for
+                          two buckets, weighted f1 for more
+        returns: score, higher is better
+    """
+    if scoring is None:
+        return model.score(X, y)
+
+    return score_predictions(model, y, model.predict(X), scoring)
+
+
+def score_predictions(model, y, y_pred, scoring):
+    """ score_predictions(model, y, y_pred, scoring)
+        params: model - fitted estimator the predictions came from
+                y - true values
+                y_pred - the model's predictions
+                scoring - see score_model(), None gives what the model's score() would,
+                          accuracy for classifiers and R^2 for regressors
+        returns: score, higher is better
+    """
+    if scoring is None:
+        return accuracy_score(y, y_pred) if is_classifier(model) else r2_score(y, y_pred)
+    if scoring == 'f1':
+        y_pred = np.rint(y_pred).astype(int)
+        return f1_score(y, y_pred, average='binary' if len(np.unique(y)) <= 2 else 'weighted')
+
+    raise ValueError('unknown scoring: {0}'.format(scoring))
+
+
+def permute_score(data, task):
+    """ permute_score(data, task)
+        scores the model with one column shuffled, module level so it can run in a worker process
+
+        params: data - dict of shared X, y and model (pickled estimator as a uint8 array)
+                task - tuple of (column position, repeat number, seed, scoring, model key)
+        returns: score with the column shuffled
+    """
+    global _perm_model, _perm_model_key
+
+    col, repeat, seed, scoring, model_key = task
+
+    # the key is a hash of the pickled model, unpickle only when it changes
+    if _perm_model_key != model_key:
+        _perm_model = pickle.loads(data['model'].tobytes())
+        _perm_model_key = model_key
+
+    # the shuffle only depends on the seed, column and repeat so results do not depend on the worker
+    rng = np.random.RandomState([seed, col, repeat])
+    X = data['X']
+    shuffled = X[rng.permutation(len(X)), col]
+
+    # the shared X is read only, predict a block of rows at a time with the shuffled column swapped in
+    y_pred = []
+    for start in range(0, len(X), PERM_BATCH):
+        block = np.array(X[start:start + PERM_BATCH])
+        block[:, col] = shuffled[start:start + PERM_BATCH]
+        y_pred.append(_perm_model.predict(block))
+
+    return score_predictions(_perm_model, data['y'], np.concatenate(y_pred), scoring)
+
+
+def logrank_column(data, task):
+    """ logrank_column(data, task)
+        log-rank tests between the levels of one covariate, module level so it can run in a worker process
+
+        params: data - dict of the shared event index arrays 'timeline', 'tcode', 'observed' and the
+                       group 'codes' of every covariate, one row per covariate
+                task - tuple of (covariate row, number of levels)
+        returns: output of EventIndex.logrank_tables()
+    """
+    row, num_groups = task
+
+    index = EventIndex.from_arrays(data['timeline'], data['tcode'], data['observed'])
+    deaths, removed, at_risk = index.tables(data['codes'][row], num_groups)
+
+    return logrank_tables(deaths, at_risk)
+
+
 class ExploreSeer(MasterSeer):
 
     def __init__(self, path=r'./data/', testMode=False, verbose=True, sample_size=5000):
@@ -49,7 +145,7 @@ class ExploreSeer(MasterSeer):
         desc = df.describe(include='all')
         exc = pd.ExcelWriter(xls_name)
         desc.to_excel(exc)
-        exc.save()
+        exc.close()
         print("Data description saved to {0}".format(xls_name))
 
         return desc, df
@@ -93,13 +189,120 @@ class ExploreSeer(MasterSeer):
 
         return
 
+    def permutation_importance(self, model, X, y, cols=None, n_repeats=5, scoring=None, seed=0, n_jobs=1, plot=True):
+        """ permutation_importance(model, X, y, cols, n_repeats, scoring, seed, n_jobs, plot)
+            how much the score of a fitted model drops when each column is shuffled
+
+            params: model - fitted estimator, i.e. the best model from ModelSeer.test_models() refit on the training rows
+                    X, y - held out cohort the model was not trained on, X is a dataframe or numpy array
+                    cols - column names when X is a numpy array
+                    n_repeats - number of shuffles of every column
+                    scoring - see score_model(), None uses the model's own score()
+                    seed - seed of the shuffles, the same seed gives the same result for any n_jobs
+                    n_jobs - number of worker processes, -1 uses every cpu
+                    plot - bar chart of the mean importance with the standard deviation as error bars
+
+            returns: dataframe indexed by column with the 'mean' and 'std' drop in score, most important first
+
+            X, y and the pickled model are placed in shared memory once, every (column, repeat) is one task
+        """
+        if cols is None:
+            cols = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(np.shape(X)[1]))
+
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+
+        baseline = score_model(model, X, y, scoring)
+
+        model_bytes = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        model_key = hashlib.sha1(model_bytes).hexdigest()
+
+        data = {'X': X, 'y': y, 'model': np.frombuffer(model_bytes, dtype=np.uint8)}
+        tasks = [(c, r, seed, scoring, model_key) for c in range(len(cols)) for r in range(n_repeats)]
+
+        executor = ParallelSeer(n_jobs=n_jobs, verbose=self.verbose)
+        scores = np.array(executor.run(permute_score, tasks, data)).reshape(len(cols), n_repeats)
+
+        drop = baseline - scores
+        res = pd.DataFrame({'mean': drop.mean(axis=1), 'std': drop.std(axis=1)}, index=cols)
+        res = res.sort_values('mean', ascending=False)
+
+        if self.verbose:
+            print("\nBaseline score: {0:.4f}".format(baseline))
+            for col, row in res.iterrows():
+                print("{0:10}  {1:.4f} +/- {2:.4f}".format(str(col), row['mean'], row['std']))
+
+        if plot:
+            fig, ax = plt.subplots()
+            ax.bar(np.arange(len(res)), res['mean'].values, yerr=res['std'].values, color='g')
+            ax.set_xticks(np.arange(len(res)))
+            ax.set_xticklabels(res.index, rotation='vertical')
+            ax.set_title('Permutation importance')
+            plt.show()
+
+        return res
+
+    def logrank_matrix(self, cols=['RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS','RACE','LATERAL'],
+                       source='breast', cond='SRV_TIME_MON < 1000', sample_size=100000, all=False, max_levels=20, n_jobs=1):
+        """ logrank_matrix(cols, source, cond, sample_size, all, max_levels, n_jobs)
+            log-rank screening of covariates, every covariate is tested across all its levels (k-sample)
+            and between every pair of its levels
+
+            params: cols - covariates to test
+                    source, cond, sample_size, all - see MasterSeer.load_data()
+                    max_levels - covariates with more levels than this are skipped, i.e. continuous ones
+                    n_jobs - number of worker processes, -1 uses every cpu
+
+            returns: dataframe indexed by covariate with the number of 'levels', k-sample 'statistic', 'df'
+                     and 'p_value', most significant first, and a dict of covariate: the dict of EventIndex.logrank()
+                     with the 'pairwise_statistic' and 'pairwise_p' dataframes between its levels
+
+            the cohort is sorted into one EventIndex, its arrays and the level codes of every covariate
+            are placed in shared memory once and every covariate is one task
+        """
+        df = super().load_data(source, col=cols + ['SRV_TIME_MON', 'STAT_REC'], cond=cond, sample_size=sample_size, all=all)
+
+        index = EventIndex(df.SRV_TIME_MON, df.STAT_REC == 4)
+
+        tested, labels, codes = [], [], []
+        for col in cols:
+            code, levels = pd.factorize(df[col], sort=True)
+            if len(levels) > max_levels:
+                if self.verbose:
+                    print("Skipping {0}, {1} levels".format(col, len(levels)))
+                continue
+            tested.append(col)
+            labels.append(list(levels))
+            codes.append(code)
+
+        data = {'timeline': index.timeline, 'tcode': index.tcode, 'observed': index.observed,
+                'codes': np.array(codes, dtype=np.intp).reshape(len(codes), len(df))}
+        tasks = [(row, len(levels)) for row, levels in enumerate(labels)]
+
+        executor = ParallelSeer(n_jobs=n_jobs, verbose=self.verbose)
+        results = executor.run(logrank_column, tasks, data)
+
+        pairs = {}
+        summary = []
+        for col, levels, res in zip(tested, labels, results):
+            pairs[col] = logrank_result(levels, *res)
+            summary.append([len(levels), res[0], res[1], res[2]])
+
+        summary = pd.DataFrame(summary, index=tested, columns=['levels', 'statistic', 'df', 'p_value'])
+        summary = summary.sort_values('statistic', ascending=False)
+
+        if self.verbose:
+            print("\nLog-rank tests on {0} patients".format(len(df)))
+            for col, row in summary.iterrows():
+                print("{0:10}  levels {1:3d}  chi2 {2:12.2f}  p {3:.4g}".format(col, int(row['levels']), row['statistic'], row['p_value']))
+
+        return summary, pairs
+
     def plot_survival(self):
 
         df = super().load_data(col  = ['YR_BRTH','AGE_DX','LATERAL','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS', 'SRV_TIME_MON', 'SRV_TIME_MON_PA', 'DTH_CLASS', 'O_DTH_CLASS', 'STAT_REC'], 
                                cond = 'SRV_TIME_MON < 1000 AND HST_STGA < 8 AND DTH_CLASS < 9 AND ERSTATUS < 4 AND PRSTATUS < 4', sample_size = 100000)
 
-        kmf = KaplanMeierFitter()
-
         try:
             df.RADIATN = df.RADIATN.replace(7, 0)
             df = df[df.RADIATN < 7] 
@@ -151,39 +354,33 @@ class ExploreSeer(MasterSeer):
         f, ax = plt.subplots(5, sharex=True, sharey=True)
         ax[0].set_title("Lifespans of cancer patients");
 
+        # one index over the cohort, every grouping is counted against it in one pass
+        index = EventIndex(T, C)
+
         # radiation
-        kmf.fit(T[rad], event_observed=C[rad], label="Radiation")
-        kmf.plot(ax=ax[0]) #, ci_force_lines=True)
-        kmf.fit(T[~rad], event_observed=C[~rad], label="No Radiation")
-        kmf.plot(ax=ax[0]) #, ci_force_lines=True)
+        km = index.kaplan_meier(rad)
+        km.plot(ax[0], True, "Radiation")
+        km.plot(ax[0], False, "No Radiation")
 
         # ER Status
-        kmf.fit(T[er], event_observed=C[er], label="ER Positive")
-        kmf.plot(ax=ax[1]) #, ci_force_lines=True)
-        kmf.fit(T[~er], event_observed=C[~er], label="ER Negative")
-        kmf.plot(ax=ax[1]) #, ci_force_lines=True)
+        km = index.kaplan_meier(er)
+        km.plot(ax[1], True, "ER Positive")
+        km.plot(ax[1], False, "ER Negative")
 
         # PR Status
-        kmf.fit(T[pr], event_observed=C[pr], label="PR Positive")
-        kmf.plot(ax=ax[2]) #, ci_force_lines=True)
-        kmf.fit(T[~pr], event_observed=C[~pr], label="PR Negative")
-        kmf.plot(ax=ax[2]) #, ci_force_lines=True)
-
-        # stage
-        kmf.fit(T[st0], event_observed=C[st0], label="Stage 0")
-        kmf.plot(ax=ax[3]) #, ci_force_lines=True)
-        kmf.fit(T[st1], event_observed=C[st1], label="Stage 1")
-        kmf.plot(ax=ax[3]) #, ci_force_lines=True)
-        kmf.fit(T[st2], event_observed=C[st2], label="Stage 2")
-        kmf.plot(ax=ax[3]) #, ci_force_lines=True)
-        kmf.fit(T[st4], event_observed=C[st4], label="Stage 4")
-        kmf.plot(ax=ax[3]) #, ci_force_lines=True)
+        km = index.kaplan_meier(pr)
+        km.plot(ax[2], True, "PR Positive")
+        km.plot(ax[2], False, "PR Negative")
+
+        # stage, other stages are left out
+        km = index.kaplan_meier(df.HST_STGA.where(st0 | st1 | st2 | st4))
+        for stage in [0, 1, 2, 4]:
+            km.plot(ax[3], stage, "Stage {0}".format(stage))
 
         # age
-        kmf.fit(T[age], event_observed=C[age], label="Age < 50")
-        kmf.plot(ax=ax[4]) #, ci_force_lines=True)
-        kmf.fit(T[~age], event_observed=C[~age], label="Age >= 50")
-        kmf.plot(ax=ax[4]) #, ci_force_lines=True)
+        km = index.kaplan_meier(age)
+        km.plot(ax[4], True, "Age < 50")
+        km.plot(ax[4], False, "Age >= 50")
 
         ax[0].legend(loc=3,prop={'size':10})
         ax[1].legend(loc=3,prop={'size':10})
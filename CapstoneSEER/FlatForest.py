@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class FlatForest(object):
+    ''' a fitted RandomForestClassifier compiled into flat node arrays for fast batch prediction.
+
+        the nodes of every tree are stored end to end in contiguous arrays (feature, threshold,
+        left and right child) with the normalized class probabilities of the leaves in one more
+        array.  leaves point back to themselves, so every (sample, tree) pair is stepped down
+        together with numpy indexing until it reaches a leaf.  predictions match the forest's own,
+        and small batches skip most of scikit-learn's per call overhead.
+    '''
+
+    def __init__(self, forest):
+        ''' params: forest - fitted scikit-learn RandomForestClassifier (or ExtraTreesClassifier), one output only
+        '''
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError('FlatForest only supports single output forests')
+
+        self.classes_ = np.asarray(forest.classes_)
+        self.n_classes_ = len(self.classes_)
+        self.n_features_ = forest.estimators_[0].tree_.n_features
+
+        feature, threshold, left, right, value = [], [], [], [], []
+        roots = []
+        self.max_depth = 0
+        offset = 0
+        for est in forest.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            nodes = np.arange(n)
+            leaf = tree.children_left == -1
+
+            roots.append(offset)
+            # leaves loop on themselves, feature 0 and an infinite threshold keep the lookup in bounds
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            left.append(np.where(leaf, nodes, tree.children_left) + offset)
+            right.append(np.where(leaf, nodes, tree.children_right) + offset)
+
+            # same normalization the tree's predict_proba() does
+            proba = tree.value[:, 0, :self.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(proba / normalizer)
+
+            self.max_depth = max(self.max_depth, tree.max_depth)
+            offset += n
+
+        self.roots = np.array(roots, dtype=np.int32)
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.int32)
+        self.threshold = np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64)
+        self.left = np.ascontiguousarray(np.concatenate(left), dtype=np.int32)
+        self.right = np.ascontiguousarray(np.concatenate(right), dtype=np.int32)
+        self.value = np.ascontiguousarray(np.concatenate(value))
+
+    @property
+    def nbytes(self):
+        ''' returns: bytes used by the node arrays '''
+        return sum(getattr(self, a).nbytes for a in ('roots', 'feature', 'threshold', 'left', 'right', 'value'))
+
+    def leaves(self, X):
+        ''' leaves(X)
+            params: X - 2d array of samples
+            returns: int array of the leaf node each sample lands in, one column per tree
+        '''
+        # the trees compare float32 features with float64 thresholds, do the same so ties split the same way
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_trees = len(self.roots)
+        flat_X = X.ravel()
+
+        # one entry per (sample, tree), only the ones not yet at a leaf are stepped down.
+        # base is the start of each entry's sample in the flattened X
+        idx = np.tile(self.roots, len(X))
+        base = np.repeat(np.arange(0, X.size, X.shape[1], dtype=np.intp), n_trees)
+        active = np.flatnonzero(self.left[idx] != idx)
+        while active.size:
+            node = idx[active]
+            go_left = flat_X[base[active] + self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            idx[active] = node
+            active = active[self.left[node] != node]
+
+        return idx.reshape(len(X), n_trees)
+
+    def predict_proba(self, X, batch_size=10000):
+        ''' predict_proba(X, batch_size)
+            params: X - 2d array of samples
+                    batch_size - number of samples walked at one time, bounds the samples x trees index array
+            returns: array of class probabilities, one row per sample
+        '''
+        X = np.atleast_2d(X)
+        proba = np.zeros((len(X), self.n_classes_))
+
+        for start in range(0, len(X), batch_size):
+            idx = self.leaves(X[start:start + batch_size])
+            # add the trees one at a time in order, the same sums the forest makes
+            for t in range(idx.shape[1]):
+                proba[start:start + batch_size] += self.value[idx[:, t]]
+
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X, batch_size=10000):
+        ''' returns: predicted class of every sample, see predict_proba() '''
+        return self.classes_.take(np.argmax(self.predict_proba(X, batch_size), axis=1), axis=0)
+
+    def save(self, fname):
+        ''' save(fname)
+            writes the compiled forest to a .npz file that load() reads without scikit-learn
+        '''
+        np.savez(fname, classes=self.classes_, roots=self.roots, feature=self.feature, threshold=self.threshold,
+                 left=self.left, right=self.right, value=self.value,
+                 shape=np.array([self.n_features_, self.max_depth]))
+
+    @classmethod
+    def load(cls, fname):
+        ''' load(fname)
+            returns: FlatForest read from a file written by save()
+        '''
+        f = np.load(fname)
+
+        ff = cls.__new__(cls)
+        ff.classes_ = f['classes']
+        ff.n_classes_ = len(ff.classes_)
+        ff.n_features_, ff.max_depth = [int(x) for x in f['shape']]
+        for a in ('roots', 'feature', 'threshold', 'left', 'right', 'value'):
+            setattr(ff, a, f[a])
+
+        return ff
@@ -2,6 +2,7 @@
 import time
 import os
 import sqlite3
+import hashlib
 import pandas as pd
 import numpy as np
 
@@ -13,6 +14,15 @@ class MasterSeer(object):
     # database file name on disk
     DB_NAME = 'seer.db'
 
+    # bump whenever clean_recode_data() or the seeded sampling changes so cached models and data built from
+    # the old recode or the old samples are not reused
+    RECODE_VERSION = 2
+
+    # repeatable pseudo random value for every row, see row_hash().  sqlite's RANDOM() can not be seeded.
+    # the rowid is scrambled by a multiplicative hash, xor'd with the seed's hash and scrambled again, so each
+    # seed gets its own permutation of the rows.  sqlite has no xor, a ^ s is written (a | s) - (a & s)
+    ROW_HASH = '((((((rowid * 2654435761) % 4294967291) | {0}) - (((rowid * 2654435761) % 4294967291) & {0})) * 1597334677) % 4294967291)'
+
     def __init__(self, path = r'./data/', reload = True, verbose = True):
 
         if type(path) != str:
@@ -105,7 +115,7 @@ class MasterSeer(object):
         return df
 
 
-    def load_data(self, source='breast', col=[], cond="YR_BRTH > 0", sample_size=5000, all=False):
+    def load_data(self, source='breast', col=[], cond="YR_BRTH > 0", sample_size=5000, all=False, seed=None):
         ''' loads data from the sqlite seer database
             params: source - name of table to read from. default 'breast'
                     col - list of column names to return in SELECT statement
@@ -113,6 +123,8 @@ class MasterSeer(object):
                            defaults to 'YR_BRTH > 0'
                     sample_size - number of records to return
                     all - if set to true, return entire table and ignore sample_size
+                    seed - if set, the sample is drawn in a repeatable pseudo random order for this seed
+                           instead of ORDER BY RANDOM(), so the same seed returns the same rows every time
 
             returns: dataframe of data
         '''
@@ -126,17 +138,76 @@ class MasterSeer(object):
             randomize = ""
         else:
             limit = "LIMIT " + str(sample_size)
-            randomize = "ORDER BY RANDOM()"
+            if seed is None:
+                randomize = "ORDER BY RANDOM()"
+            else:
+                randomize = "ORDER BY " + self.row_hash(seed) + ", rowid"
 
         df = pd.read_sql_query("SELECT {0} FROM {1} WHERE {2} {3} {4}".format(col, source, cond, randomize, limit), self.db_conn)
 
         return df
 
-    def clean_recode_data(self, df, dependent_cutoffs):
+    def row_hash(self, seed):
+        ''' row_hash(seed)
+            params: seed - integer seed
+            returns: sql expression of a repeatable pseudo random value for every row, see ROW_HASH
+        '''
+        # an odd multiplier mod 2^32 gives every seed below 2^32 its own 32 bit mask
+        return self.ROW_HASH.format((int(seed) * 2654435761) % 2**32)
+
+    def iter_data(self, source='breast', col=[], cond="YR_BRTH > 0", chunk_size=50000, seed=None):
+        ''' iter_data(source, col, cond, chunk_size, seed)
+            reads the whole table in chunks so it never has to fit in memory at once
+            params: source - name of table to read from. default 'breast'
+                    col - list of column names to return in SELECT statement
+                    cond - string for WHERE clause of SELECT statement (do not include the keyword WHERE in the string)
+                    chunk_size - number of rows in each chunk
+                    seed - if set, the rows come in the repeatable pseudo random order of this seed, like
+                           load_data(), instead of table order.  sqlite sorts the table on disk first.
+
+            returns: generator of dataframes of at most chunk_size rows
+        '''
+        if col:
+            col = ','.join(map(str, col))
+        else:
+            col = "*"
+
+        order = "" if seed is None else "ORDER BY " + self.row_hash(seed) + ", rowid"
+
+        return pd.read_sql_query("SELECT {0} FROM {1} WHERE {2} {3}".format(col, source, cond, order), self.db_conn, chunksize=chunk_size)
+
+    def fingerprint(self, df, *extra):
+        ''' fingerprint(df, *extra)
+            params: df - dataframe to identify
+                    extra - any other values that should be part of the key, i.e. seed or number of folds
+            returns: hex string that changes whenever the rows, columns, values or extra values change
+        '''
+        h = hashlib.sha1()
+        h.update(','.join(map(str, df.columns)).encode())
+        h.update(str(df.shape).encode())
+        for c in df.columns:
+            values = df[c].values
+            if values.dtype == object:
+                # raw bytes of an object array are pointers, hash the text instead
+                h.update('\x1f'.join(map(str, values)).encode())
+            else:
+                h.update(np.ascontiguousarray(values).tobytes())
+        for x in extra:
+            h.update(str(x).encode())
+
+        return h.hexdigest()
+
+    def db_fingerprint(self):
+        ''' returns: string that changes whenever the database file is rewritten, from its size and modified time '''
+        st = os.stat(self.path + self.DB_NAME)
+        return '{0}-{1}'.format(st.st_size, st.st_mtime_ns)
+
+    def clean_recode_data(self, df, dependent_cutoffs, save=True):
         """ clean_recode_data(df)
             params: df - dataframe of seer data to clean
                     dependent_cutoffs - months to use to code SRV_BUCKET
                                         if blank, then use SRV_TIME_MON and don't code into survival buckets.
+                    save - write the cleaned data to clean.xlsx, turn off when cleaning many chunks
             returns: cleaned dataframe, and name of new coded dependent variable
 
             Each cleaning step is on its own line so we can pick and choose what
@@ -284,17 +355,17 @@ class MasterSeer(object):
 
         if len(dependent_cutoffs) > 0:
             # create new column of all NaN
-            df['SRV_BUCKET'] = np.NaN
+            df['SRV_BUCKET'] = np.nan
             # fill buckets
             last_cut = 0
             for x, cut in enumerate(dependent_cutoffs):
                 df.loc[(df.SRV_TIME_MON >= last_cut) & (df.SRV_TIME_MON < cut), 'SRV_BUCKET'] = x
                 last_cut = cut
             # assign all values larger than last cutoff to next bucket number
-            df['SRV_BUCKET'].fillna(len(dependent_cutoffs), inplace=True)
+            df['SRV_BUCKET'] = df['SRV_BUCKET'].fillna(len(dependent_cutoffs))
 
             dep_col = 'SRV_BUCKET'
-            df = df.drop('SRV_TIME_MON', 1)
+            df = df.drop('SRV_TIME_MON', axis=1)
         else:
             dep_col = 'SRV_TIME_MON'
 
@@ -302,16 +373,19 @@ class MasterSeer(object):
         #cat_cols_to_encode = list(set(['RACE', 'ORIGIN', 'SEX', 'TUMOR_2V', 'HISTREC']) & set(df.columns))
         #df = self.one_hot_data(df, cat_cols_to_encode)
 
-        df['CENSORED'] = df.STAT_REC == 4
-        df = df.drop('STAT_REC', 1)
+        # the model searches pull no STAT_REC, only the survival models need CENSORED
+        if 'STAT_REC' in df.columns:
+            df['CENSORED'] = df.STAT_REC == 4
+            df = df.drop('STAT_REC', axis=1)
 
 
         df.replace([np.inf, -np.inf], np.nan)
         df = df.fillna(0)
 
-        exc = pd.ExcelWriter('clean.xlsx')
-        df.to_excel(exc)
-        exc.save()
+        if save:
+            exc = pd.ExcelWriter('clean.xlsx')
+            df.to_excel(exc)
+            exc.close()
 
         return df, dep_col
 
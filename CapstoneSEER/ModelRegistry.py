@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+
+
+class ModelRegistry(object):
+    ''' on disk store of fitted models keyed by a fingerprint of the data and configuration.
+
+        every model is pickled to <key>.pkl with its metadata in <key>.json next to it.
+        there is no shared index file, so several processes can use the same registry and
+        every write is done to a temp file and renamed into place.
+    '''
+
+    def __init__(self, path=r'./data/models/', max_bytes=500 * 2**20, max_age_days=30, verbose=True):
+        ''' params: path - directory the models are stored in, created if missing
+                    max_bytes - total size of stored models, least recently used models are removed above this
+                    max_age_days - models not used for this many days are removed
+                    verbose - prints status messages
+        '''
+        if path[-1] != '/':
+            path += '/'
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.verbose = verbose
+
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def params(model):
+        ''' params(model)
+            params: model - estimator object, scikit-learn or lifelines
+            returns: dict of the estimator's simple settings to use in a key
+        '''
+        if hasattr(model, 'get_params'):
+            p = model.get_params()
+        else:
+            p = vars(model)
+
+        # skip fitted attributes and anything that is not a plain setting
+        return {k: v for k, v in p.items() if not k.endswith('_') and isinstance(v, (int, float, str, bool, type(None)))}
+
+    @staticmethod
+    def key(meta):
+        ''' key(meta)
+            params: meta - dict describing the fit, i.e. data fingerprint, query, recode version,
+                           estimator name and parameters
+            returns: hex string key for the model
+        '''
+        return hashlib.sha1(json.dumps(meta, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _write(self, fname, write_fnc, mode):
+        tmp = '{0}.{1}.tmp'.format(fname, os.getpid())
+        with open(tmp, mode) as f:
+            write_fnc(f)
+        os.replace(tmp, fname)
+
+    def _read_meta(self, key):
+        try:
+            with open(self.path + key + '.json', 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def get(self, key):
+        ''' get(key)
+            params: key - key from ModelRegistry.key()
+            returns: the stored model, or None if there is no model for the key
+        '''
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+
+        try:
+            with open(self.path + key + '.pkl', 'rb') as f:
+                model = pickle.load(f)
+        except (IOError, OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        # record the use for the least recently used eviction
+        meta['last_used'] = time.time()
+        self._write(self.path + key + '.json', lambda f: json.dump(meta, f), 'w')
+
+        if self.verbose:
+            print('Loaded {0} from model registry, fit in {1:.2f} sec.'.format(meta.get('estimator', 'model'), meta.get('fit_sec', 0)))
+
+        return model
+
+    def put(self, key, model, meta, fit_sec=None):
+        ''' put(key, model, meta, fit_sec)
+            params: key - key from ModelRegistry.key()
+                    model - fitted model to store
+                    meta - dict the key was made from, stored with the model
+                    fit_sec - seconds the fit took
+        '''
+        fname = self.path + key + '.pkl'
+        self._write(fname, lambda f: pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL), 'wb')
+
+        meta = dict(meta)
+        meta['fit_sec'] = fit_sec
+        meta['created'] = meta['last_used'] = time.time()
+        meta['bytes'] = os.path.getsize(fname)
+        self._write(self.path + key + '.json', lambda f: json.dump(meta, f, default=str), 'w')
+
+        self.evict()
+
+    def get_or_fit(self, meta, fit_fnc):
+        ''' get_or_fit(meta, fit_fnc)
+            params: meta - dict describing the fit, see key()
+                    fit_fnc - function with no arguments that fits and returns the model
+            returns: the stored model for meta, or the newly fitted one after storing it
+        '''
+        key = self.key(meta)
+        model = self.get(key)
+        if model is None:
+            t0 = time.perf_counter()
+            model = fit_fnc()
+            self.put(key, model, meta, time.perf_counter() - t0)
+
+        return model
+
+    def entries(self):
+        ''' returns: list of (key, metadata) for every stored model '''
+        res = []
+        for fname in os.listdir(self.path):
+            if fname.endswith('.json'):
+                key = fname[:-5]
+                meta = self._read_meta(key)
+                if meta is not None:
+                    res.append((key, meta))
+        return res
+
+    def remove(self, key):
+        ''' delete one stored model '''
+        for ext in ('.pkl', '.json'):
+            try:
+                os.remove(self.path + key + ext)
+            except OSError:
+                pass
+
+    def evict(self):
+        ''' remove models older than max_age_days, then the least recently used
+            until the registry is under max_bytes.
+        '''
+        entries = self.entries()
+        now = time.time()
+
+        keep = []
+        for key, meta in entries:
+            if now - meta.get('last_used', 0) > self.max_age_days * 86400:
+                self.remove(key)
+            else:
+                keep.append((key, meta))
+
+        keep.sort(key=lambda x: x[1].get('last_used', 0))
+        total = sum(meta.get('bytes', 0) for _, meta in keep)
+        # never evict the most recently used model even if it alone is over the limit
+        while total > self.max_bytes and len(keep) > 1:
+            key, meta = keep.pop(0)
+            self.remove(key)
+            total -= meta.get('bytes', 0)
@@ -1,28 +1,163 @@
 ﻿import time
+import os
+import tracemalloc
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from MasterSeer import MasterSeer
+from ParallelSeer import ParallelSeer, peak_rss_mb
+from ResultLog import ResultLog
+from ModelRegistry import ModelRegistry
+from DesignCache import DesignCache
+from TaskManifest import TaskManifest
 import math
 import itertools
+import heapq
 from sklearn.feature_selection import SelectPercentile, f_classif, SelectFromModel
-from sklearn.linear_model import LinearRegression, Lasso, Ridge
+from sklearn.linear_model import LinearRegression, Lasso, Ridge, SGDClassifier, SGDRegressor
 from sklearn.naive_bayes import MultinomialNB, BernoulliNB, GaussianNB
-from sklearn.cross_validation import train_test_split, KFold
+from sklearn.model_selection import train_test_split
 from sklearn.neighbors import KNeighborsRegressor, KNeighborsClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn import preprocessing
+from sklearn.base import is_classifier
 from sklearn.metrics import classification_report, f1_score, accuracy_score, precision_score, recall_score, precision_recall_fscore_support
 
+def score_combo(data, task):
+    """ score_combo(data, task)
+        fits one (style, combo) task, module level so it can run in a worker process
+
+        params: data - dict of shared X_train, y_train, X_test, y_test arrays
+                task - tuple of (model class, tuple of column positions), an optional third entry is a dict of
+                       'rows' - (n_train, n_test) only use the first rows of the train and test arrays
+                       'trace_memory' - measure the task's own peak memory with tracemalloc, exact but it
+                                        slows down allocation heavy models like RandomForest several times
+                       'target' - row of the Y_train, Y_test arrays to use as y, for sweeps over several
+                                  dependent_cutoffs, see sweep_targets()
+                       'average' - f1_score average, defaults to 'binary'
+        returns: dict with the f1 score and the task's resource use
+                    fit_sec, predict_sec, score_sec - seconds spent in each step
+                    rows, test_rows - number of rows trained and scored on
+                    num_features - number of columns in the combo
+                    mem_mb - peak memory of the task above what was in use before it.  without trace_memory
+                             this is how much the task raised the worker's peak RSS, 0 if it stayed under an
+                             earlier task's peak, None where RSS can not be read
+                    error - error message if the task failed, otherwise None
+    """
+    style_fnc, combo = task[:2]
+    opts = task[2] if len(task) > 2 else {}
+    n_train, n_test = opts.get('rows', (None, None))
+    idx = list(combo)
+
+    target = opts.get('target')
+    if target is None:
+        y_train, y_test = data['y_train'], data['y_test']
+    else:
+        y_train, y_test = data['Y_train'][target], data['Y_test'][target]
+
+    X_train, y_train = data['X_train'][:n_train, idx], y_train[:n_train]
+    X_test, y_test = data['X_test'][:n_test, idx], y_test[:n_test]
+
+    rec = {'f1': None, 'fit_sec': None, 'predict_sec': None, 'score_sec': None,
+           'rows': len(y_train), 'test_rows': len(y_test), 'num_features': len(idx), 'mem_mb': None, 'error': None}
+
+    trace_memory = opts.get('trace_memory', False)
+    started = False
+    if trace_memory:
+        # tracemalloc sees numpy and python allocations, the peak is reset so it only covers this task
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started = True
+        mem_base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    else:
+        mem_base = peak_rss_mb()
+
+    try:
+        # train this model
+        t0 = time.perf_counter()
+        model = style_fnc()
+        model.fit(X_train, y_train)
+        rec['fit_sec'] = time.perf_counter() - t0
+
+        # now test and score it
+        t0 = time.perf_counter()
+        y_pred_test = model.predict(X_test)
+        y_pred_test = np.rint(y_pred_test)
+        y_pred_test = y_pred_test.astype(int)
+        rec['predict_sec'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        rec['f1'] = f1_score(y_test, y_pred_test, average=opts.get('average', 'binary'))
+        rec['score_sec'] = time.perf_counter() - t0
+    except Exception as err:
+        rec['error'] = '{0}: {1}'.format(type(err).__name__, err)
+
+    if trace_memory:
+        rec['mem_mb'] = (tracemalloc.get_traced_memory()[1] - mem_base) / 2**20
+        # tracing slows every later allocation in this process, leave it as the caller had it
+        if started:
+            tracemalloc.stop()
+    elif mem_base is not None:
+        rec['mem_mb'] = peak_rss_mb() - mem_base
+
+    return rec
+
+
+def fit_fold(data, task):
+    """ fit_fold(data, task)
+        fits and scores one cross validation fold, module level so it can run in a worker process
+
+        params: data - dict of shared X, y and folds (fold id of every row) arrays
+                task - tuple of (model class, fold number to hold out, registry path, registry metadata)
+                       if the registry path is None the fold is always fit
+        returns: dict of the fold's test labels, predictions and per class precision, recall and f1
+    """
+    model, fold, registry_path, meta = task
+    testing = data['folds'] == fold
+
+    # Fit a model for this fold, or load it if the same fold was fit before, then apply it to the held out rows
+    def fit():
+        mdl = model()
+        mdl.fit(data['X'][~testing], data['y'][~testing])
+        return mdl
+
+    if registry_path is None:
+        mdl = fit()
+    else:
+        mdl = ModelRegistry(registry_path, verbose=False).get_or_fit(dict(meta, fold=fold), fit)
+
+    y_pred_test = mdl.predict(data['X'][testing])
+    y_pred_test = np.rint(y_pred_test)
+    y_pred_test = y_pred_test.astype(int)
+    y_test = data['y'][testing]
+
+    p,r,f,_ = precision_recall_fscore_support(y_test, y_pred_test)
+
+    return {'y_test': y_test, 'y_pred': y_pred_test, 'precision': p, 'recall': r, 'f1': f}
+
+
+def bucket_targets(srv_time, dependent_cutoffs):
+    """ bucket_targets(srv_time, dependent_cutoffs)
+        params: srv_time - array of SRV_TIME_MON values
+                dependent_cutoffs - sorted list of number of months to create buckets for
+        returns: int array of SRV_BUCKET values, the same buckets clean_recode_data() codes
+                 i.e. [60,120] gives 0 below 60, 1 from 60 to below 120 and 2 from 120 on
+    """
+    # number of cutoffs at or below each survival time is its bucket
+    return np.searchsorted(np.asarray(dependent_cutoffs), srv_time, side='right')
+
+
 class ModelSeer(MasterSeer):
 
-    def __init__(self, path=r'./data/', testMode=False, verbose=True, sample_size=5000, where="DATE_yr < 2008"):
+    def __init__(self, path=r'./data/', testMode=False, verbose=True, sample_size=5000, where="DATE_yr < 2008", use_registry=True, use_cache=True):
 
         # user supplied parameters
         self.testMode = testMode        # import one file, 500 records and return
         self.verbose = verbose          # prints status messages
         self.sample_size = sample_size  # number of rows to pull for testing
         self.where = where              # filter for SQL load of data
+        self.use_registry = use_registry  # store fitted cross validation models and reuse them
 
         if type(path) != str:
             raise TypeError('path must be a string')
@@ -36,12 +171,15 @@ class ModelSeer(MasterSeer):
         super().__init__(path, False, verbose=verbose)
         self.db_conn, self.db_cur = super().init_database(False)
 
+        # cleaned cohorts are stored here and reused by repeatable loads with the same query
+        self.design_cache = DesignCache(self.path + 'design/', verbose=verbose) if use_cache else None
+
 
     def __del__(self):
         super().__del__()
 
 
-    def prepare_test_train_sets(self, source, dependent, test_pct = .20, return_one_df=False, cols = [], dependent_cutoffs=[60]):
+    def prepare_test_train_sets(self, source, dependent, test_pct = .20, return_one_df=False, cols = [], dependent_cutoffs=[60], seed=None, all=False):
         """ prepare_test_train_sets(source, dependent):
             params:  source - table name in seer database, defaults to 'breast'
                      dependent - name of field we are testing for, need to remove from X and assign to Y
@@ -50,6 +188,8 @@ class ModelSeer(MasterSeer):
                      cols - columns to pull from sqldatabase
                      dependent_cutoffs - list of number of months to create buckets for dependent variable
                          default is [60] which will create two buckets (one <60 and one >= 60)
+                     seed - if set, pull a repeatable sample for this seed instead of random rows
+                     all - pull the whole cohort instead of sample_size rows
 
             returns: X_train, X_test, y_train, y_test, cols
                      X_train and X_test are pd.DataFrames, y_train and y_test are np.arrays
@@ -59,12 +199,27 @@ class ModelSeer(MasterSeer):
 
         # pull specified fields from database using random rows.
         cols.append(dependent)
-        df = super().load_data(source, cols, cond=self.where, sample_size=self.sample_size)
-        df, dependent = super().clean_recode_data(df, dependent_cutoffs)
+
+        def load():
+            df = super(ModelSeer, self).load_data(source, cols, cond=self.where, sample_size=self.sample_size, seed=seed, all=all)
+            # the whole cohort is too big for clean.xlsx, only samples are written out
+            return super(ModelSeer, self).clean_recode_data(df, dependent_cutoffs, save=not all)[0]
+
+        # only repeatable samples can be cached, a random sample is different every time
+        if self.design_cache is not None and (seed is not None or all):
+            meta = {'db': self.db_fingerprint(), 'source': source, 'cols': list(cols), 'where': self.where,
+                    'cutoffs': list(dependent_cutoffs), 'recode': self.RECODE_VERSION,
+                    'sample_size': None if all else self.sample_size, 'seed': None if all else seed}
+            df = self.design_cache.cohort(meta, load)
+        else:
+            df = load()
+
+        # same name clean_recode_data() gives the coded dependent column
+        dependent = 'SRV_BUCKET' if len(dependent_cutoffs) > 0 else 'SRV_TIME_MON'
 
         # drop dependent colum from feature arrays
         y = df[dependent].values
-        df = df.drop(dependent, 1)
+        df = df.drop(dependent, axis=1)
 
         if return_one_df:
             return df, y
@@ -79,7 +234,16 @@ class ModelSeer(MasterSeer):
                     styles = [MultinomialNB, BernoulliNB, LinearRegression, KNeighborsRegressor, Lasso, Ridge], 
                     num_features = 3,
                     cols = ['YR_BRTH','AGE_DX','RACE','ORIGIN','LATERAL','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS'],
-                    dependent_cutoffs=[60]):
+                    dependent_cutoffs=[60],
+                    n_jobs=1,
+                    chunk_size=None,
+                    search='exhaustive',
+                    beam_width=3,
+                    log_name=None,
+                    min_sample=1000,
+                    eta=3,
+                    trace_memory=False,
+                    seed=None):
 
         """ test_models(source = 'BREAST'):
             params:  source - table name in seer database, defaults to 'breast'
@@ -88,6 +252,30 @@ class ModelSeer(MasterSeer):
                               make sure to import modules containing the routines to test
                                 i.e. from sklearn.linear_model import LinearRegression, LogisticRegression
                      num_features - number of features to test at one time, set to 99 to test all features in one run.
+                     dependent_cutoffs - list of number of months to create buckets for dependent variable
+                     n_jobs - number of worker processes to spread the (style, combo) fits over.
+                              1 runs everything in this process, -1 uses every cpu.
+                     chunk_size - number of tasks handed to a worker at one time, None picks a size from n_jobs
+                     search - how feature sets are picked for each style
+                              'exhaustive' - every combination of num_features columns
+                              'forward'    - forward selection, add the best column until num_features
+                              'backward'   - backward elimination, drop the worst column until num_features
+                              'beam'       - forward beam search keeping the best beam_width sets at each step
+                              'halving'    - successive halving, every combination is scored on a small sample of
+                                             the whole cohort and the best 1/eta move on to an eta times larger sample
+                                             until the survivors are scored on the full cohort. ignores sample_size.
+                     beam_width - number of feature sets kept at each step of the 'beam' search
+                     log_name - result log file, defaults to source+'_seer_models.log'.
+                                every finished task is appended to the log right away and a rerun with the
+                                same log skips the (style, combo) tasks already in it for the same database,
+                                cols, where, dependent_cutoffs, sample_size and seed.  failed tasks are run again.
+                                'halving' results are not logged, every round uses a different sample size.
+                     min_sample - number of rows in the first 'halving' round
+                     eta - 'halving' keeps 1/eta of the candidates and grows the sample eta times each round, > 1
+                     trace_memory - record each task's exact peak memory with tracemalloc instead of the cheaper
+                                    growth of the worker's peak RSS.  slows down allocation heavy models.
+                     seed - pull a repeatable sample for this seed.  None pulls new random rows, so a rerun
+                            can not resume from the log and scores every task again.
                      
             returns: n/a
 
@@ -95,59 +283,71 @@ class ModelSeer(MasterSeer):
         """
         # name of excel file to dump results
         xls_name = source + '_seer_models.xlsx'
+        # checked before the whole cohort is loaded
+        if search == 'halving' and (eta <= 1 or min_sample < 1):
+            raise ValueError('halving needs eta > 1 and min_sample >= 1')
+        # results are streamed here as they finish
+        log = ResultLog(log_name or source + '_seer_models.log', self.log_settings(source, cols, dependent_cutoffs, seed, all=search == 'halving'))
+        # results on random rows are only comparable within this run
+        done = log.load_done() if seed is not None or search == 'halving' else {}
+        if done:
+            print("Resuming: {0} results already in {1}".format(len(done), log.fname))
+
         # variable to predict
         dependent = 'SRV_TIME_MON'
 
         # get sets to train and test (80/20 split)
-        X_train, X_test, y_train, y_test, cols = self.prepare_test_train_sets(source, dependent, test_pct = .20, cols = cols)
+        # halving loads the whole cohort once, its last round scores the survivors on every row anyway.
+        # the earlier rounds are growing slices of the shuffled split, so each round's sample holds the last
+        X_train, X_test, y_train, y_test, cols = self.prepare_test_train_sets(source, dependent, test_pct = .20, cols = list(cols),
+                                                                              dependent_cutoffs=dependent_cutoffs, seed=seed, all=search == 'halving')
         col_cnt = len(cols)
 
         # make sure features to test is not greater than number of columns
         num_features = min(num_features, col_cnt)
         
-        # formula for number of combinations: nCr = n! / r! (n - r)! 
-        tot_cnt = (math.factorial(col_cnt) / (math.factorial(num_features) * math.factorial(col_cnt - num_features))) * len(styles)
-        print("Processing: {0} tests.".format(int(tot_cnt)))
-
-        res = []
-        counter = 0
-        for style in range(len(styles)):
-            style_fnc = styles[style]
-            model = style_fnc()
-            print("Testing: {0}   ".format(style_fnc.__name__))
-            for combo in itertools.combinations(cols, num_features):
-                try: 
-                    # train this model
-                    X = X_train[list(combo)]
-                    #X = preprocessing.scale(x)     # scale data if model requires it
-                    model.fit(X, y_train)
-
-                    # now test and score it
-                    X = X_test[list(combo)]
-                    #X = preprocessing.scale(x)     # scale data if model requires it
-
-                    y_pred_test = model.predict(X)
-
-                    y_pred_test = np.rint(y_pred_test)
-                    y_pred_test = y_pred_test.astype(np.int)
-
-                    f1 = f1_score(y_test, y_pred_test)
-                    res.append([f1, style_fnc.__name__, [k for k in combo[:num_features]]])
-                    counter += 1
-                    if counter % 100 == 0:
-                        print("Completed: {0}".format(counter, flush=True), end = '\r')
-                except Exception as err:
-                    counter += 1
-                    if self.verbose:
-                        print(err)
-            del model
+        # train/test arrays are copied into shared memory once and used by every worker
+        data = {'X_train': np.asarray(X_train, dtype=np.float64), 'y_train': np.asarray(y_train),
+                'X_test': np.asarray(X_test, dtype=np.float64), 'y_test': np.asarray(y_test)}
+
+        executor = ParallelSeer(n_jobs=n_jobs, chunk_size=chunk_size, verbose=self.verbose)
+        opts = {'trace_memory': trace_memory}
+
+        if search == 'exhaustive':
+            # formula for number of combinations: nCr = n! / r! (n - r)! 
+            tot_cnt = (math.factorial(col_cnt) / (math.factorial(num_features) * math.factorial(col_cnt - num_features))) * len(styles)
+            print("Processing: {0} tests.".format(int(tot_cnt)))
+
+            # one task per (style, combo), combos are column positions into the shared arrays
+            tasks = [(style_fnc, combo, opts) for style_fnc in styles
+                                        for combo in itertools.combinations(range(col_cnt), num_features)]
+
+            with executor.start(score_combo, data):
+                recs = self.score_tasks(executor, tasks, cols, log, done)
+
+            res = [[rec['f1'], rec['style'], rec['combo']] for rec in recs if rec['error'] is None]
+            counter = len(tasks)
+        elif search == 'halving':
+            with executor.start(score_combo, data):
+                recs, counter = self.halving_search(executor, styles, cols, num_features, len(y_train), len(y_test), min_sample, eta, opts)
+
+            res = [[rec['f1'], rec['style'], rec['combo']] for rec in recs]
+        else:
+            res = []
+            counter = 0
+            with executor.start(score_combo, data):
+                for style_fnc in styles:
+                    print("Testing: {0}   ".format(style_fnc.__name__))
+                    steps, fits = self.search_features(executor, style_fnc, cols, num_features, search, beam_width, log, done, opts)
+                    res.extend([rec['f1'], rec['style'], rec['combo']] for rec in steps)
+                    counter += fits
 
         # store trial results to excel
         res = sorted(res, reverse=True)
         res_df = pd.DataFrame(res)
         exc = pd.ExcelWriter(xls_name)
         res_df.to_excel(exc)
-        exc.save()
+        exc.close()
 
         # cross validate and plot best model
         #TODO get parameters from res
@@ -155,7 +355,381 @@ class ModelSeer(MasterSeer):
 
         print("\nAll Completed: {0}  Results stored in: {1}".format(counter, xls_name))
 
-    def cross_val_model(self, model, features, source='breast', sample_size=5000, num_folds = 5, dependent_cutoffs=[60]):
+    def sweep_targets(self,
+                      source = 'breast',
+                      styles = [MultinomialNB, BernoulliNB, KNeighborsRegressor, Lasso, Ridge],
+                      num_features = 3,
+                      cols = ['YR_BRTH','AGE_DX','RACE','ORIGIN','LATERAL','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS'],
+                      targets = [[60], [60, 120], [12, 36, 60]],
+                      seed = 0,
+                      n_jobs = 1,
+                      chunk_size = None,
+                      log_name = None,
+                      trace_memory = False):
+        """ sweep_targets(source, styles, num_features, cols, targets, seed, n_jobs, chunk_size, log_name, trace_memory)
+            test_models() over several survival bucketings in one run.
+
+            params:  source - table name in seer database, defaults to 'breast'
+                     styles - list of model classes to test
+                     num_features - number of features in each combination
+                     cols - columns to pull from the database, with STAT_REC the CENSORED flag is one of the features
+                     targets - list of dependent_cutoffs lists, one per target to test
+                     seed - seed for the sample, the same seed gives the same cohort and split
+                     n_jobs, chunk_size, trace_memory - see test_models()
+                     log_name - result log file, defaults to source+'_seer_targets.log'.
+                                records carry their target and a rerun with the same data and seed skips the
+                                ones already logged.
+
+            returns: dataframe of f1, target, style and combo sorted best first, also saved to source+'_seer_targets.xlsx'
+
+            the cohort is loaded and cleaned once keeping the raw SRV_TIME_MON, every target is binned from it
+            with bucket_targets() and all of them are scored against the same train/test split.
+            f1 is 'binary' for single cutoff targets like test_models() and 'weighted' over the buckets otherwise.
+        """
+        xls_name = source + '_seer_targets.xlsx'
+        log = ResultLog(log_name or source + '_seer_targets.log', self.log_settings(source, cols, [], seed))
+        done = log.load_done() if seed is not None else {}
+        if done:
+            print("Resuming: {0} results already in {1}".format(len(done), log.fname))
+
+        # no cutoffs keeps SRV_TIME_MON as the dependent so every bucketing can be made from it
+        X_train, X_test, srv_train, srv_test, cols = self.prepare_test_train_sets(source, 'SRV_TIME_MON', test_pct = .20, cols = list(cols),
+                                                                                  dependent_cutoffs=[], seed=seed)
+        num_features = min(num_features, len(cols))
+
+        # one row of y per target, shared with the workers along with X
+        data = {'X_train': np.asarray(X_train, dtype=np.float64), 'X_test': np.asarray(X_test, dtype=np.float64),
+                'Y_train': np.vstack([bucket_targets(srv_train, cuts) for cuts in targets]),
+                'Y_test': np.vstack([bucket_targets(srv_test, cuts) for cuts in targets])}
+
+        combos = list(itertools.combinations(range(len(cols)), num_features))
+        print("Processing: {0} tests.".format(len(combos) * len(styles) * len(targets)))
+
+        res = []
+        executor = ParallelSeer(n_jobs=n_jobs, chunk_size=chunk_size, verbose=self.verbose)
+        with executor.start(score_combo, data):
+            for t, cuts in enumerate(targets):
+                opts = {'trace_memory': trace_memory, 'target': t, 'average': 'binary' if len(cuts) == 1 else 'weighted'}
+                tasks = [(style_fnc, combo, opts) for style_fnc in styles for combo in combos]
+
+                recs = self.score_tasks(executor, tasks, cols, log, done, target=cuts)
+                res.extend([rec['f1'], ','.join(map(str, cuts)), rec['style'], ','.join(rec['combo'])] for rec in recs if rec['error'] is None)
+
+        res_df = pd.DataFrame(sorted(res, reverse=True), columns=['f1', 'target', 'style', 'combo'])
+        exc = pd.ExcelWriter(xls_name)
+        res_df.to_excel(exc)
+        exc.close()
+
+        print("\nAll Completed: {0}  Results stored in: {1}".format(len(res), xls_name))
+
+        return res_df
+
+    def write_manifest(self,
+                       manifest_path,
+                       source = 'breast',
+                       styles = [MultinomialNB, BernoulliNB, LinearRegression, KNeighborsRegressor, Lasso, Ridge],
+                       num_features = 3,
+                       cols = ['YR_BRTH','AGE_DX','RACE','ORIGIN','LATERAL','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS'],
+                       dependent_cutoffs = [60],
+                       seed = 0,
+                       range_size = 100):
+        """ write_manifest(manifest_path, source, styles, num_features, cols, dependent_cutoffs, seed, range_size)
+            write an exhaustive test_models() search to a manifest directory on a shared filesystem instead of running it.
+            start any number of workers with run_manifest(), or from the command line:
+                python TaskManifest.py worker <manifest_path> --n-jobs 4
+            then combine the results with merge_manifest().
+
+            params: manifest_path - new directory for the manifest, on a filesystem every worker can reach
+                    source, styles, num_features, cols, dependent_cutoffs - see test_models()
+                    seed - seed of the sample, every worker loads the same rows and split with it
+                    range_size - number of (style, combo) tasks a worker claims at one time
+
+            returns: the TaskManifest
+        """
+        # load once to record the data fingerprint, workers refuse to run on different data
+        X_train, X_test, y_train, y_test, data_cols = self.prepare_test_train_sets(source, 'SRV_TIME_MON', test_pct = .20, cols = list(cols),
+                                                                                   dependent_cutoffs=dependent_cutoffs, seed=seed)
+        data_cols = list(data_cols)
+        num_features = min(num_features, len(data_cols))
+
+        tasks = [[TaskManifest.style_name(style_fnc), [data_cols[k] for k in combo]] for style_fnc in styles
+                                              for combo in itertools.combinations(range(len(data_cols)), num_features)]
+
+        settings = {'source': source, 'cols': list(cols), 'dependent_cutoffs': list(dependent_cutoffs), 'seed': seed,
+                    'sample_size': self.sample_size, 'where': self.where,
+                    'data': self.fingerprint(X_train.assign(_y=y_train))}
+
+        man = TaskManifest(manifest_path)
+        man.create(settings, tasks, range_size)
+        print("Manifest: {0} tests in {1} ranges written to {2}".format(len(tasks), man.manifest['num_ranges'], man.path))
+
+        return man
+
+    def run_manifest(self, manifest_path, n_jobs=1, chunk_size=None, trace_memory=False):
+        """ run_manifest(manifest_path, n_jobs, chunk_size, trace_memory)
+            work through a manifest from write_manifest(), claiming one range of tasks at a time
+            until every range is finished or claimed by another worker
+
+            params: manifest_path - manifest directory
+                    n_jobs, chunk_size, trace_memory - see test_models(), for this worker's own processes
+            returns: number of ranges this worker finished
+        """
+        man = TaskManifest(manifest_path)
+        m = man.manifest
+
+        # rebuild the exact sample the manifest was written from
+        self.sample_size = m['sample_size']
+        self.where = m['where']
+        X_train, X_test, y_train, y_test, cols = self.prepare_test_train_sets(m['source'], 'SRV_TIME_MON', test_pct = .20, cols = list(m['cols']),
+                                                                              dependent_cutoffs=m['dependent_cutoffs'], seed=m['seed'])
+        if self.fingerprint(X_train.assign(_y=y_train)) != m['data']:
+            raise ValueError('data does not match the manifest, check the database on this host')
+
+        cols = list(cols)
+        position = {col: k for k, col in enumerate(cols)}
+        styles = {}
+
+        data = {'X_train': np.asarray(X_train, dtype=np.float64), 'y_train': np.asarray(y_train),
+                'X_test': np.asarray(X_test, dtype=np.float64), 'y_test': np.asarray(y_test)}
+        opts = {'trace_memory': trace_memory}
+
+        finished = 0
+        executor = ParallelSeer(n_jobs=n_jobs, chunk_size=chunk_size, verbose=self.verbose)
+        with executor.start(score_combo, data):
+            n = man.claim()
+            while n is not None:
+                tasks = []
+                for style, combo in man.task_range(n):
+                    if style not in styles:
+                        styles[style] = TaskManifest.style_class(style)
+                    tasks.append((styles[style], tuple(position[col] for col in combo), opts))
+
+                # the lock is refreshed while the range runs so other workers do not take it as stale
+                with man.keep_alive(n):
+                    recs = self.score_tasks(executor, tasks, cols)
+                    man.finish(n, recs)
+                finished += 1
+                if self.verbose:
+                    print("Finished range {0} of {1}".format(n + 1, m['num_ranges']))
+
+                n = man.claim()
+
+        print("\nWorker {0} finished {1} ranges".format(man.worker, finished))
+
+        return finished
+
+    def merge_manifest(self, manifest_path, xls_name=None):
+        """ merge_manifest(manifest_path, xls_name)
+            combine the worker results of a manifest into one table like test_models()
+
+            params: manifest_path - manifest directory
+                    xls_name - excel file for the results, defaults to source+'_seer_models.xlsx'
+            returns: dataframe of f1, style and combo sorted best first
+        """
+        man = TaskManifest(manifest_path)
+        status = man.status()
+        if status['done'] < status['ranges']:
+            print("Warning: {0} of {1} ranges are not finished, {2} are claimed".format(status['ranges'] - status['done'],
+                                                                                        status['ranges'], status['claimed']))
+
+        res = [[rec['f1'], rec['style'], rec['combo']] for rec in man.records() if rec['error'] is None]
+
+        xls_name = xls_name or man.manifest['source'] + '_seer_models.xlsx'
+        res_df = pd.DataFrame(sorted(res, reverse=True), columns=['f1', 'style', 'combo'])
+        exc = pd.ExcelWriter(xls_name)
+        res_df.to_excel(exc)
+        exc.close()
+
+        print("\nMerged: {0}  Results stored in: {1}".format(len(res), xls_name))
+
+        return res_df
+
+    def log_settings(self, source, cols, dependent_cutoffs, seed=None, all=False):
+        """ log_settings(source, cols, dependent_cutoffs, seed, all)
+            params: see prepare_test_train_sets()
+            returns: dict of the data and settings the scores in a result log depend on, see ResultLog
+        """
+        return {'db': self.db_fingerprint(), 'source': source, 'cols': list(cols), 'where': self.where,
+                'cutoffs': list(dependent_cutoffs), 'recode': self.RECODE_VERSION,
+                'sample_size': None if all else self.sample_size, 'seed': None if all else seed}
+
+    def score_tasks(self, executor, tasks, cols, log=None, done=None, target=None):
+        """ score_tasks(executor, tasks, cols, log, done, target)
+            params: executor - started ParallelSeer running score_combo against the train/test arrays
+                    tasks - list of (model class, tuple of column positions, task options), see score_combo()
+                    cols - column names of the shared arrays
+                    log - ResultLog new results are appended to as each chunk finishes
+                    done - dict of key: record already in the log, new results are added to it
+                    target - dependent_cutoffs the tasks are scored against, recorded when sweeping several targets
+            returns: list of result records in the same order as tasks
+
+            tasks with a record in done are not fit again
+        """
+        done = {} if done is None else done
+
+        keys = [ResultLog.key(task[0].__name__, [cols[k] for k in task[1]], target) for task in tasks]
+        todo = [task for task, key in zip(tasks, keys) if key not in done]
+
+        for chunk in executor.imap(todo):
+            recs = []
+            for task, rec in chunk:
+                rec['style'] = task[0].__name__
+                rec['combo'] = [cols[k] for k in task[1]]
+                if target is not None:
+                    rec['target'] = list(target)
+                if rec['error'] is not None and self.verbose:
+                    print(rec['error'])
+                done[ResultLog.key(rec['style'], rec['combo'], target)] = rec
+                recs.append(rec)
+
+            if log is not None:
+                log.append(recs)
+
+        return [done[key] for key in keys]
+
+    def search_features(self, executor, style_fnc, cols, num_features, search='forward', beam_width=3, log=None, done=None, opts={}):
+        """ search_features(executor, style_fnc, cols, num_features, search, beam_width, log, done, opts)
+            greedy or beam search over feature sets for one style, used by test_models()
+            instead of trying every combination.
+
+            params: executor - started ParallelSeer running score_combo against the train/test arrays
+                    style_fnc - model class to fit
+                    cols - column names of the shared arrays
+                    num_features - size of the feature set to stop at
+                    search - 'forward', 'backward' or 'beam'
+                    beam_width - number of sets kept at each step for 'beam'
+                    log, done - result log and records already in it, see score_tasks()
+                    opts - task options for score_combo()
+            returns: list of result records for the best set at every step, and the number of tasks run
+
+            all candidates for one step are scored in a single batch through the executor
+        """
+        col_cnt = len(cols)
+
+        if search == 'forward':
+            beam, width, grow = [()], 1, True
+        elif search == 'beam':
+            beam, width, grow = [()], beam_width, True
+        elif search == 'backward':
+            beam, width, grow = [tuple(range(col_cnt))], 1, False
+        else:
+            raise ValueError('unknown search: {0}'.format(search))
+
+        steps = []
+        fits = 0
+
+        # backward elimination scores the full set before removing anything
+        if not grow:
+            rec = self.score_tasks(executor, [(style_fnc, beam[0], opts)], cols, log, done)[0]
+            fits += 1
+            if rec['error'] is None:
+                steps.append(rec)
+
+        while (grow and len(beam[0]) < num_features) or (not grow and len(beam[0]) > num_features):
+            # expand every set in the beam by one column added or removed, skip duplicates
+            candidates = set()
+            for combo in beam:
+                if grow:
+                    candidates.update(tuple(sorted(combo + (k,))) for k in range(col_cnt) if k not in combo)
+                else:
+                    candidates.update(tuple(k for k in combo if k != drop) for drop in combo)
+            candidates = sorted(candidates)
+
+            recs = self.score_tasks(executor, [(style_fnc, combo, opts) for combo in candidates], cols, log, done)
+            fits += len(candidates)
+
+            scored = [[rec['f1'], combo, rec] for combo, rec in zip(candidates, recs) if rec['error'] is None]
+            if not scored:
+                break
+
+            # highest score first, ties keep the lowest column positions so runs are repeatable
+            scored.sort(key=lambda x: (-x[0], x[1]))
+            beam = [combo for _, combo, _ in scored[:width]]
+            steps.append(scored[0][2])
+
+        return steps, fits
+
+    def halving_search(self, executor, styles, cols, num_features, n_train, n_test, min_sample=1000, eta=3, opts={}):
+        """ halving_search(executor, styles, cols, num_features, n_train, n_test, min_sample, eta, opts)
+            successive halving over every (style, combo), used by test_models()
+
+            params: executor - started ParallelSeer running score_combo against the train/test arrays
+                    styles - list of model classes
+                    cols - column names of the shared arrays
+                    num_features - number of features in each combination
+                    n_train, n_test - number of rows in the shared train and test arrays
+                    min_sample - number of rows (train + test) in the first round
+                    eta - keep the best 1/eta candidates and grow the sample eta times each round
+                    opts - task options for score_combo()
+            returns: list of result records of the last round, and the number of tasks run
+
+            the train/test arrays are already shuffled so the first rows of each are a seeded random
+            sample, and every round is a larger slice of the same shared data.
+        """
+        # each round must grow the sample, otherwise the rounds never reach the full cohort
+        if eta <= 1 or min_sample < 1:
+            raise ValueError('halving needs eta > 1 and min_sample >= 1')
+
+        total = n_train + n_test
+
+        # sample sizes from the full cohort down, so the last round always uses every row
+        sizes = [total]
+        while sizes[-1] / eta >= min_sample:
+            sizes.append(int(sizes[-1] / eta))
+        sizes.reverse()
+
+        candidates = [(style_fnc, combo) for style_fnc in styles
+                                         for combo in itertools.combinations(range(len(cols)), num_features)]
+        print("Processing: {0} tests over {1} rounds.".format(len(candidates), len(sizes)))
+
+        fits = 0
+        for rnd, size in enumerate(sizes):
+            rows = (int(round(size * n_train / total)), int(round(size * n_test / total)))
+            recs = self.score_tasks(executor, [task + (dict(opts, rows=rows),) for task in candidates], cols)
+            fits += len(candidates)
+
+            scored = [[rec['f1'], task, rec] for task, rec in zip(candidates, recs) if rec['error'] is None]
+            scored.sort(key=lambda x: (-x[0], x[1][1], x[1][0].__name__))
+            if self.verbose:
+                print("Round {0}: {1} rows, {2} candidates, best f1 {3:.4f}".format(rnd + 1, size, len(candidates),
+                                                                                    scored[0][0] if scored else 0))
+
+            if rnd == len(sizes) - 1 or not scored:
+                return [rec for _, _, rec in scored], fits
+
+            # keep the top 1/eta for the next, larger round
+            keep = max(int(math.ceil(len(scored) / float(eta))), 1)
+            candidates = [task for _, task, _ in scored[:keep]]
+
+    def fold_assignments(self, X, num_folds=5, seed=0):
+        """ fold_assignments(X, num_folds, seed)
+            params: X - dataframe of the cohort to split, the fingerprint of its values is the cache key
+                    num_folds - number of folds
+                    seed - seed used to shuffle rows into folds, None shuffles them differently every time
+            returns: numpy array with the fold number of every row
+
+            fold ids are stored in path/folds/ so repeated cross validation of the same cohort
+            and seed uses the same splits.  folds without a seed are not stored.
+        """
+        fold_path = self.path + 'folds/'
+        fname = fold_path + self.fingerprint(X, num_folds, seed) + '.npy'
+
+        if seed is not None and os.path.exists(fname):
+            return np.load(fname)
+
+        # shuffle the rows then deal them out to the folds like cards so fold sizes differ by at most one
+        rng = np.random.RandomState(seed)
+        folds = np.empty(len(X), dtype=np.int16)
+        folds[rng.permutation(len(X))] = np.arange(len(X)) % num_folds
+
+        if seed is not None:
+            os.makedirs(fold_path, exist_ok=True)
+            np.save(fname, folds)
+
+        return folds
+
+    def cross_val_model(self, model, features, source='breast', sample_size=5000, num_folds = 5, dependent_cutoffs=[60],
+                        seed=None, n_jobs=1, plot=True):
         """ cr_val_model(self, model, model_name, source)
             perform cross-validation on a specific model using specified sample size
 
@@ -165,52 +739,57 @@ class ModelSeer(MasterSeer):
                     num_folds - number of folds for cross validation
                     dependent_cutoffs - list of number of months to create buckets for dependent variable
                         default is [60] which will create two buckets (one <60 and one >= 60)
+                    seed - seed for the sample and the fold assignments, the same seed gives the same splits.
+                           None pulls random rows and folds every run, and the fold models are not stored
+                    n_jobs - number of worker processes to fit the folds in, 1 fits them one after another
+                    plot - plot the last fold's predictions
+
+            returns: dict of 'precision', 'recall' and 'f1' lists with one entry per fold
         """
-        
-        mdl = model()
         model_name = model.__name__
 
         # variable to predict
         dependent = 'SRV_TIME_MON'
 
-        # get all of the data, we will split to test/train using scikit's KFold routine
-        X, y = self.prepare_test_train_sets(source, dependent, return_one_df=True, cols = features, dependent_cutoffs=dependent_cutoffs)
+        # get all of the data, folds are assigned from the cached fold ids for this cohort
+        X, y = self.prepare_test_train_sets(source, dependent, return_one_df=True, cols = list(features), dependent_cutoffs=dependent_cutoffs,
+                                            seed=seed)
+        folds = self.fold_assignments(X, num_folds, seed)
+
+        # fold models are stored in the registry under the data, query and model settings
+        registry_path = None
+        meta = {'data': self.fingerprint(X.assign(SRV_BUCKET=y)), 'query': ','.join(features) + ' WHERE ' + self.where, 'recode': self.RECODE_VERSION,
+                'cutoffs': dependent_cutoffs, 'estimator': model_name, 'params': ModelRegistry.params(model()),
+                'num_folds': num_folds, 'seed': seed}
+        if self.use_registry and seed is not None:
+            registry_path = self.path + 'models/'
+
         X = np.array(X, dtype=np.float16)
-        y = y.astype(np.int)
+        y = y.astype(int)
+
+        # every fold is fit in its own task against the shared X, y and fold id arrays
+        tasks = [(model, fold, registry_path, meta) for fold in range(num_folds)]
+        executor = ParallelSeer(n_jobs=n_jobs, verbose=False)
+        fold_res = executor.run(fit_fold, tasks, {'X': X, 'y': y, 'folds': folds})
 
-        kf = KFold(len(X), n_folds=num_folds, shuffle=True)
-        # `means` will be a list of mean accuracies (one entry per fold)
         scores = {'precision':[], 'recall':[], 'f1':[]}
-        for training, testing in kf:
-            # Fit a model for this fold, then apply it to the
-            Xtrn = X[training]
-            #min_max_scaler = preprocessing.MinMaxScaler()
-            #X_train_minmax = min_max_scaler.fit_transform(Xtrn)
-            mdl.fit(Xtrn, y[training])
-
-            Xtst = X[testing]
-            #min_max_scaler = preprocessing.MinMaxScaler()
-            #Xtst = min_max_scaler.fit_transform(Xtst)
-            y_pred_test = mdl.predict(Xtst)
-            y_pred_test = np.rint(y_pred_test)
-            y_pred_test = y_pred_test.astype(np.int)
-
-            # last batch is used for plotting
-            y_test = y[testing]
+        for res in fold_res:
+            y_test = res['y_test']
+            y_pred_test = res['y_pred']
 
             classificationReport = classification_report(y_test, y_pred_test)
             print("Report For: {0}".format(model_name))
             print(classificationReport)
 
             # Append scores for this run
+            scores['precision'].append(res['precision'])
+            scores['recall'].append(res['recall'])
+            scores['f1'].append(res['f1'])
 
-            nn = precision_score(y_test, y_pred_test, average='micro')
-
-            p,r,f,_ = precision_recall_fscore_support(y_test, y_pred_test)
-            scores['precision'].append(p)
-            scores['recall'].append(r)
-            scores['f1'].append(f)
+        if not plot:
+            return scores
 
+        # last batch is used for plotting
         # sort the y test data and keep the y_pred_test array in sync 
         # sort to make the graph more informative
         y_test, y_pred_test = zip(*sorted(zip(y_test, y_pred_test)))
@@ -224,8 +803,170 @@ class ModelSeer(MasterSeer):
         plt.ylim(0, 6)
         plt.show()
 
-        #print(scores)
+        return scores
+
 
+    def stream_chunks(self, source, features, dependent_cutoffs, chunk_size, holdout, test, seed=None):
+        """ stream_chunks(source, features, dependent_cutoffs, chunk_size, holdout, test, seed)
+            params: source - table name in seer database
+                    features - list of fields to use for the model
+                    dependent_cutoffs - list of number of months to create buckets for dependent variable
+                    chunk_size - number of rows read from sqlite at one time
+                    holdout - one in holdout rows is kept out of training for testing
+                    test - True streams the held out rows, False the training rows
+                    seed - if set, the rows are streamed in this seed's pseudo random order so every chunk
+                           is a random draw of the cohort, None streams them in table (load) order
+            returns: generator of cleaned X, y numpy arrays, one pair per chunk
+
+            rows are split by a hash of their rowid so the two streams never overlap and never change
+        """
+        split = "{0} % {1} {2} 0".format(self.row_hash(0), int(holdout), '=' if test else '!=')
+        cond = "({0}) AND {1}".format(self.where, split) if self.where else split
+
+        for df in self.iter_data(source, list(features) + ['SRV_TIME_MON'], cond=cond, chunk_size=chunk_size, seed=seed):
+            df, dependent = self.clean_recode_data(df, dependent_cutoffs, save=False)
+            if len(df) == 0:
+                continue
+
+            y = df[dependent].values.astype(int)
+            X = np.array(df.drop(dependent, axis=1), dtype=np.float64)
+            yield X, y
+
+    def stream_model(self, model, features, source='breast', dependent_cutoffs=[60], chunk_size=50000, holdout=5, passes=1, scale=False, seed=0):
+        """ stream_model(model, features, source, dependent_cutoffs, chunk_size, holdout, passes, scale, seed)
+            train on every row of the cohort with bounded memory using partial_fit on one chunk at a time,
+            instead of the random sample_size rows the other routines use.
+
+            params: model - scikit-learn class that supports partial_fit
+                            i.e. MultinomialNB, BernoulliNB, SGDClassifier, SGDRegressor
+                    features - list of features(fields) to use for model
+                    source - table name in seer database, defaults to 'breast'
+                    dependent_cutoffs - list of number of months to create buckets for dependent variable
+                    chunk_size - number of rows read, cleaned and fit at one time
+                    holdout - one in holdout rows is held out of training and used to score the model
+                    passes - number of times to stream the training rows through the model
+                    scale - standardize the features first, needed for the SGD models.
+                            costs one extra pass over the training rows.
+                    seed - order of the training rows.  table order follows the SEER files as they were loaded,
+                           so partial_fit would see one slice of the cohort after another.  every pass is
+                           shuffled again with the next seed.
+
+            returns: fitted model, scaler (None if scale is False) and dict of per class 'precision', 'recall'
+                     and 'f1' from the held out rows, plus the number of 'train_rows' and 'test_rows'
+        """
+        mdl = model()
+        if not hasattr(mdl, 'partial_fit'):
+            raise TypeError('{0} does not support partial_fit'.format(model.__name__))
+
+        # partial_fit needs every bucket up front because a chunk may not contain all of them
+        num_classes = len(dependent_cutoffs) + 1
+        classes = np.arange(num_classes)
+
+        scaler = None
+        if scale:
+            scaler = preprocessing.StandardScaler()
+            for X, y in self.stream_chunks(source, features, dependent_cutoffs, chunk_size, holdout, False):
+                scaler.partial_fit(X)
+
+        train_rows = 0
+        for p in range(passes):
+            for X, y in self.stream_chunks(source, features, dependent_cutoffs, chunk_size, holdout, False, seed + p):
+                if scaler is not None:
+                    X = scaler.transform(X)
+
+                if is_classifier(mdl):
+                    mdl.partial_fit(X, y, classes=classes)
+                else:
+                    mdl.partial_fit(X, y)
+
+                if p == 0:
+                    train_rows += len(y)
+                if self.verbose:
+                    print("Trained: {0}".format(train_rows), end='\r', flush=True)
+
+        # score the held out stream through a running confusion matrix so no predictions are kept
+        confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        for X, y in self.stream_chunks(source, features, dependent_cutoffs, chunk_size, holdout, True):
+            if scaler is not None:
+                X = scaler.transform(X)
+
+            # regressors can predict outside of the buckets, clip them to the nearest one
+            y_pred = np.clip(np.rint(mdl.predict(X)).astype(int), 0, num_classes - 1)
+            confusion += np.bincount(y * num_classes + y_pred, minlength=num_classes ** 2).reshape(num_classes, num_classes)
+
+        tp = np.diag(confusion).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = np.nan_to_num(tp / confusion.sum(axis=0))
+            r = np.nan_to_num(tp / confusion.sum(axis=1))
+            f = np.nan_to_num(2 * p * r / (p + r))
+
+        scores = {'precision': p, 'recall': r, 'f1': f, 'train_rows': train_rows, 'test_rows': int(confusion.sum())}
+
+        if self.verbose:
+            print("\nStreamed {0}: {1} training rows, {2} held out rows".format(model.__name__, train_rows, scores['test_rows']))
+            print("F1 by bucket: {0}".format(f))
+
+        return mdl, scaler, scores
+
+    def search_report(self, source='breast', log_name=None, n=10):
+        """ search_report(source, log_name, n)
+            summary of where model search time went, read from the test_models() result log
+
+            params: source - table name used for the default log name
+                    log_name - result log file, defaults to source+'_seer_models.log'
+                    n - number of rows in each table
+            returns: dataframe of totals by estimator, dataframe of the n slowest (style, combo) tasks,
+                     and dataframe of the n tasks with the most seconds per point of f1 (expensive and low value)
+        """
+        log = ResultLog(log_name or source + '_seer_models.log')
+
+        by_style = {}
+        slowest = []
+        costly = []
+        for i, rec in enumerate(log):
+            secs = sum(rec.get(k) or 0 for k in ('fit_sec', 'predict_sec', 'score_sec'))
+
+            st = by_style.setdefault(rec['style'], {'tasks': 0, 'errors': 0, 'fit_sec': 0., 'predict_sec': 0., 'score_sec': 0.,
+                                                    'max_mem_mb': 0., 'best_f1': None})
+            st['tasks'] += 1
+            st['errors'] += rec['error'] is not None
+            for k in ('fit_sec', 'predict_sec', 'score_sec'):
+                st[k] += rec.get(k) or 0
+            st['max_mem_mb'] = max(st['max_mem_mb'], rec.get('mem_mb') or 0)
+            if rec['f1'] is not None and (st['best_f1'] is None or rec['f1'] > st['best_f1']):
+                st['best_f1'] = rec['f1']
+
+            # keep only the n worst of each so the log is never held in memory
+            row = [rec['style'], ','.join(rec['combo']), secs, rec['f1'], rec.get('mem_mb'), rec['error']]
+            heapq.heappush(slowest, (secs, i, row))
+            if len(slowest) > n:
+                heapq.heappop(slowest)
+
+            cost = secs / max(rec['f1'] or 0, 1e-3)
+            heapq.heappush(costly, (cost, i, row + [cost]))
+            if len(costly) > n:
+                heapq.heappop(costly)
+
+        cols = ['style', 'combo', 'seconds', 'f1', 'mem_mb', 'error']
+
+        style_df = pd.DataFrame.from_dict(by_style, orient='index')
+        if len(style_df):
+            style_df['total_sec'] = style_df.fit_sec + style_df.predict_sec + style_df.score_sec
+            style_df['sec_per_task'] = style_df.total_sec / style_df.tasks
+            style_df = style_df.sort_values('total_sec', ascending=False)
+
+        slow_df = pd.DataFrame([row for _, _, row in sorted(slowest, reverse=True)], columns=cols)
+        cost_df = pd.DataFrame([row for _, _, row in sorted(costly, reverse=True)], columns=cols + ['sec_per_f1'])
+
+        if self.verbose:
+            print('\nSearch time by estimator:')
+            print(style_df)
+            print('\nSlowest tasks:')
+            print(slow_df)
+            print('\nMost seconds per point of f1:')
+            print(cost_df)
+
+        return style_df, slow_df, cost_df
 
     def show_hist(self, df, cols):
         for col in cols:
@@ -255,7 +996,7 @@ if __name__ == '__main__':
     ################ 
 
     # used to cross validate and plot a specific test and features.
-    seer.cross_val_model(RandomForestClassifier, ['YR_BRTH','AGE_DX','RACE','ORIGIN','LATERAL','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS','STAT_REC'], dependent_cutoffs=[60, 120])
+    seer.cross_val_model(RandomForestClassifier, ['YR_BRTH','AGE_DX','RACE','ORIGIN','LATERAL','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS'], dependent_cutoffs=[60, 120])
 
     ################ 
 
@@ -0,0 +1,212 @@
+import sys
+import math
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+try:
+    import resource         # not available on windows, peak memory is reported as None there
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb():
+    ''' returns: peak resident memory of this process in MB, None where it can not be measured '''
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, mac reports bytes
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+
+class SharedArray(object):
+    ''' numpy array copied once into a named shared memory block.
+        worker processes attach to the block by name so the data is never pickled per task.
+    '''
+
+    def __init__(self, arr):
+        arr = np.ascontiguousarray(arr)
+
+        # a zero byte block is not allowed, keep at least one byte for empty arrays
+        self.shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        self.shape = arr.shape
+        self.dtype = arr.dtype.str
+
+        view = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        view[...] = arr
+
+    def handle(self):
+        ''' returns: small picklable tuple used by attach() to find the block '''
+        return (self.shm.name, self.shape, self.dtype)
+
+    def close(self):
+        ''' release and remove the shared block, only call from the process that created it '''
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach(handle):
+    ''' attach(handle)
+        params: handle - tuple returned from SharedArray.handle()
+        returns: shared memory object and a read only numpy view on it.
+                 keep the shared memory object alive as long as the array is used.
+    '''
+    name, shape, dtype = handle
+    shm = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    arr.flags.writeable = False
+    return shm, arr
+
+
+# per process state filled in by _init_worker()
+_worker_func = None
+_worker_data = {}
+_worker_shm = []
+
+
+def _init_worker(func, handles):
+    global _worker_func, _worker_data, _worker_shm
+
+    _worker_func = func
+    _worker_data = {}
+    _worker_shm = []
+    for key, handle in handles.items():
+        shm, arr = attach(handle)
+        _worker_shm.append(shm)
+        _worker_data[key] = arr
+
+
+def _run_chunk(chunk):
+    return [_worker_func(_worker_data, task) for task in chunk]
+
+
+class ParallelSeer(object):
+    ''' runs a list of independent tasks over a process pool.
+
+        numpy arrays shared by all tasks are placed in shared memory once and every worker
+        attaches to them at start up.  the task function must be a module level function
+        with the signature func(data, task) where data is a dict of the shared arrays.
+        results come back in the same order as the tasks no matter which worker ran them.
+    '''
+
+    def __init__(self, n_jobs=1, chunk_size=None, verbose=True):
+        ''' params: n_jobs - number of worker processes, -1 uses every cpu, 1 runs in this process
+                    chunk_size - number of tasks sent to a worker at one time.
+                                 if None, tasks are split into about 4 chunks per worker.
+                    verbose - prints progress messages
+        '''
+        if n_jobs is None or n_jobs == 0:
+            n_jobs = 1
+        elif n_jobs < 0:
+            n_jobs = max(mp.cpu_count() + 1 + n_jobs, 1)
+
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+
+        self.func = None
+        self.data = {}
+        self.shared = {}
+        self.pool = None
+
+    def chunks(self, tasks):
+        ''' split the task list into consecutive chunks for dispatch '''
+        size = self.chunk_size
+        if not size:
+            size = max(int(math.ceil(len(tasks) / (self.n_jobs * 4.0))), 1)
+
+        return [tasks[i:i + size] for i in range(0, len(tasks), size)]
+
+    def start(self, func, data=None):
+        ''' start(func, data)
+            copy the shared arrays into shared memory and start the worker pool.
+            the pool stays up for any number of map() calls until stop() is called,
+            use it as a context manager:  with executor.start(func, data): ...
+
+            params: func - module level function called as func(data, task)
+                    data - dict of name: numpy array shared read only by all tasks
+        '''
+        self.func = func
+        self.data = data or {}
+        self.shared = {}
+        self.pool = None
+
+        if self.n_jobs == 1:
+            return self
+
+        try:
+            for key, arr in self.data.items():
+                self.shared[key] = SharedArray(arr)
+            handles = {key: sa.handle() for key, sa in self.shared.items()}
+
+            self.pool = mp.Pool(self.n_jobs, initializer=_init_worker, initargs=(func, handles))
+        except:
+            self.stop(abort=True)
+            raise
+
+        return self
+
+    def imap(self, tasks):
+        ''' imap(tasks)
+            params: tasks - list of picklable task descriptions
+            returns: generator of lists of (task, result), one list per finished chunk,
+                     in the same order as tasks
+        '''
+        tasks = list(tasks)
+
+        if self.pool is None or len(tasks) <= 1:
+            # no pool, run in this process against the arrays directly
+            for chunk in self.chunks(tasks):
+                yield [(task, self.func(self.data, task)) for task in chunk]
+            return
+
+        chunks = self.chunks(tasks)
+        done = 0
+        # imap returns chunks in submission order which keeps results deterministic
+        for chunk, chunk_res in zip(chunks, self.pool.imap(_run_chunk, chunks)):
+            done += len(chunk)
+            if self.verbose:
+                print("Completed: {0}".format(done), end='\r', flush=True)
+            yield list(zip(chunk, chunk_res))
+
+    def map(self, tasks):
+        ''' map(tasks)
+            params: tasks - list of picklable task descriptions
+            returns: list of func results in the same order as tasks
+        '''
+        return [res for chunk in self.imap(tasks) for _, res in chunk]
+
+    def stop(self, abort=False):
+        ''' shut down the worker pool and release the shared memory
+            params: abort - kill the workers instead of waiting for them, used after an error or Ctrl-C
+        '''
+        if self.pool is not None:
+            if abort:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        for sa in self.shared.values():
+            sa.close()
+        self.shared = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop(abort=exc_type is not None)
+
+    def run(self, func, tasks, data=None):
+        ''' run(func, tasks, data)
+            one shot start(), map() and stop()
+
+            params: func - module level function called as func(data, task)
+                    tasks - list of picklable task descriptions
+                    data - dict of name: numpy array shared read only by all tasks
+            returns: list of func results in the same order as tasks
+        '''
+        with self.start(func, data):
+            return self.map(tasks)
@@ -4,12 +4,36 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import patsy as pt
 import os
-from lifelines import AalenAdditiveFitter #, CoxPHFitter
-#from lifelines.utils import k_fold_cross_validation
+import time
+from ModelRegistry import ModelRegistry
+from DesignCache import DesignCache
+from SurvivalGrid import SurvivalGrid
+from AalenModel import AalenModel, model_key, design_rows
+from AalenFitter import AalenFitter
+from CoxFitter import CoxFitter
+from TimeGrid import grid_knots, coarsen
+from SurvivalScore import cross_validate
+from Bootstrap import fit_bootstrap
+from lifelines import AalenAdditiveFitter
 
 class ProjectSeer1(MasterSeer):
 
-    def __init__(self, path=r'./data/', verbose=True, sample_size = 5000):
+    # patsy formula of the covariates used by the survival model
+    MODELSPEC = 'YR_BRTH + AGE_DX + RADIATN + HISTREC + ERSTATUS + PRSTATUS + BEHANAL + HST_STGA + NUMPRIMS + RACE'
+
+    # precomputed survival lookup written by build_grid(), in the data directory
+    GRID_NAME = 'survival_grid.bin'
+
+    # compact fitted model written by save_model(), in the data directory
+    MODEL_NAME = 'aalen_model.npz'
+
+    # fitted Cox model written by save_cox_model(), in the data directory
+    COX_NAME = 'cox_model.npz'
+
+    # bootstrap replicates of the Aalen model written by save_bootstrap(), in the data directory
+    BOOT_NAME = 'aalen_bootstrap.npz'
+
+    def __init__(self, path=r'./data/', verbose=True, sample_size = 5000, seed = 0, use_registry = True, use_cache = True, use_grid = True, native = False, time_grid = None):
         # user supplied parameters
         self.verbose = verbose          # prints status messages
 
@@ -18,32 +42,81 @@ class ProjectSeer1(MasterSeer):
         self.db_conn, self.db_cur = super().init_database(False)
 
         self.model = None
+        self.cox = None                 # Cox proportional hazards model, the web app's cheaper second model
+        self.boot = None                # AalenBootstrap replicates for process_patient() intervals
         self.sample_size = sample_size
+        self.seed = seed                # repeatable sample, None pulls different random rows every time
+        self.native = native            # fit with AalenFitter instead of lifelines' AalenAdditiveFitter
+        self.time_grid = time_grid      # None fits every month, or 'quarterly', 'yearly'... see TimeGrid.grid_knots()
+
+        # fitted models are stored here and reused when the data and settings match
+        self.registry = ModelRegistry(self.path + 'models/', verbose=verbose) if use_registry else None
+
+        # cleaned cohort and design matrix are stored here and reused when the query and formula match
+        self.design_cache = DesignCache(self.path + 'design/', verbose=verbose) if use_cache else None
+        self.design_info = None         # patsy DesignInfo of the fitted model, used to transform new patients
+
+        # patients on the precomputed grid are looked up instead of run through the model
+        self.grid = None
+        if use_grid and os.path.exists(self.path + self.GRID_NAME):
+            self.grid = SurvivalGrid(self.path + self.GRID_NAME)
+            self.check_grid()
 
 
     def __del__(self):
         super().__del__()
 
-    def load_and_clean_data(self, censored=True):
+    def cohort_query(self, censored=True):
+        ''' returns: list of columns and where clause used to pull the cohort for the model '''
 
         where = 'SRV_TIME_MON < 1000 AND HST_STGA < 8 AND O_DTH_CLASS = 0 AND ERSTATUS < 4 AND PRSTATUS < 4'
         if not censored:
             where += ' AND DATE_yr < 2008'
 
-        df = super().load_data(col  = ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS', 'RACE', 'ORIGIN',
-                                       'SRV_TIME_MON', 'STAT_REC'], 
-                               cond = where, sample_size = self.sample_size)
+        cols = ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS', 'RACE', 'ORIGIN',
+                'SRV_TIME_MON', 'STAT_REC']
+
+        return cols, where
+
+    def load_and_clean_data(self, censored=True):
+
+        cols, where = self.cohort_query(censored)
+
+        df = super().load_data(col = cols, cond = where, sample_size = self.sample_size, seed = self.seed)
 
         df, dependent = super().clean_recode_data(df, [])
 
         return df, dependent
 
+    def load_design(self, censored=True):
+        ''' load_design(censored)
+            params: censored - include patients diagnosed after 2008, see cohort_query()
+            returns: cleaned cohort dataframe, MODELSPEC design matrix (numpy array) and its patsy DesignInfo
+
+            repeatable samples (seed is set) are read from the design cache after the first load
+        '''
+        if self.design_cache is None or self.seed is None:
+            df, _ = self.load_and_clean_data(censored)
+            dm = pt.dmatrix(self.MODELSPEC, df)
+            return df, np.asarray(dm), dm.design_info
+
+        cols, where = self.cohort_query(censored)
+        meta = {'db': self.db_fingerprint(), 'query': ','.join(cols) + ' WHERE ' + where, 'recode': self.RECODE_VERSION,
+                'sample_size': self.sample_size, 'seed': self.seed}
+
+        return self.design_cache.design(meta, self.MODELSPEC, lambda: self.load_and_clean_data(censored)[0])
+
+    def model_frame(self, df, X, design_info):
+        ''' returns: design matrix as a dataframe joined with the SRV_TIME_MON and CENSORED columns lifelines fits on '''
+        X = pd.DataFrame(np.asarray(X), columns=design_info.column_names, index=df.index)
+        return X.join(df[['SRV_TIME_MON','CENSORED']])
+
     def run_survival_curve(self, df):
         ''' used for testing only'''
 
         aaf = AalenAdditiveFitter()
 
-        modelspec = 'YR_BRTH + AGE_DX + RADIATN + HISTREC + ERSTATUS + PRSTATUS + BEHANAL + HST_STGA + NUMPRIMS + RACE'
+        modelspec = self.MODELSPEC
         X = pt.dmatrix(modelspec, df, return_type='dataframe')
         X = X.join(df[['SRV_TIME_MON','CENSORED']])
         aaf.fit(X, 'SRV_TIME_MON', 'CENSORED')
@@ -59,72 +132,307 @@ class ProjectSeer1(MasterSeer):
 
         return
 
-    def score_model(self):
+    def score_model(self, k=5, n_jobs=1, model='aalen'):
+        ''' score_model(k, n_jobs, model)
+               k-fold cross validation of the survival model on a 100,000 patient sample
+
+            params: k - number of folds
+                    n_jobs - number of worker processes fitting the folds, -1 uses every cpu
+                    model - 'aalen' or 'cox'
+            returns: dataframe of the c-index and integrated Brier score of every fold, see SurvivalScore
+        '''
         # get the data and clean it
         temp = self.sample_size
         self.sample_size = 100000
-        df, dep = self.load_and_clean_data()
+        df, X, design_info = self.load_design()
         self.sample_size = temp
 
-        # create the model
-        aaf = AalenAdditiveFitter()
-        cph = CoxPHFitter()
-
         # define fields for the model
-        modelspec = 'YR_BRTH + AGE_DX + RADIATN + HISTREC + ERSTATUS + PRSTATUS + BEHANAL + HST_STGA + NUMPRIMS + RACE'
-        X = pt.dmatrix(modelspec, df, return_type='dataframe')
-        X = X.join(df[['SRV_TIME_MON','CENSORED']])
+        X = self.model_frame(df, X, design_info)
+
+        if model == 'cox':
+            scores = cross_validate(CoxFitter, X, k=k, seed=self.seed or 0, n_jobs=n_jobs, verbose=self.verbose)
+        elif self.native:
+            scores = cross_validate(AalenFitter, X, params={'time_grid': self.time_grid}, k=k, seed=self.seed or 0,
+                                    n_jobs=n_jobs, verbose=self.verbose)
+        else:
+            scores = cross_validate(AalenAdditiveFitter, X, params={'fit_intercept': False}, k=k, seed=self.seed or 0,
+                                    n_jobs=n_jobs, verbose=self.verbose)
 
-        scores = k_fold_cross_validation(aaf, X, 'SRV_TIME_MON', event_col='CENSORED', k=5)
         print('\nCross Validation Scores: ')
         print(scores)
-        print('Score Mean: {0:.4}'.format(np.mean(scores)))
-        print('Score SD  : {0:.4}'.format(np.std(scores)))
+        print('C-index Mean: {0:.4}  SD: {1:.4}'.format(scores.c_index.mean(), scores.c_index.std()))
+        print('Brier   Mean: {0:.4}  SD: {1:.4}'.format(scores.ibs.mean(), scores.ibs.std()))
 
-        return
+        return scores
 
 
     def prepare_model(self):
 
         # get the data and clean it
-        df, dep = self.load_and_clean_data()
+        df, X, self.design_info = self.load_design()
 
-        # create the model
-        aaf = AalenAdditiveFitter()
+        # create the model, the numpy fitter is fast enough for the full cohort but only matches lifelines
+        # up to the tail, see AalenFitter.  the design matrix has patsy's Intercept, so lifelines adds none
+        aaf = AalenFitter(time_grid=self.time_grid) if self.native else AalenAdditiveFitter(fit_intercept=False)
 
         # define fields for the model
-        modelspec = 'YR_BRTH + AGE_DX + RADIATN + HISTREC + ERSTATUS + PRSTATUS + BEHANAL + HST_STGA + NUMPRIMS + RACE'
-        X = pt.dmatrix(modelspec, df, return_type='dataframe')
-        X = X.join(df[['SRV_TIME_MON','CENSORED']])
+        modelspec = self.MODELSPEC
+        X = self.model_frame(df, X, self.design_info)
+
+        # lifelines has no time grid, move the survival times onto it before the fit
+        knots = grid_knots(self.time_grid, X.SRV_TIME_MON.max())
+        if knots is not None and not self.native:
+            X['SRV_TIME_MON'], X['CENSORED'] = coarsen(X.SRV_TIME_MON, X.CENSORED, knots)
+
+        # reuse a stored model if this data was already fit with the same settings
+        cols, where = self.cohort_query()
+        meta = {'data': self.fingerprint(df), 'query': ','.join(cols) + ' WHERE ' + where, 'recode': self.RECODE_VERSION,
+                'modelspec': modelspec, 'estimator': type(aaf).__name__, 'params': ModelRegistry.params(aaf)}
+        if knots is not None:
+            meta['time_grid'] = knots.tolist()
+        if self.registry is not None:
+            key = self.registry.key(meta)
+            model = self.registry.get(key)
+            if model is not None:
+                return model
 
         # fit the model
         if self.verbose:
             print('Creating Aalen Additive Model')
 
+        t0 = time.perf_counter()
         aaf.fit(X, 'SRV_TIME_MON', 'CENSORED')
 
+        if self.registry is not None:
+            self.registry.put(key, aaf, meta, time.perf_counter() - t0)
+
         return aaf
 
+    def prepare_cox_model(self, ties='efron'):
+        ''' prepare_cox_model(ties)
+               fits a Cox proportional hazards model on the same cohort and design as prepare_model()
+
+            params: ties - 'efron' or 'breslow', see CoxFitter
+            returns: fitted CoxFitter
+        '''
+        df, X, self.design_info = self.load_design()
+        X = self.model_frame(df, X, self.design_info)
+
+        cph = CoxFitter(ties=ties)
+
+        # reuse a stored model if this data was already fit with the same settings
+        cols, where = self.cohort_query()
+        meta = {'data': self.fingerprint(df), 'query': ','.join(cols) + ' WHERE ' + where, 'recode': self.RECODE_VERSION,
+                'modelspec': self.MODELSPEC, 'estimator': type(cph).__name__, 'params': ModelRegistry.params(cph)}
+        if self.registry is not None:
+            key = self.registry.key(meta)
+            model = self.registry.get(key)
+            if model is not None:
+                return model
+
+        if self.verbose:
+            print('Creating Cox Proportional Hazards Model')
+
+        t0 = time.perf_counter()
+        cph.fit(X, 'SRV_TIME_MON', 'CENSORED')
+
+        if self.registry is not None:
+            self.registry.put(key, cph, meta, time.perf_counter() - t0)
+
+        return cph
+
+    def prepare_bootstrap(self, n_boot=100, n_jobs=1):
+        ''' prepare_bootstrap(n_boot, n_jobs)
+               refits the Aalen model on n_boot resamples of the cohort in parallel, see Bootstrap.
+               the replicates are stored in the registry, so later runs and patients only predict
+
+            params: n_boot - number of bootstrap replicates
+                    n_jobs - number of worker processes fitting the replicates, -1 uses every cpu
+            returns: AalenBootstrap
+        '''
+        df, X, self.design_info = self.load_design()
+        X = self.model_frame(df, X, self.design_info)
+
+        # the replicates are fit with the point model's fitter, see prepare_model()
+        if self.native:
+            fitter, params = AalenFitter, {'time_grid': self.time_grid}
+        else:
+            fitter, params = AalenAdditiveFitter, {'fit_intercept': False}
+            knots = grid_knots(self.time_grid, X.SRV_TIME_MON.max())
+            if knots is not None:
+                X['SRV_TIME_MON'], X['CENSORED'] = coarsen(X.SRV_TIME_MON, X.CENSORED, knots)
+        seed = self.seed or 0
+
+        # reuse stored replicates if this data was already resampled with the same settings
+        cols, where = self.cohort_query()
+        meta = {'data': self.fingerprint(df), 'query': ','.join(cols) + ' WHERE ' + where, 'recode': self.RECODE_VERSION,
+                'modelspec': self.MODELSPEC, 'estimator': 'AalenBootstrap', 'fitter': fitter.__name__, 'params': params,
+                'time_grid': self.time_grid, 'n_boot': n_boot, 'seed': seed}
+        if self.registry is not None:
+            key = self.registry.key(meta)
+            boot = self.registry.get(key)
+            if boot is not None:
+                return boot
+
+        if self.verbose:
+            print('Creating {0} bootstrap replicates of the Aalen Additive Model'.format(n_boot))
+
+        t0 = time.perf_counter()
+        boot = fit_bootstrap(X, fitter=fitter, params=params, n_boot=n_boot, seed=seed, n_jobs=n_jobs,
+                             meta={'modelspec': self.MODELSPEC, 'fitter': fitter.__name__, 'n_boot': n_boot, 'seed': seed},
+                             verbose=self.verbose)
+
+        if self.registry is not None:
+            self.registry.put(key, boot, meta, time.perf_counter() - t0)
+
+        return boot
 
-    def process_patient(self, pat_data):
-        ''' process_patient(pat_data)
+    def save_bootstrap(self, fname=None, n_boot=100, n_jobs=1):
+        ''' save_bootstrap(fname, n_boot, n_jobs)
+               fits the bootstrap replicates if not already done and saves them for the web app
+
+            params: fname - file to write, defaults to BOOT_NAME in the data directory
+                    n_boot, n_jobs - see prepare_bootstrap()
+            returns: the saved AalenBootstrap
+        '''
+        if not self.boot:
+            self.boot = self.prepare_bootstrap(n_boot, n_jobs)
+
+        fname = fname or self.path + self.BOOT_NAME
+        self.boot.save(fname)
+        if self.verbose:
+            print('Bootstrap replicates saved to {0}'.format(fname))
+
+        return self.boot
+
+    def save_cox_model(self, fname=None):
+        ''' save_cox_model(fname)
+               fits the Cox model if not already done and saves it for the web app
+
+            params: fname - file to write, defaults to COX_NAME in the data directory
+            returns: the saved CoxFitter
+        '''
+        if not self.cox:
+            self.cox = self.prepare_cox_model()
+
+        self.cox.meta = {'modelspec': self.MODELSPEC, 'sample_size': self.sample_size, 'seed': self.seed, 'recode': self.RECODE_VERSION}
+
+        fname = fname or self.path + self.COX_NAME
+        self.cox.save(fname)
+        if self.verbose:
+            print('Cox model saved to {0}'.format(fname))
+
+        return self.cox
+
+    def save_model(self, fname=None, time_grid=None):
+        ''' save_model(fname, time_grid)
+               fits the model if not already done and saves only its cumulative hazards, see AalenModel
+
+            params: fname - file to write, defaults to MODEL_NAME in the data directory
+                    time_grid - None saves every event time, otherwise only the knots of the grid are kept
+                                and stored as float32, see TimeGrid.grid_knots()
+            returns: the saved AalenModel
+        '''
+        if not self.model:
+            self.model = self.prepare_model()
+
+        meta = {'modelspec': self.MODELSPEC, 'sample_size': self.sample_size, 'seed': self.seed, 'recode': self.RECODE_VERSION,
+                'key': model_key(self.model)}
+        # a model fit on a time grid keeps it, so it is stored as float32
+        meta.update({k: v for k, v in getattr(self.model, 'meta', {}).items() if k == 'time_grid'})
+        model = self.model if type(self.model) is AalenModel else AalenModel.from_fitter(self.model, meta)
+
+        knots = grid_knots(time_grid, model.cumulative_hazards_.index.max())
+        if knots is not None:
+            model = model.coarsen(knots)
+
+        fname = fname or self.path + self.MODEL_NAME
+        model.save(fname)
+        if self.verbose:
+            print('Model saved to {0}'.format(fname))
+
+        return model
+
+    def load_model(self, fname=None):
+        ''' load_model(fname)
+               loads a model written by save_model() in place of fitting one, the web app does this at start up
+
+            params: fname - file to read, defaults to MODEL_NAME in the data directory
+            returns: the loaded AalenModel, also set as the model used by process_patient() and predict_batch()
+        '''
+        self.model = AalenModel.load(fname or self.path + self.MODEL_NAME)
+        self.check_grid()
+        return self.model
+
+    def grid_settings(self):
+        ''' returns: dict of the settings a fresh fit depends on, stored with the grid by build_grid() '''
+        return {'modelspec': self.MODELSPEC, 'sample_size': self.sample_size, 'seed': self.seed, 'recode': self.RECODE_VERSION,
+                'time_grid': self.time_grid}
+
+    def check_grid(self):
+        ''' check_grid()
+               drops the precomputed grid when it was not built from the model being served, so
+               process_patient() never mixes answers from two fits
+
+            returns: True when the grid is kept
+        '''
+        if self.grid is None:
+            return False
+
+        meta = self.grid.meta
+        if self.model is not None:
+            # a model is set, the grid must come from this exact fit
+            ok = meta.get('model') == model_key(self.model)
+        else:
+            # the model is fit later, the grid must come from the same settings and a repeatable sample
+            settings = self.grid_settings()
+            ok = self.seed is not None and all(meta.get(k) == v for k, v in settings.items())
+
+        if not ok:
+            print('Survival grid {0} was built from a different model, not using it'.format(self.path + self.GRID_NAME))
+            self.grid = None
+
+        return ok
+
+
+    def process_patient(self, pat_data, ci=False, alpha=0.95):
+        ''' process_patient(pat_data, ci, alpha)
                fits the model if not already done, estimates survival of individual patient
                and displays patient's survival analysis graph.
 
             params: pat_data-numpy array of patient specific values for the following columns
                         ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS',
                          'PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS', 'RACE']
-            returns: expected survival time in months
+                    ci - also return a bootstrap interval of the expected survival and shade the
+                         survival curve's band, fits the replicates if not already done
+                    alpha - confidence level of the interval
+            returns: expected survival time in months, with ci a tuple of it and the lower and upper
+                     bound in months
         '''
         try:
             os.remove('plot.png')
         except:
             pass
 
-        if not self.model:
-            self.model = self.prepare_model()
-
-        exp = self.model.predict_expectation(pat_data)
+        # answer from the precomputed grid when the patient is on it, otherwise use the model
+        self.check_grid()
+        hit = self.grid.lookup(pat_data[0]) if self.grid is not None else None
+        if hit is not None:
+            exp = [[hit[0]]]
+        else:
+            if not self.model:
+                self.model = self.prepare_model()
+
+            # lifelines 0.30 returns a series, AalenModel a dataframe
+            exp = np.asarray(self.model.predict_expectation(pat_data)).reshape(-1, 1)
+
+        # every replicate predicts the patient in one batch, no refitting after the first patient
+        if ci:
+            if not self.boot:
+                self.boot = self.prepare_bootstrap()
+            exp_ci, sf_lower, sf_upper = self.boot.confidence_interval(pat_data, alpha)
+            lower, upper = exp_ci.values[0]
 
         if self.verbose:
             cols = ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS','RACE']
@@ -133,8 +441,15 @@ class ProjectSeer1(MasterSeer):
                     print('{0:10}: {1:.0f}'.format(col, pat_data[0][i+1]))
 
             print('Expected survival: {0:.1f} months'.format(exp[0][0]))
-
-            self.model.predict_survival_function(pat_data).plot(legend=None, color="#3F5D7D");
+            if ci:
+                print('{0:.0%} interval: {1:.1f} to {2:.1f} months'.format(alpha, lower, upper))
+
+            if hit is not None:
+                plt.step(np.r_[0, self.grid.knots], np.r_[1, hit[1]], where='post', color="#3F5D7D")
+            else:
+                self.model.predict_survival_function(pat_data).plot(legend=None, color="#3F5D7D");
+            if ci:
+                plt.fill_between(self.boot.timeline, sf_lower.values[:, 0], sf_upper.values[:, 0], step='post', color="#3F5D7D", alpha=0.2)
             plt.xlabel('Months')
             plt.ylabel('Survival Percentage')
             plt.title('Survival Analysis')
@@ -152,8 +467,164 @@ class ProjectSeer1(MasterSeer):
             if self.verbose:
                 plt.show()
 
+        if ci:
+            return exp[0][0], lower, upper
+
         return exp[0][0]
 
+    def design_matrix(self, data):
+        ''' design_matrix(data)
+            params: data - dataframe with the MODELSPEC covariate columns, or numpy array laid out like
+                           process_patient() pat_data (intercept first, then the covariates in MODELSPEC order)
+            returns: numpy array of the rows ready to multiply with the model's cumulative hazards
+        '''
+        if isinstance(data, pd.DataFrame):
+            if self.design_info is not None:
+                X = DesignCache.transform(self.design_info, data)
+            else:
+                X = np.asarray(pt.dmatrix(self.MODELSPEC, data))
+        else:
+            X = np.atleast_2d(np.asarray(data, dtype=np.float64))
+
+        # the fitter's own column of ones, where it put it
+        if getattr(self.model, 'fit_intercept', False):
+            X, _ = design_rows(X, self.model.cumulative_hazards_.columns, True)
+
+        return X
+
+    def predict_batch(self, data, horizons=[12, 60, 120], batch_size=10000):
+        ''' predict_batch(data, horizons, batch_size)
+               scores many patients at once without plotting, fits the model if not already done
+
+            params: data - dataframe with the MODELSPEC covariate columns, or numpy array of patients laid
+                           out like process_patient() pat_data, one row per patient
+                    horizons - months to return the survival probability at
+                    batch_size - number of patients computed at one time, bounds memory for large cohorts
+            returns: dataframe with one row per patient, 'expected' survival in months and one
+                     'surv_<months>' column of survival probability for every horizon
+
+            same results as the model's predict_expectation() and predict_survival_function(), computed
+            as one matrix product of the patients and the cumulative hazards per batch
+        '''
+        if not self.model:
+            self.model = self.prepare_model()
+
+        X = self.design_matrix(data)
+        index = data.index if isinstance(data, pd.DataFrame) else None
+
+        # the Cox model has its own batched prediction
+        if isinstance(self.model, CoxFitter):
+            expected, surv = self.model.predict_batch(X, horizons, batch_size)
+            res = pd.DataFrame(surv, index=index, columns=['surv_{0}'.format(h) for h in horizons])
+            res.insert(0, 'expected', expected)
+            return res
+
+        cum_haz = self.model.cumulative_hazards_.values.T       # covariates x event times
+        t = self.model.cumulative_hazards_.index.values.astype(np.float64)
+        dt = np.diff(t)
+
+        # position of the last event time at or before each horizon, -1 means before the first event
+        hz_idx = np.searchsorted(t, horizons, side='right') - 1
+
+        expected = np.empty(len(X))
+        surv = np.ones((len(X), len(horizons)))
+        for start in range(0, len(X), batch_size):
+            S = np.exp(-np.dot(X[start:start + batch_size], cum_haz))
+
+            # trapezoid rule over the event times, same as predict_expectation()
+            expected[start:start + batch_size] = np.dot((S[:, 1:] + S[:, :-1]) / 2, dt)
+
+            for j, k in enumerate(hz_idx):
+                if k >= 0:
+                    surv[start:start + batch_size, j] = S[:, k]
+
+        res = pd.DataFrame(surv, index=index, columns=['surv_{0}'.format(h) for h in horizons])
+        res.insert(0, 'expected', expected)
+
+        return res
+
+
+    def compare_time_grids(self, grids=['monthly', 'quarterly', 'yearly'], horizons=[12, 60, 120]):
+        ''' compare_time_grids(grids, horizons)
+               fits the model at full resolution and on every time grid and predicts the whole cohort
+               with each, to see what a coarser grid costs in accuracy against what it saves
+
+            params: grids - time grids to compare, see TimeGrid.grid_knots()
+                    horizons - months to compare the survival probability at
+            returns: dataframe indexed by grid with the number of 'times' in the model, 'fit_sec',
+                     stored 'bytes' of the cumulative hazards, and the max and mean absolute difference
+                     from the full model of the expected survival in months and of the survival at
+                     each horizon
+        '''
+        df, X, self.design_info = self.load_design()
+        frame = self.model_frame(df, X, self.design_info)
+        model = self.model
+
+        rows = []
+        try:
+            for grid in [None] + list(grids):
+                t0 = time.perf_counter()
+                self.model = AalenFitter(time_grid=grid).fit(frame, 'SRV_TIME_MON', 'CENSORED')
+                fit_sec = time.perf_counter() - t0
+
+                pred = self.predict_batch(X, horizons)
+                if grid is None:
+                    full = pred
+
+                ch = self.model.cumulative_hazards_
+                row = {'grid': 'full' if grid is None else str(grid), 'times': len(ch), 'fit_sec': fit_sec,
+                       'bytes': ch.size * (8 if grid is None else 4)}
+                for col in pred.columns:
+                    diff = np.abs(pred[col].values - full[col].values)
+                    row[col + '_max_diff'] = diff.max()
+                    row[col + '_mean_diff'] = diff.mean()
+                rows.append(row)
+        finally:
+            self.model = model
+
+        res = pd.DataFrame(rows).set_index('grid')
+
+        if self.verbose:
+            print('\nTime grids on {0} patients'.format(len(frame)))
+            for grid, row in res.iterrows():
+                print('{0:10} times {1:4d}  fit {2:6.2f} sec  {3:8d} bytes  expected max diff {4:6.2f} mean {5:6.3f} months'.format(
+                    grid, int(row['times']), row['fit_sec'], int(row['bytes']), row['expected_max_diff'], row['expected_mean_diff']))
+
+        return res
+
+    def build_grid(self, fname=None, ages=range(18, 100), dx_years=None, knots=range(12, 241, 12)):
+        ''' build_grid(fname, ages, dx_years, knots)
+               offline job, evaluates the model over every patient the web calculator can describe and
+               writes the SurvivalGrid lookup file process_patient() answers from
+
+            params: fname - lookup file, defaults to GRID_NAME in the data directory
+                    ages - whole years of age at diagnosis
+                    dx_years - years of diagnosis, defaults to the last 5 years in the cohort
+                    knots - months the survival curves are stored at
+            returns: number of grid points
+        '''
+        if not self.model:
+            self.model = self.prepare_model()
+
+        if dx_years is None:
+            df, _, _ = self.load_design()
+            last = int((df.YR_BRTH + df.AGE_DX).max())
+            dx_years = range(last - 4, last + 1)
+
+        def predict(X, horizons):
+            res = self.predict_batch(X, horizons)
+            return res['expected'].values, res.values[:, 1:]
+
+        # release the old file first, a memory mapped file can not be replaced on windows
+        self.grid = None
+
+        meta = dict(self.grid_settings(), model=model_key(self.model))
+        n = SurvivalGrid.build(predict, fname or self.path + self.GRID_NAME, ages, dx_years, knots=knots, meta=meta, verbose=self.verbose)
+
+        self.grid = SurvivalGrid(fname or self.path + self.GRID_NAME)
+
+        return n
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,108 @@
+import os
+import json
+import heapq
+import hashlib
+
+
+class ResultLog(object):
+    ''' append only log of model search results, one json record per line.
+
+        records are written and flushed to disk as soon as they finish so a crash or Ctrl-C
+        only loses the tasks that were running.  a restarted search reads the log back and
+        skips every (style, combo) that is already in it for the same data and settings.
+    '''
+
+    def __init__(self, fname, settings=None):
+        ''' params: fname - path of the log file, created on first append if missing
+                    settings - dict of everything the scores depend on besides style and combo, i.e. database
+                               fingerprint, query, dependent_cutoffs, sample size and seed.  records are
+                               stamped with its hash and only records with the same hash count as done.
+        '''
+        self.fname = fname
+        self.config = None
+        if settings is not None:
+            self.config = hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def key(style, combo, target=None):
+        ''' key(style, combo, target)
+            params: style - name of the model class
+                    combo - list of feature names
+                    target - dependent_cutoffs of the task when one log holds several targets
+            returns: string that identifies one (style, combo) task in the log
+        '''
+        key = style + '|' + ','.join(map(str, combo))
+        if target is not None:
+            key += '|' + ','.join(map(str, target))
+        return key
+
+    def append(self, records):
+        ''' append(records)
+            params: records - list of dicts, each must have 'style' and 'combo' entries
+
+            writes the records, stamped with the settings hash, and forces them to disk before returning
+        '''
+        if not records:
+            return
+
+        # a run killed mid write leaves a last line without its newline, start after it on a line of our own
+        lead = ''
+        if os.path.exists(self.fname) and os.path.getsize(self.fname) > 0:
+            with open(self.fname, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    lead = '\n'
+
+        with open(self.fname, 'a') as f:
+            f.write(lead)
+            for rec in records:
+                if self.config is not None:
+                    rec['config'] = self.config
+                f.write(json.dumps(rec) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __iter__(self):
+        ''' stream records from the log one at a time.
+            a partly written last line from an interrupted run is skipped.
+        '''
+        if not os.path.exists(self.fname):
+            return
+
+        with open(self.fname, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def load_done(self):
+        ''' returns: dict of key: record for every task already in the log with the same settings.
+                     if a task was logged more than once the last record wins.
+                     records with an error are left out so the task is tried again.
+        '''
+        return {self.key(rec['style'], rec['combo'], rec.get('target')): rec for rec in self
+                if rec.get('config') == self.config and rec.get('error') is None}
+
+    def top(self, n=10, score='f1'):
+        ''' top(n, score)
+            params: n - number of results to return
+                    score - record field to rank on, highest first
+            returns: list of the n best records
+
+            streams the log through a heap of size n so the whole log is never held in memory
+        '''
+        heap = []
+        for i, rec in enumerate(self):
+            val = rec.get(score)
+            if val is None:
+                continue
+
+            # i breaks ties so records are never compared to each other
+            item = (val, -i, rec)
+            if len(heap) < n:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+
+        return [rec for _, _, rec in sorted(heap, key=lambda x: x[:2], reverse=True)]
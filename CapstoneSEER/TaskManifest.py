@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import socket
+import argparse
+import importlib
+import threading
+from contextlib import contextmanager
+from ResultLog import ResultLog
+
+
+class TaskManifest(object):
+    ''' a model search split into task ranges on a shared filesystem, so any number of
+        worker processes on any number of hosts can work through it with no coordinator.
+
+        directory layout:
+            manifest.json      - search settings and the full (style, combo) task list
+            claims/<n>.lock    - range n is claimed, created with O_EXCL so only one worker gets it
+            results/<n>.log    - finished results of range n, renamed into place when the range is done
+
+        the worker holding a claim refreshes its lock's modified time while it works, see keep_alive().
+        a claim not refreshed for stale_sec with no results is treated as a dead worker and can be taken over.
+    '''
+
+    def __init__(self, path, stale_sec=30 * 60):
+        ''' params: path - manifest directory
+                    stale_sec - seconds without a refresh after which an unfinished claim can be taken by
+                                another worker, the holder refreshes it every fifth of that
+        '''
+        if path[-1] != '/':
+            path += '/'
+
+        self.path = path
+        self.stale_sec = stale_sec
+        self.worker = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self._manifest = None
+        self._claims = {}       # range number: contents of the lock this worker wrote
+
+    @staticmethod
+    def style_name(style_fnc):
+        ''' returns: importable name of a model class, i.e. sklearn.linear_model.ridge.Ridge '''
+        return style_fnc.__module__ + '.' + style_fnc.__name__
+
+    @staticmethod
+    def style_class(name):
+        ''' returns: the model class for a name from style_name() '''
+        module, cls = name.rsplit('.', 1)
+        return getattr(importlib.import_module(module), cls)
+
+    def create(self, settings, tasks, range_size=100):
+        ''' create(settings, tasks, range_size)
+            params: settings - dict of everything a worker needs to rebuild the data, stored as is
+                    tasks - list of [style name, list of column names]
+                    range_size - number of tasks in one claim
+        '''
+        if os.path.exists(self.path + 'manifest.json'):
+            raise IOError('manifest already exists in {0}'.format(self.path))
+
+        os.makedirs(self.path + 'claims', exist_ok=True)
+        os.makedirs(self.path + 'results', exist_ok=True)
+
+        man = dict(settings, tasks=tasks, range_size=range_size,
+                   num_ranges=(len(tasks) + range_size - 1) // range_size,
+                   created=time.strftime('%Y-%m-%d %H:%M:%S'))
+
+        tmp = '{0}manifest.json.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(man, f)
+        os.replace(tmp, self.path + 'manifest.json')
+
+    @property
+    def manifest(self):
+        ''' returns: dict read from manifest.json '''
+        if self._manifest is None:
+            with open(self.path + 'manifest.json', 'r') as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    def task_range(self, n):
+        ''' returns: list of the tasks in range n '''
+        size = self.manifest['range_size']
+        return self.manifest['tasks'][n * size:(n + 1) * size]
+
+    def _lock(self, n):
+        return '{0}claims/{1}.lock'.format(self.path, n)
+
+    def result_name(self, n):
+        return '{0}results/{1}.log'.format(self.path, n)
+
+    def is_done(self, n):
+        return os.path.exists(self.result_name(n))
+
+    @staticmethod
+    def _read_lock(lock):
+        # contents and modified time identify one claim and its last refresh, None if there is no lock
+        try:
+            with open(lock, 'r') as f:
+                contents = f.read()
+            return contents, os.path.getmtime(lock)
+        except OSError:
+            return None
+
+    def _take_over(self, lock):
+        ''' _take_over(lock)
+            moves away a claim of a worker that stopped refreshing it
+            returns: True when this worker moved the stale lock and its name is free to claim again
+        '''
+        seen = self._read_lock(lock)
+        if seen is None or time.time() - seen[1] < self.stale_sec:
+            return False
+
+        # rename to a name only this worker uses, of all the workers renaming the same lock one wins
+        stale = '{0}.stale.{1}.{2}'.format(lock, self.worker.replace(':', '_'), os.urandom(4).hex())
+        try:
+            os.rename(lock, stale)
+        except OSError:
+            return False
+
+        # between the check and the rename the lock can be refreshed, or taken over and made again by
+        # another worker.  only the same contents and time prove this is the stale lock that was checked
+        if self._read_lock(stale) == seen:
+            os.remove(stale)
+            return True
+
+        # put the live claim back, a hard link never replaces a lock made in the meantime
+        try:
+            os.link(stale, lock)
+        except OSError:
+            pass
+        os.remove(stale)
+        return False
+
+    def claim(self):
+        ''' claim the next range no other worker has
+            returns: range number, or None when every range is finished or claimed
+        '''
+        for n in range(self.manifest['num_ranges']):
+            if self.is_done(n):
+                continue
+
+            lock = self._lock(n)
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # take over a claim from a worker that died, the lock is made again with O_EXCL so
+                # a worker claiming it at the same time still loses
+                try:
+                    if self.is_done(n) or not self._take_over(lock):
+                        continue
+                    fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except OSError:
+                    continue
+
+            # a random token makes the contents of every claim different
+            contents = json.dumps({'worker': self.worker, 'claimed': time.time(), 'token': os.urandom(8).hex()})
+            with os.fdopen(fd, 'w') as f:
+                f.write(contents)
+            self._claims[n] = contents
+
+            # the range may have finished between the done check and the claim
+            if self.is_done(n):
+                continue
+
+            return n
+
+        return None
+
+    def heartbeat(self, n):
+        ''' heartbeat(n)
+            refreshes the modified time of this worker's lock on range n so it is not taken as stale
+            returns: False when the lock is no longer this worker's
+        '''
+        lock = self._lock(n)
+        current = self._read_lock(lock)
+        if current is None or current[0] != self._claims.get(n):
+            return False
+
+        try:
+            os.utime(lock)
+        except OSError:
+            return False
+        return True
+
+    @contextmanager
+    def keep_alive(self, n):
+        ''' keep_alive(n)
+            with block that refreshes the lock on range n from a background thread while the range is worked on
+        '''
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.stale_sec / 5.):
+                if not self.heartbeat(n):
+                    print('Warning: lost the claim on range {0}, another worker may run it too'.format(n))
+                    return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def finish(self, n, records):
+        ''' finish(n, records)
+            params: n - range number from claim()
+                    records - list of result dicts for the tasks of the range
+
+            results are written to a temp file then renamed so a range is either done or not
+        '''
+        tmp = '{0}.{1}.tmp'.format(self.result_name(n), self.worker.replace(':', '_'))
+        ResultLog(tmp).append(records)
+        os.replace(tmp, self.result_name(n))
+
+    def status(self):
+        ''' returns: dict with the number of 'ranges', 'done' and 'claimed' (claimed and not done) ranges '''
+        num = self.manifest['num_ranges']
+        done = sum(self.is_done(n) for n in range(num))
+        claimed = sum(os.path.exists(self._lock(n)) and not self.is_done(n) for n in range(num))
+        return {'ranges': num, 'done': done, 'claimed': claimed}
+
+    def records(self):
+        ''' generator of every finished result record, in task order '''
+        for n in range(self.manifest['num_ranges']):
+            if self.is_done(n):
+                for rec in ResultLog(self.result_name(n)):
+                    yield rec
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='run or merge a model search manifest written by ModelSeer.write_manifest()')
+    parser.add_argument('command', choices=['worker', 'merge', 'status'])
+    parser.add_argument('manifest', help='manifest directory')
+    parser.add_argument('--path', default=r'./data/', help='path to the seer database')
+    parser.add_argument('--n-jobs', type=int, default=1, help='worker processes for this worker')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        print(TaskManifest(args.manifest).status())
+    else:
+        from ModelSeer import ModelSeer
+
+        seer = ModelSeer(path=args.path)
+        if args.command == 'worker':
+            seer.run_manifest(args.manifest, n_jobs=args.n_jobs)
+        else:
+            seer.merge_manifest(args.manifest)
+        del seer
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+# months between knots of the named time grids
+GRIDS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+
+def grid_knots(time_grid, max_time):
+    ''' grid_knots(time_grid, max_time)
+        params: time_grid - None for full resolution, 'monthly', 'quarterly', 'yearly', a number of months
+                            between knots, or a list of knot months
+                max_time - longest survival time in the cohort, named grids run from 0 past it
+        returns: sorted numpy array of knot months, None for full resolution
+    '''
+    if time_grid is None:
+        return None
+
+    if isinstance(time_grid, str):
+        if time_grid not in GRIDS:
+            raise ValueError('unknown time grid: {0}, use one of {1}'.format(time_grid, sorted(GRIDS)))
+        time_grid = GRIDS[time_grid]
+
+    if np.isscalar(time_grid):
+        return np.arange(0, max_time + time_grid, time_grid, dtype=np.float64)
+
+    return np.unique(np.asarray(time_grid, dtype=np.float64))
+
+
+def coarsen(durations, event_observed, knots):
+    ''' coarsen(durations, event_observed, knots)
+        moves every survival time up to the next knot, so all deaths between two knots are one step
+        of the fitted curve at the later knot and the patients stay at risk until then
+
+        params: durations - array of survival times
+                event_observed - boolean array, True when the death was observed
+                knots - knot months from grid_knots()
+        returns: durations on the knots and event_observed, patients past the last knot are
+                 censored at it
+    '''
+    durations = np.asarray(durations, dtype=np.float64)
+    event_observed = np.asarray(event_observed).astype(bool)
+
+    idx = np.searchsorted(knots, durations, side='left')
+    beyond = idx == len(knots)
+
+    return knots[np.minimum(idx, len(knots) - 1)], event_observed & ~beyond
@@ -0,0 +1,154 @@
+import time
+import numpy as np
+import pandas as pd
+from AalenModel import AalenModel
+from TimeGrid import grid_knots, coarsen
+
+
+class AalenFitter(AalenModel):
+    ''' Aalen additive model fit in numpy, one row per patient, with the defaults and the early stop of the
+        lifelines 0.30 AalenAdditiveFitter in requirements.txt.
+
+        not a drop in for it.  lifelines keeps a patient censored at a month with no death in the risk
+        set to the end of follow up, here a patient leaves the risk set at its own time.  the hazards
+        agree to about 1e-6 up to the first such patient and drift apart in the tail after it.  lifelines
+        also standardizes the covariates before a coef_penalizer, here the penalty is on the raw
+        covariates.  ProjectSeer1 fits lifelines unless asked for this fitter with native=True.
+
+        lifelines solves the penalized least squares of the whole cohort at every death.  here the
+        cohort is sorted once and the risk set Gram matrix X'X at each death time is built from the
+        Gram matrices of the patients leaving between death times, so each death time costs one small
+        covariates x covariates solve no matter how many patients are at risk.
+
+        with a time_grid the survival times are moved up to the grid's knots first, so there is one
+        step per knot instead of one per distinct month, see TimeGrid.
+
+        the fitted model is an AalenModel, predict, save and ProjectSeer1.predict_batch work as is.
+    '''
+
+    def __init__(self, fit_intercept=True, coef_penalizer=0., smoothing_penalizer=0., time_grid=None, verbose=False):
+        ''' params: fit_intercept - fit an intercept, patsy's 'Intercept' column when the frame has one,
+                                    otherwise a 'baseline' column of ones added after the covariates
+                    coef_penalizer - L2 penalty on the size of the hazards at each death
+                    smoothing_penalizer - L2 penalty on the change from the previous death's hazards
+                    time_grid - None fits every distinct survival time, otherwise 'monthly', 'quarterly',
+                                'yearly', months between knots or a list of knots, see TimeGrid.grid_knots()
+                    verbose - prints the fit time
+        '''
+        if coef_penalizer < 0 or smoothing_penalizer < 0:
+            raise ValueError('penalizer parameter must be >= 0.')
+
+        self.fit_intercept = fit_intercept
+        self.coef_penalizer = coef_penalizer
+        self.smoothing_penalizer = smoothing_penalizer
+        self.time_grid = time_grid
+        self.verbose = verbose
+        self.meta = {}
+
+    def fit(self, dataframe, duration_col, event_col=None):
+        ''' fit(dataframe, duration_col, event_col)
+            params: dataframe - covariates plus the duration and event columns, one row per patient,
+                                i.e. ProjectSeer1.model_frame()
+                    duration_col - name of the survival time column, i.e. 'SRV_TIME_MON'
+                    event_col - name of the death observed column, i.e. 'CENSORED'. None means all observed.
+            returns: self, with hazards_, cumulative_hazards_ and variance_ dataframes indexed by death time
+        '''
+        t0 = time.perf_counter()
+
+        T = dataframe[duration_col].values.astype(np.float64)
+        E = dataframe[event_col].values.astype(bool) if event_col else np.ones(len(T), dtype=bool)
+
+        knots = grid_knots(self.time_grid, T.max())
+        if knots is not None:
+            T, E = coarsen(T, E, knots)
+            # save() stores a model fit on a grid as float32
+            self.meta = {'time_grid': knots.tolist()}
+
+        columns = [c for c in dataframe.columns if c not in (duration_col, event_col)]
+        X = dataframe[columns].values.astype(np.float64)
+        # a second column of ones next to patsy's would leave X'X singular
+        if self.fit_intercept and 'Intercept' not in columns:
+            X = np.c_[X, np.ones(len(X))]
+            columns = columns + ['baseline']
+
+        hazards, variance, times = self._fit_arrays(X, T, E)
+
+        index = pd.Index(times)
+        self.hazards_ = pd.DataFrame(hazards, index=index, columns=columns)
+        self.cumulative_hazards_ = self.hazards_.cumsum()
+        self.variance_ = pd.DataFrame(variance, index=index, columns=columns)
+        self.timeline = times
+
+        if self.verbose:
+            print('Aalen model fit on {0} patients, {1} death times in {2:.2f} sec'.format(len(T), len(times), time.perf_counter() - t0))
+
+        return self
+
+    def _fit_arrays(self, X, T, E):
+        n, d = X.shape
+
+        # the cohort is sorted once, stable so ties keep their row order like the lifelines loop
+        order = np.argsort(T, kind='mergesort')
+        X, T, E = X[order], T[order], E[order]
+
+        times = np.unique(T[E])
+
+        # like lifelines, stop at the first death time with no more than 3 patients per covariate left
+        # at risk, past it each hazard is fit to a handful of patients and the survival curves swing wildly
+        at_risk = n - np.searchsorted(T, times, side='left')
+        stop = np.flatnonzero(at_risk <= 3 * (d - 1))
+        if len(stop):
+            times = times[:stop[0] + 1]
+
+        K = len(times)
+        if K == 0:
+            return np.zeros((0, d)), np.zeros((0, d)), times
+
+        # a patient is at risk at every death time up to its own time, bucket k holds the patients that
+        # leave after death time k and before death time k+1, bucket -1 was never at risk at a death
+        bucket = np.searchsorted(times, T, side='right') - 1
+        starts = np.searchsorted(bucket, np.arange(K))
+        ends = np.r_[starts[1:], n]
+
+        # Gram matrix of the patients leaving with each bucket, then the risk set at death time k is
+        # every bucket from k on.  summed from the last death time back, each step adds the patients
+        # removed after it, so no large Gram matrix is ever reduced by subtraction and precision holds
+        # for covariates like YR_BRTH with large values
+        gram = np.empty((K, d, d))
+        for k in range(K):
+            Xk = X[starts[k]:ends[k]]
+            gram[k] = np.dot(Xk.T, Xk)
+        risk = np.cumsum(gram[::-1], axis=0)[::-1]
+        risk += (self.coef_penalizer + self.smoothing_penalizer) * np.eye(d)
+
+        # deaths at each death time, their sum for the hazards and their Gram matrix for the variance
+        dead = E & (bucket >= 0) & (T <= times[-1])
+        Xd, kd = X[dead], bucket[dead]
+        d_start = np.searchsorted(kd, np.arange(K))
+        death_sum = np.add.reduceat(Xd, d_start, axis=0)
+
+        # pseudo inverse, with no penalty a covariate that is constant over the last few patients at
+        # risk leaves X'X singular and those hazards are the least squares solution of smallest size
+        inv = np.linalg.pinv(risk, hermitian=True)
+
+        if self.smoothing_penalizer == 0:
+            # with no smoothing every death's hazard is inv(X'X + c I) x, so the deaths at one time add up
+            hazards = np.einsum('kij,kj->ki', inv, death_sum)
+        else:
+            # each death time's hazard is shrunk toward the previous death time's, so they go in order
+            hazards = np.zeros((K, d))
+            prev = np.zeros(d)
+            c2 = self.smoothing_penalizer
+            for k in range(K):
+                prev = np.dot(inv[k], death_sum[k] + c2 * prev)
+                hazards[k] = prev
+
+        # variance of each death's hazard is (inv x)^2, summed over the deaths at a time
+        d_end = np.r_[d_start[1:], len(Xd)]
+        death_gram = np.empty((K, d, d))
+        for k in range(K):
+            Xk = Xd[d_start[k]:d_end[k]]
+            death_gram[k] = np.dot(Xk.T, Xk)
+        variance = np.einsum('kij,kjl,kil->ki', inv, death_gram, inv)
+
+        return hazards, variance, times
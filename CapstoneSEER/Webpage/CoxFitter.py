@@ -0,0 +1,244 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+
+
+class CoxFitter(object):
+    ''' Cox proportional hazards model fit in numpy by Newton-Raphson, with Breslow or Efron ties.
+
+        the cohort is sorted once by survival time.  the risk set sums of every death time are reverse
+        cumulative sums over the sorted rows, and the risk set part of the Hessian is one weighted
+        X'X, so an iteration is a few passes over the data no matter how many death times there are.
+
+        the fitted model keeps the coefficients, the covariate means and the Breslow baseline cumulative
+        hazard.  it predicts like AalenModel (same frames, same expected survival rule) and saves to a
+        small .npz, so it can be used next to the Aalen model.
+    '''
+
+    def __init__(self, ties='efron', penalizer=0., tol=1e-9, max_iter=50, verbose=False):
+        ''' params: ties - 'efron' or 'breslow' handling of deaths at the same time
+                    penalizer - L2 penalty on the coefficients of the standardized covariates, per patient like
+                                lifelines' CoxPHFitter: the log partial likelihood divided by the number of
+                                patients less penalizer / 2 times the squared coefficients
+                    tol - stop when the log partial likelihood improves by less than this share of itself
+                    max_iter - most Newton steps
+                    verbose - prints the fit time
+        '''
+        if ties not in ('efron', 'breslow'):
+            raise ValueError("ties must be 'efron' or 'breslow'")
+        if penalizer < 0:
+            raise ValueError('penalizer parameter must be >= 0.')
+
+        self.ties = ties
+        self.penalizer = penalizer
+        self.tol = tol
+        self.max_iter = max_iter
+        self.verbose = verbose
+        self.meta = {}
+
+    def fit(self, dataframe, duration_col, event_col=None):
+        ''' fit(dataframe, duration_col, event_col)
+            params: dataframe - covariates plus the duration and event columns, one row per patient,
+                                i.e. ProjectSeer1.model_frame()
+                    duration_col - name of the survival time column, i.e. 'SRV_TIME_MON'
+                    event_col - name of the death observed column, i.e. 'CENSORED'. None means all observed.
+            returns: self, with params_ (coefficients by column) and baseline_cumulative_hazard_
+
+            constant columns, like the design's Intercept, are part of the baseline hazard and get a 0 coefficient
+        '''
+        t0 = time.perf_counter()
+
+        T = dataframe[duration_col].values.astype(np.float64)
+        E = dataframe[event_col].values.astype(bool) if event_col else np.ones(len(T), dtype=bool)
+        columns = [c for c in dataframe.columns if c not in (duration_col, event_col)]
+        X = dataframe[columns].values.astype(np.float64)
+
+        # standardize for a well conditioned Newton step, constant columns are left out.
+        # sample std like lifelines, so a penalizer shrinks the same standardized coefficients
+        mean, std = X.mean(axis=0), X.std(axis=0, ddof=1) if len(X) > 1 else np.zeros(X.shape[1])
+        used = std > 0
+        Z = (X[:, used] - mean[used]) / std[used]
+
+        beta, loglik, times, base_haz, iters = self._newton(Z, T, E)
+
+        coef = np.zeros(len(columns))
+        coef[used] = beta / std[used]
+        self._set(columns, coef, mean, times, np.cumsum(base_haz))
+        self.log_likelihood_ = loglik
+        self.iterations_ = iters
+
+        if self.verbose:
+            print('Cox model fit on {0} patients in {1} iterations, {2:.2f} sec'.format(len(T), iters, time.perf_counter() - t0))
+
+        return self
+
+    def _set(self, columns, coef, mean, timeline, cum_haz):
+        self.params_ = pd.Series(coef, index=list(columns))
+        self.means_ = pd.Series(mean, index=list(columns))
+        self.baseline_cumulative_hazard_ = pd.DataFrame(cum_haz, index=pd.Index(timeline), columns=['baseline hazard'])
+
+    def _newton(self, Z, T, E):
+        n, d = Z.shape
+
+        # one sort, ascending so the rows at or after a position are the risk set of its time
+        order = np.argsort(T, kind='mergesort')
+        Z, T, E = Z[order], T[order], E[order]
+
+        times, first = np.unique(T, return_index=True)
+        has_death = np.bincount(np.searchsorted(times, T[E]), minlength=len(times)) > 0
+        times, first = times[has_death], first[has_death]
+        K = len(times)
+
+        # death time of every death and of every risk set member's last death time at or before it
+        Zd = Z[E]
+        kd = np.searchsorted(times, T[E])
+        last_k = np.searchsorted(times, T, side='right') - 1
+        deaths = np.bincount(kd, minlength=K).astype(np.float64)
+        d_start = np.searchsorted(kd, np.arange(K))
+        zd_sum = Zd.sum(axis=0)
+
+        # the l-th of the d tied deaths at a time, efron takes l/d of the tied deaths out of the risk set
+        l = np.arange(len(kd)) - np.searchsorted(kd, kd)
+        frac = l / deaths[kd] if self.ties == 'efron' else np.zeros(len(kd))
+
+        def evaluate(beta, hessian=True):
+            xb = np.dot(Z, beta)
+            w = np.exp(xb - xb.max())           # shift for overflow, cancels in every ratio
+            shift = xb.max()
+
+            # reverse cumulative sums give the risk set sums at each death time
+            S0 = np.cumsum(w[::-1])[::-1][first]
+            S1 = np.cumsum((Z * w[:, np.newaxis])[::-1], axis=0)[::-1][first]
+
+            wd = w[E]
+            s0d = np.bincount(kd, weights=wd, minlength=K)
+            s1d = np.add.reduceat(Zd * wd[:, np.newaxis], d_start, axis=0)
+
+            phi = S0[kd] - frac * s0d[kd]
+            loglik = np.dot(zd_sum, beta) - np.sum(np.log(phi) + shift)
+
+            a1 = np.bincount(kd, weights=1. / phi, minlength=K)
+            b1 = np.bincount(kd, weights=frac / phi, minlength=K)
+            grad = zd_sum - (np.dot(a1, S1) - np.dot(b1, s1d))
+
+            if not hessian:
+                return loglik, grad, None
+
+            a2 = np.bincount(kd, weights=1. / phi ** 2, minlength=K)
+            b2 = np.bincount(kd, weights=frac / phi ** 2, minlength=K)
+            c2 = np.bincount(kd, weights=frac ** 2 / phi ** 2, minlength=K)
+
+            # risk set second moments: every row counts toward all death times up to its own time
+            A = np.where(last_k >= 0, np.cumsum(a1)[np.maximum(last_k, 0)], 0.)
+            info = np.dot(Z.T * (w * A), Z) - np.dot(Zd.T * (wd * b1[kd]), Zd)
+            info -= (np.dot(S1.T * a2, S1) - np.dot(S1.T * b2, s1d) - np.dot(s1d.T * b2, S1) + np.dot(s1d.T * c2, s1d))
+
+            return loglik, grad, info
+
+        # lifelines penalizes the mean log partial likelihood, on the summed one the penalty grows with n
+        pen = self.penalizer * n
+        beta = np.zeros(d)
+        loglik, grad, info = evaluate(beta)
+        loglik -= 0.5 * pen * np.dot(beta, beta)
+
+        iters = 0
+        for iters in range(1, self.max_iter + 1):
+            step = np.linalg.solve(info + pen * np.eye(d), grad - pen * beta)
+
+            # halve the step until the likelihood goes up, within rounding of a sum over the whole cohort
+            eps = 1e-12 * max(1., abs(loglik))
+            for _ in range(30):
+                new_loglik = evaluate(beta + step, hessian=False)[0] - 0.5 * pen * np.dot(beta + step, beta + step)
+                if new_loglik >= loglik - eps:
+                    break
+                step /= 2.
+
+            beta = beta + step
+            done = abs(new_loglik - loglik) < self.tol * max(1., abs(loglik))
+            loglik = new_loglik
+            if done:
+                break
+            _, grad, info = evaluate(beta)
+
+        # breslow baseline hazard at each death time, for standardized covariates at their means
+        w = np.exp(np.dot(Z, beta))
+        S0 = np.cumsum(w[::-1])[::-1][first]
+
+        return beta, loglik, times, deaths / S0, iters
+
+    def save(self, fname):
+        ''' save(fname)
+            write the model to a .npz file, see load()
+        '''
+        bch = self.baseline_cumulative_hazard_
+        with open(fname, 'wb') as f:
+            np.savez(f, columns=np.array(self.params_.index, dtype=str), params=self.params_.values, means=self.means_.values,
+                     timeline=bch.index.values, cumulative_hazard=bch.values[:, 0], ties=np.array(self.ties),
+                     meta=np.array(json.dumps(self.meta, default=str)))
+
+    @classmethod
+    def load(cls, fname):
+        ''' load(fname)
+            returns: CoxFitter read from a file written by save(), ready to predict
+        '''
+        with np.load(fname) as f:
+            model = cls(ties=str(f['ties']))
+            model._set(f['columns'], f['params'], f['means'], f['timeline'], f['cumulative_hazard'])
+            model.meta = json.loads(str(f['meta']))
+        return model
+
+    def _design(self, X):
+        if isinstance(X, pd.DataFrame):
+            return X[list(self.params_.index)].values.astype(np.float64), X.index
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        return X, np.arange(len(X))
+
+    def predict_partial_hazard(self, X):
+        ''' predict_partial_hazard(X)
+            params: X - dataframe with the covariate columns, or numpy array with the columns in fit order
+            returns: array of every patient's hazard relative to a patient at the covariate means
+        '''
+        X, _ = self._design(X)
+        return np.exp(np.dot(X - self.means_.values, self.params_.values))
+
+    def predict_cumulative_hazard(self, X):
+        ''' returns: dataframe of cumulative hazard, one row per death time and one column per patient '''
+        _, index = self._design(X)
+        bch = self.baseline_cumulative_hazard_
+        return pd.DataFrame(np.outer(bch.values[:, 0], self.predict_partial_hazard(X)), index=bch.index, columns=index)
+
+    def predict_survival_function(self, X):
+        ''' returns: dataframe of survival, one row per death time and one column per patient '''
+        return np.exp(-self.predict_cumulative_hazard(X))
+
+    def predict_expectation(self, X):
+        ''' returns: dataframe of the expected lifetime of every patient, area under the survival function '''
+        S = self.predict_survival_function(X)
+        # trapezoid rule over the death times, the same as AalenModel
+        dt = np.diff(S.index.values)
+        return pd.DataFrame(np.dot(dt, (S.values[1:] + S.values[:-1]) / 2), index=S.columns)
+
+    def predict_batch(self, X, horizons=[12, 60, 120], batch_size=10000):
+        ''' predict_batch(X, horizons, batch_size)
+            params: X - numpy array of patients, the columns in fit order
+                    horizons - months to return the survival probability at
+                    batch_size - number of patients computed at one time, bounds memory for large cohorts
+            returns: array of the expected survival of every patient and array of patients x horizons of
+                     survival, the same values as predict_expectation() and predict_survival_function()
+        '''
+        risk = self.predict_partial_hazard(X)
+        bch = self.baseline_cumulative_hazard_
+        t, H0 = bch.index.values.astype(np.float64), bch.values[:, 0]
+        dt = np.diff(t)
+
+        # position of the last death time at or before each horizon, -1 means before the first death
+        hz_idx = np.searchsorted(t, horizons, side='right') - 1
+        H_hz = np.where(hz_idx >= 0, H0[np.maximum(hz_idx, 0)], 0.)
+
+        expected = np.empty(len(risk))
+        for start in range(0, len(risk), batch_size):
+            S = np.exp(-np.outer(risk[start:start + batch_size], H0))
+            expected[start:start + batch_size] = np.dot((S[:, 1:] + S[:, :-1]) / 2, dt)
+
+        return expected, np.exp(-np.outer(risk, H_hz))
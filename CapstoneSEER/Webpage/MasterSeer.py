@@ -47,7 +47,8 @@ class MasterSeer(object):
 
         try:
             #initialize database
-            self.db_conn = sqlite3.connect(self.path + self.DB_NAME)
+            # the web app reads from its request threads and ModelRefresher builds seers on its own thread
+            self.db_conn = sqlite3.connect(self.path + self.DB_NAME, check_same_thread=False)
             self.db_cur = self.db_conn.cursor()
 
             if self.verbose:
@@ -132,6 +133,11 @@ class MasterSeer(object):
 
         return df
 
+    def db_fingerprint(self):
+        ''' returns: string that changes whenever the database file is rewritten, from its size and modified time '''
+        st = os.stat(self.path + self.DB_NAME)
+        return '{0}-{1}'.format(st.st_size, st.st_mtime_ns)
+
     def clean_recode_data(self, df, dependent_cutoffs):
         """ clean_recode_data(df)
             params: df - dataframe of seer data to clean
@@ -284,17 +290,17 @@ class MasterSeer(object):
 
         if len(dependent_cutoffs) > 0:
             # create new column of all NaN
-            df['SRV_BUCKET'] = np.NaN
+            df['SRV_BUCKET'] = np.nan
             # fill buckets
             last_cut = 0
             for x, cut in enumerate(dependent_cutoffs):
                 df.loc[(df.SRV_TIME_MON >= last_cut) & (df.SRV_TIME_MON < cut), 'SRV_BUCKET'] = x
                 last_cut = cut
             # assign all values larger than last cutoff to next bucket number
-            df['SRV_BUCKET'].fillna(len(dependent_cutoffs), inplace=True)
+            df['SRV_BUCKET'] = df['SRV_BUCKET'].fillna(len(dependent_cutoffs))
 
             dep_col = 'SRV_BUCKET'
-            df = df.drop('SRV_TIME_MON', 1)
+            df = df.drop('SRV_TIME_MON', axis=1)
         else:
             dep_col = 'SRV_TIME_MON'
 
@@ -303,7 +309,7 @@ class MasterSeer(object):
         #df = self.one_hot_data(df, cat_cols_to_encode)
 
         df['CENSORED'] = df.STAT_REC == 4
-        df = df.drop('STAT_REC', 1)
+        df = df.drop('STAT_REC', axis=1)
 
 
         df.replace([np.inf, -np.inf], np.nan)
@@ -311,7 +317,7 @@ class MasterSeer(object):
 
         exc = pd.ExcelWriter('clean.xlsx')
         df.to_excel(exc)
-        exc.save()
+        exc.close()
 
         return df, dep_col
 
@@ -0,0 +1,124 @@
+import os
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from AalenModel import AalenModel
+from CoxFitter import CoxFitter
+from ProjectSeer1 import ProjectSeer1
+from lifelines import AalenAdditiveFitter
+
+
+def fit_models(path, sample_size, cox):
+    ''' fit_models(path, sample_size, cox)
+        fits the web app's models on the current database, module level so it can run in a child process
+
+        params: path - data directory
+                sample_size - number of patients to fit on
+                cox - also fit the Cox model
+        returns: tuple of the database fingerprint the models were fit on, the AalenModel and the
+                 CoxFitter (None when cox is False)
+    '''
+    # the child only competes with the server for cpu when nothing else wants it
+    if hasattr(os, 'nice'):
+        os.nice(10)
+
+    seer = ProjectSeer1(path, verbose=False, sample_size=sample_size, saved=False)
+
+    # read before the data, a load that lands during the fit changes it and is picked up next poll
+    fp = seer.db_fingerprint()
+    X = seer.model_frame()
+
+    # same fit as ProjectSeer1.prepare_model()
+    aaf = AalenAdditiveFitter(fit_intercept=False).fit(X, 'SRV_TIME_MON', 'CENSORED')
+    model = AalenModel.from_fitter(aaf, {'db': fp, 'sample_size': sample_size})
+    cph = CoxFitter().fit(X, 'SRV_TIME_MON', 'CENSORED') if cox else None
+
+    return fp, model, cph
+
+
+class ModelRefresher(object):
+    ''' keeps the web app's ProjectSeer1 current with the database.
+
+        a background thread polls the database fingerprint and when it changes fits new models in a
+        child process, so the fit never holds the server's GIL or cpu.  the new models go on a new
+        ProjectSeer1 that replaces the old one in a single reference assignment: a request reads
+        .seer once and finishes on whichever one it got, and no request ever waits on a lock or a fit.
+
+        the precomputed grid and bootstrap replicates belong to the old data, the new seer runs
+        every patient through its fresh models until they are rebuilt offline and the app restarted.
+    '''
+
+    def __init__(self, seer, interval=60, verbose=True):
+        ''' params: seer - ProjectSeer1 serving requests now
+                    interval - seconds between checks of the database fingerprint
+                    verbose - prints when the models are refreshed
+        '''
+        self.seer = seer
+        self.interval = interval
+        self.verbose = verbose
+
+        self.fingerprint = seer.db_fingerprint()    # data the current models answer for
+        self.failed = None                          # fingerprint of a failed fit, not retried
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        ''' start polling in a daemon thread
+            returns: self
+        '''
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='ModelRefresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        ''' stop polling, waits for a refresh in progress to finish '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        last = None
+        while not self._stop.wait(self.interval):
+            try:
+                fp = self.seer.db_fingerprint()
+            except OSError:
+                # the database file is being replaced
+                last = None
+                continue
+
+            # only refresh once the fingerprint held for a whole interval, a load may still be writing
+            settled = fp == last
+            last = fp
+            if settled and fp != self.fingerprint and fp != self.failed:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.failed = fp
+                    print('ERROR refreshing the model, still serving the old one: {0}'.format(e))
+
+    def refresh(self):
+        ''' refresh()
+               fits new models on the current database in a child process and swaps them in
+
+            returns: the new ProjectSeer1
+        '''
+        old = self.seer
+
+        # spawn, a fork of a threaded server can copy a held lock into the child
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context('spawn')) as executor:
+            fp, model, cph = executor.submit(fit_models, old.path, old.sample_size, old.cox is not None).result()
+
+        seer = ProjectSeer1(old.path, verbose=old.verbose, sample_size=old.sample_size, saved=False)
+        seer.model, seer.cox = model, cph
+
+        # the swap, requests already running keep their reference to the old seer
+        self.seer = seer
+        self.fingerprint = fp
+
+        if self.verbose:
+            print('Model refreshed for database {0}'.format(fp))
+
+        return seer
@@ -5,12 +5,27 @@ import matplotlib.pyplot as plt
 import patsy as pt
 import os
 import random
+from SurvivalGrid import SurvivalGrid
+from AalenModel import AalenModel, AalenBootstrap, model_key
+from CoxFitter import CoxFitter
 from lifelines import AalenAdditiveFitter #, CoxPHFitter
 #from lifelines.utils import k_fold_cross_validation
 
 class ProjectSeer1(MasterSeer):
 
-    def __init__(self, path=r'../data/', verbose=True, sample_size = 5000):
+    # precomputed survival lookup written by the main ProjectSeer1.build_grid(), in the data directory
+    GRID_NAME = 'survival_grid.bin'
+
+    # compact fitted model written by the main ProjectSeer1.save_model(), in the data directory
+    MODEL_NAME = 'aalen_model.npz'
+
+    # Cox model written by the main ProjectSeer1.save_cox_model(), in the data directory
+    COX_NAME = 'cox_model.npz'
+
+    # bootstrap replicates written by the main ProjectSeer1.save_bootstrap(), in the data directory
+    BOOT_NAME = 'aalen_bootstrap.npz'
+
+    def __init__(self, path=r'../data/', verbose=True, sample_size = 5000, saved = True):
         # user supplied parameters
         self.verbose = verbose          # prints status messages
 
@@ -21,6 +36,37 @@ class ProjectSeer1(MasterSeer):
         self.model = None
         self.sample_size = sample_size
 
+        # load the saved model at start up, the first request only has to fit one if there is none.
+        # saved=False skips every saved file, ModelRefresher sets fresh models after the data changed
+        if saved and os.path.exists(self.path + self.MODEL_NAME):
+            self.model = AalenModel.load(self.path + self.MODEL_NAME)
+            if self.verbose:
+                print('Loaded model from {0}'.format(self.path + self.MODEL_NAME))
+
+        # the Cox model is a cheaper second model, one survival curve scaled by the patient's relative risk
+        self.cox = None
+        if saved and os.path.exists(self.path + self.COX_NAME):
+            self.cox = CoxFitter.load(self.path + self.COX_NAME)
+            if self.verbose:
+                print('Loaded Cox model from {0}'.format(self.path + self.COX_NAME))
+
+        # bootstrap replicates of the Aalen model, every patient's interval is one batched prediction
+        self.boot = None
+        if saved and os.path.exists(self.path + self.BOOT_NAME):
+            self.boot = AalenBootstrap.load(self.path + self.BOOT_NAME)
+            if self.verbose:
+                print('Loaded bootstrap replicates from {0}'.format(self.path + self.BOOT_NAME))
+
+        # patients on the precomputed grid are looked up instead of run through the model
+        self.grid = None
+        if saved and os.path.exists(self.path + self.GRID_NAME):
+            self.grid = SurvivalGrid(self.path + self.GRID_NAME)
+
+            # the grid must come from the saved model, otherwise answers would mix two fits
+            if self.model is None or self.grid.meta.get('model') != model_key(self.model):
+                print('Survival grid {0} was built from a different model, not using it'.format(self.path + self.GRID_NAME))
+                self.grid = None
+
 
     def __del__(self):
         super().__del__()
@@ -85,18 +131,23 @@ class ProjectSeer1(MasterSeer):
         return
 
 
-    def prepare_model(self):
+    def model_frame(self):
+        ''' returns: design matrix of a fresh sample joined with the SRV_TIME_MON and CENSORED columns the models fit on '''
 
         # get the data and clean it
         df, dep = self.load_and_clean_data()
 
-        # create the model
-        aaf = AalenAdditiveFitter()
-
         # define fields for the model
         modelspec = 'YR_BRTH + AGE_DX + RADIATN + HISTREC + ERSTATUS + PRSTATUS + BEHANAL + HST_STGA + NUMPRIMS + RACE'
         X = pt.dmatrix(modelspec, df, return_type='dataframe')
-        X = X.join(df[['SRV_TIME_MON','CENSORED']])
+        return X.join(df[['SRV_TIME_MON','CENSORED']])
+
+    def prepare_model(self):
+
+        X = self.model_frame()
+
+        # create the model, the design matrix has patsy's Intercept so lifelines adds none
+        aaf = AalenAdditiveFitter(fit_intercept=False)
 
         # fit the model
         if self.verbose:
@@ -107,14 +158,15 @@ class ProjectSeer1(MasterSeer):
         return aaf
 
 
-    def process_patient(self, pat_data, dyn_img):
-        ''' process_patient(pat_data)
+    def process_patient(self, pat_data, dyn_img, model='aalen'):
+        ''' process_patient(pat_data, dyn_img, model)
                fits the model if not already done, estimates survival of individual patient
                and displays patient's survival analysis graph.
 
             params: pat_data-numpy array of patient specific values for the following columns
                         ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS',
                          'PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS', 'RACE']
+                    model - 'aalen', or 'cox' to use the Cox model when one was saved
             returns: expected survival time in months
         '''
         try:
@@ -122,10 +174,24 @@ class ProjectSeer1(MasterSeer):
         except:
             pass
 
-        if not self.model:
-            self.model = self.prepare_model()
-
-        exp = self.model.predict_expectation(pat_data)
+        # answer from the precomputed grid when the patient is on it, otherwise use the model
+        use_cox = model == 'cox' and self.cox is not None
+        hit = self.grid.lookup(pat_data[0]) if self.grid is not None and not use_cox else None
+        if hit is not None:
+            exp = [[hit[0]]]
+        elif use_cox:
+            exp = self.cox.predict_expectation(pat_data)
+        else:
+            if not self.model:
+                self.model = self.prepare_model()
+
+            # lifelines 0.30 returns a series, AalenModel a dataframe
+            exp = np.asarray(self.model.predict_expectation(pat_data)).reshape(-1, 1)
+
+        # interval of the Aalen model's answer when the replicates were saved
+        ci = None
+        if self.boot is not None and not use_cox:
+            ci = self.boot.confidence_interval(pat_data)
 
         if self.verbose:
             cols = ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS','RACE']
@@ -136,8 +202,15 @@ class ProjectSeer1(MasterSeer):
             exp_srv_mnth = ('Expected survival: {0:.1f} months'.format(exp[0][0]))
 
             print(exp_srv_mnth)
-
-            self.model.predict_survival_function(pat_data).plot(legend=None, color="#3F5D7D");
+            if ci is not None:
+                print('95% interval: {0:.1f} to {1:.1f} months'.format(*ci[0].values[0]))
+
+            if hit is not None:
+                plt.step(np.r_[0, self.grid.knots], np.r_[1, hit[1]], where='post', color="#3F5D7D")
+            else:
+                (self.cox if use_cox else self.model).predict_survival_function(pat_data).plot(legend=None, color="#3F5D7D");
+            if ci is not None:
+                plt.fill_between(self.boot.timeline, ci[1].values[:, 0], ci[2].values[:, 0], step='post', color="#3F5D7D", alpha=0.2)
             plt.xlabel('Months')
             plt.ylabel('Survival Percentage')
             plt.title('Survival Analysis')
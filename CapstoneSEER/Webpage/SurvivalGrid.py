@@ -0,0 +1,168 @@
+import os
+import json
+import struct
+import numpy as np
+
+
+# covariates in MODELSPEC order, pat_data rows are an intercept followed by these
+COVARIATES = ['YR_BRTH','AGE_DX','RADIATN','HISTREC','ERSTATUS','PRSTATUS','BEHANAL','HST_STGA','NUMPRIMS','RACE']
+
+# codes the web calculator can send for the categorical covariates
+LEVELS = [('RADIATN', [0, 1]),
+          ('HISTREC', [0, 1, 2, 3]),
+          ('ERSTATUS', [0, 1, 2]),
+          ('PRSTATUS', [0, 1, 2]),
+          ('BEHANAL', [0, 1, 2, 3]),
+          ('HST_STGA', [0, 1, 2, 4]),
+          ('NUMPRIMS', [1, 2]),
+          ('RACE', [101, 102, 103, 104, 105, 107, 108, 109])]
+
+MAGIC = b'SEERGRID'
+
+
+class SurvivalGrid(object):
+    ''' precomputed expected survival and survival curves for every point of a covariate grid.
+
+        the grid is every combination of the categorical LEVELS, every whole year of age at diagnosis
+        and every diagnosis year in a range, birth year is diagnosis year minus age so only reachable
+        (age, birth year) pairs are stored.  a grid point's position is worked out from its values
+        directly, so a lookup is one read from a memory mapped file no matter how large the grid is.
+
+        file layout: MAGIC, 8 byte header length, json header, float32 expected survival of every
+        point, then uint8 survival at the header's knot months for every point (0-255 is 0-100%).
+    '''
+
+    def __init__(self, fname):
+        ''' params: fname - lookup file written by SurvivalGrid.build()
+        '''
+        with open(fname, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{0} is not a survival grid file'.format(fname))
+            size = struct.unpack('<Q', f.read(8))[0]
+            self.header = json.loads(f.read(size).decode())
+
+        h = self.header
+        self.meta = h.get('meta') or {}
+        offset = len(MAGIC) + 8 + size
+        n = h['points']
+        self.knots = np.array(h['knots'], dtype=np.float64)
+        self.expected = np.memmap(fname, dtype=np.float32, mode='r', offset=offset, shape=(n,))
+        self.curves = np.memmap(fname, dtype=np.uint8, mode='r', offset=offset + 4 * n, shape=(n, len(self.knots)))
+
+        # value -> position on every categorical axis, and the stride of every axis
+        self.levels = [(name, {float(v): i for i, v in enumerate(values)}) for name, values in h['levels']]
+        self.cols = [COVARIATES.index(name) + 1 for name, _ in h['levels']]
+        self.age0, self.num_ages = h['ages']
+        self.dx0, self.num_dx = h['dx_years']
+
+        shape = [len(pos) for _, pos in self.levels] + [self.num_ages, self.num_dx]
+        self.strides = np.cumprod([1] + shape[::-1])[:-1][::-1]
+
+    @staticmethod
+    def shape(levels, ages, dx_years):
+        return [len(values) for _, values in levels] + [len(ages), len(dx_years)]
+
+    @classmethod
+    def build(cls, predict_fnc, fname, ages=range(18, 100), dx_years=range(2009, 2014), levels=LEVELS,
+              knots=range(12, 241, 12), batch_size=100000, meta=None, verbose=True):
+        ''' build(predict_fnc, fname, ages, dx_years, levels, knots, batch_size, meta, verbose)
+            evaluate a fitted model over the whole grid and write the lookup file, run offline
+
+            params: predict_fnc - function(pat_data, horizons) returning the expected survival and the
+                                  survival at each horizon for every row, i.e. ProjectSeer1.predict_batch
+                    fname - lookup file to write, replaced when the new one is complete
+                    ages - whole years of age at diagnosis, consecutive
+                    dx_years - years of diagnosis, consecutive
+                    levels - list of (covariate, list of codes) for the categorical covariates
+                    knots - months the survival curve is stored at
+                    batch_size - number of grid points evaluated at one time
+                    meta - dict stored in the header, i.e. the model's registry key so a stale grid can be detected
+            returns: number of grid points
+        '''
+        ages, dx_years, knots = list(ages), list(dx_years), list(knots)
+        shape = cls.shape(levels, ages, dx_years)
+        n = int(np.prod(shape))
+
+        header = json.dumps({'levels': [[name, list(values)] for name, values in levels], 'ages': [ages[0], len(ages)],
+                             'dx_years': [dx_years[0], len(dx_years)], 'knots': knots, 'points': n,
+                             'meta': meta}).encode()
+
+        tmp = '{0}.{1}.tmp'.format(fname, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            offset = f.tell()
+            # size the file for both arrays up front so they can be memory mapped for writing
+            f.truncate(offset + 4 * n + n * len(knots))
+
+        expected = np.memmap(tmp, dtype=np.float32, mode='r+', offset=offset, shape=(n,))
+        curves = np.memmap(tmp, dtype=np.uint8, mode='r+', offset=offset + 4 * n, shape=(n, len(knots)))
+
+        axes = [np.asarray(values, dtype=np.float64) for _, values in levels] + [np.asarray(ages, dtype=np.float64),
+                                                                                 np.asarray(dx_years, dtype=np.float64)]
+        cat_cols = [COVARIATES.index(name) + 1 for name, _ in levels]
+
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            pos = np.unravel_index(np.arange(start, stop), shape)
+
+            X = np.ones((stop - start, len(COVARIATES) + 1))
+            for col, axis, p in zip(cat_cols, axes, pos):
+                X[:, col] = axis[p]
+            age = axes[-2][pos[-2]]
+            X[:, COVARIATES.index('AGE_DX') + 1] = age
+            X[:, COVARIATES.index('YR_BRTH') + 1] = axes[-1][pos[-1]] - age
+
+            exp, surv = predict_fnc(X, knots)
+            expected[start:stop] = exp
+            # the additive model can give survival above 1 where cumulative hazards go negative, store it as 1
+            curves[start:stop] = np.rint(np.clip(surv, 0, 1) * 255)
+
+            if verbose:
+                print("Grid: {0} of {1}".format(stop, n), end='\r', flush=True)
+
+        expected.flush()
+        curves.flush()
+        del expected, curves
+        os.replace(tmp, fname)
+
+        if verbose:
+            print("\nSurvival grid of {0} points saved to {1}".format(n, fname))
+
+        return n
+
+    def index(self, row):
+        ''' index(row)
+            params: row - one pat_data row, intercept first then the covariates in COVARIATES order
+            returns: position of the row in the grid, None if any value is off the grid
+        '''
+        idx = 0
+        for (name, pos), col, stride in zip(self.levels, self.cols, self.strides):
+            p = pos.get(float(row[col]))
+            if p is None:
+                return None
+            idx += p * stride
+
+        age = row[COVARIATES.index('AGE_DX') + 1]
+        dx = row[COVARIATES.index('YR_BRTH') + 1] + age
+        if not np.isfinite(dx) or age != int(age) or dx != int(dx):
+            return None
+
+        a, d = int(age) - self.age0, int(dx) - self.dx0
+        if not (0 <= a < self.num_ages and 0 <= d < self.num_dx):
+            return None
+
+        return int(idx + a * self.strides[-2] + d)
+
+    def lookup(self, row):
+        ''' lookup(row)
+            params: row - one pat_data row, see index()
+            returns: expected survival in months and survival at the knot months,
+                     None if the row is off the grid and has to go to the model
+        '''
+        i = self.index(row)
+        if i is None:
+            return None
+
+        return float(self.expected[i]), self.curves[i] / 255.0
@@ -2,6 +2,7 @@
 import MasterSeer
 import sqlite3
 from ProjectSeer1 import ProjectSeer1
+from ModelRefresher import ModelRefresher
 import numpy as np
 import matplotlib.pyplot as plt
 import patsy as pt
@@ -11,7 +12,7 @@ import os
 import pandas as pd
 
 app = Flask(__name__)
-seer = None
+refresher = None        # ModelRefresher holding the current seer, set in __main__
 
 @app.route("/")
 def main():
@@ -45,7 +46,11 @@ def showResults():
     dyn_img = str('./static/' + str(random.random()) + '.png')
     usr_var_array = np.array([[1.,_yrbrth,_agedx,_radtn,_histology,_erstatus,_prstatus,_tumorbehavior,_tumorstage,_numprims,_race]], dtype=np.float64)
     # seer = ProjectSeer1(sample_size = 1000, verbose=True)
-    res = seer.process_patient(usr_var_array, dyn_img)
+    # optional form field, the calculator uses the Aalen model unless 'cox' is asked for
+    _model = request.form.get('model', 'aalen')
+    # read the seer once, a refresh swapping in a new one while this runs does not affect this request
+    seer = refresher.seer
+    res = seer.process_patient(usr_var_array, dyn_img, _model)
     srv_mnth = str(res)
     srv_prd = srv_mnth.index('.') + 3
     red_srv_mnth = srv_mnth[:srv_prd]
@@ -56,4 +61,6 @@ if __name__ == "__main__":
     test = np.array([[ 1., 1961., 54., 0, 0., 2., 1., 0., 4., 2., 101.]])
     x = seer.process_patient(test, 'test.png')
     print (x)
+    # refit in the background when the database changes, checked every minute
+    refresher = ModelRefresher(seer, interval=60, verbose=True).start()
     app.run()
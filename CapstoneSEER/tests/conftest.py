@@ -0,0 +1,36 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# the modules sit flat in CapstoneSEER, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_frame(n=2000, seed=0):
+    ''' make_frame(n, seed)
+        returns: synthetic model frame laid out like ProjectSeer1.model_frame(), patsy's Intercept, a few
+                 covariates and whole month SRV_TIME_MON and CENSORED (1 is a death) columns
+    '''
+    rng = np.random.RandomState(seed)
+
+    X = pd.DataFrame({'Intercept': 1.,
+                      'AGE_DX': rng.normal(60, 12, n).round(),
+                      'HST_STGA': rng.randint(0, 5, n).astype(float),
+                      'ERSTATUS': rng.randint(1, 3, n).astype(float),
+                      'RADIATN': rng.randint(0, 2, n).astype(float)})
+
+    hazard = 0.004 * np.exp(0.03 * (X.AGE_DX - 60) + 0.4 * X.HST_STGA - 0.3 * (X.ERSTATUS == 2))
+    death = rng.exponential(1 / hazard)
+    censor = rng.uniform(0, 240, n)
+
+    X['SRV_TIME_MON'] = np.ceil(np.minimum(death, censor))
+    X['CENSORED'] = (death <= censor).astype(int)
+
+    return X
+
+
+@pytest.fixture(scope='session')
+def frame():
+    return make_frame()
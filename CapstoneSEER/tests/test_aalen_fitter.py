@@ -0,0 +1,38 @@
+import numpy as np
+from lifelines import AalenAdditiveFitter
+from AalenFitter import AalenFitter
+from AalenModel import AalenModel
+
+
+def test_matches_lifelines(frame):
+    # lifelines keeps a patient censored in a month with no death at risk to the end, without them
+    # the two risk sets are the same
+    T, E = frame.SRV_TIME_MON.values, frame.CENSORED.values.astype(bool)
+    frame = frame[np.isin(T, T[E])]
+
+    aaf = AalenAdditiveFitter(fit_intercept=False).fit(frame, 'SRV_TIME_MON', 'CENSORED')
+    model = AalenFitter().fit(frame, 'SRV_TIME_MON', 'CENSORED')
+
+    assert list(model.cumulative_hazards_.columns) == list(aaf.cumulative_hazards_.columns)
+    assert np.array_equal(model.timeline, aaf.cumulative_hazards_.index.values)
+
+    X = frame.drop(['SRV_TIME_MON', 'CENSORED'], axis=1)
+    assert np.allclose(model.predict_survival_function(X).values, aaf.predict_survival_function(X).values, atol=1e-6)
+    assert np.allclose(model.hazards_.values, aaf.hazards_.values, rtol=1e-5, atol=1e-8)
+
+
+def test_intercept(frame):
+    # patsy's Intercept is the intercept, no second column of ones and no singular X'X
+    model = AalenFitter(coef_penalizer=0.).fit(frame, 'SRV_TIME_MON', 'CENSORED')
+    assert list(model.cumulative_hazards_.columns).count('Intercept') == 1
+    assert 'baseline' not in model.cumulative_hazards_.columns
+    assert np.isfinite(model.cumulative_hazards_.values).all()
+
+    # without it the fitter adds its own, and predicts the same
+    other = AalenFitter().fit(frame.drop('Intercept', axis=1), 'SRV_TIME_MON', 'CENSORED')
+    assert other.cumulative_hazards_.columns[-1] == 'baseline'
+
+    X = frame.iloc[:20]
+    assert np.allclose(model.predict_expectation(X).values, other.predict_expectation(X).values)
+    assert np.allclose(AalenModel.from_fitter(other).predict_expectation(X.values[:, 1:5]).values,
+                       other.predict_expectation(X).values)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from lifelines import CoxPHFitter
+from CoxFitter import CoxFitter
+
+
+@pytest.mark.parametrize('penalizer', [0., 0.1])
+def test_matches_lifelines(frame, penalizer):
+    # the Intercept is constant, CoxFitter gives it a 0 coefficient and lifelines cannot fit it
+    cox = CoxFitter(penalizer=penalizer).fit(frame, 'SRV_TIME_MON', 'CENSORED')
+    cph = CoxPHFitter(penalizer=penalizer).fit(frame.drop('Intercept', axis=1), 'SRV_TIME_MON', 'CENSORED')
+
+    assert cox.params_['Intercept'] == 0
+    assert np.allclose(cox.params_[cph.params_.index], cph.params_, rtol=1e-4, atol=1e-6)
+
+    X = frame.drop(['SRV_TIME_MON', 'CENSORED'], axis=1).iloc[:50]
+    assert np.allclose(cox.predict_partial_hazard(X), cph.predict_partial_hazard(X), rtol=1e-4)
+    assert np.allclose(cox.baseline_cumulative_hazard_.values[:, 0],
+                       cph.baseline_cumulative_hazard_.loc[cox.baseline_cumulative_hazard_.index].values[:, 0], rtol=1e-3)
+
+
+def test_save_load(frame, tmp_path):
+    cox = CoxFitter().fit(frame, 'SRV_TIME_MON', 'CENSORED')
+    fname = str(tmp_path / 'cox.npz')
+    cox.save(fname)
+
+    X = frame.drop(['SRV_TIME_MON', 'CENSORED'], axis=1).iloc[:50]
+    loaded = CoxFitter.load(fname)
+    assert np.allclose(loaded.predict_expectation(X).values, cox.predict_expectation(X).values)
+    assert np.allclose(loaded.predict_batch(X.values)[0], cox.predict_expectation(X).values[:, 0])
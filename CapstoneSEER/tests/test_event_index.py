@@ -0,0 +1,31 @@
+import numpy as np
+from lifelines import KaplanMeierFitter
+from lifelines.statistics import logrank_test, multivariate_logrank_test
+from EventIndex import EventIndex
+
+
+def test_kaplan_meier(frame):
+    curves = EventIndex(frame.SRV_TIME_MON, frame.CENSORED).kaplan_meier(frame.HST_STGA)
+
+    for label in curves.labels:
+        group = frame[frame.HST_STGA == label]
+        kmf = KaplanMeierFitter().fit(group.SRV_TIME_MON, group.CENSORED)
+        sf, ci = curves.curve(label)
+
+        assert np.allclose(sf.index.values, kmf.survival_function_.index.values)
+        assert np.allclose(sf.values[:, 0], kmf.survival_function_.values[:, 0])
+        assert list(ci.columns) == [c.replace('KM_estimate', str(label)) for c in kmf.confidence_interval_.columns]
+        assert np.allclose(ci.values, kmf.confidence_interval_.values)
+
+
+def test_logrank(frame):
+    res = EventIndex(frame.SRV_TIME_MON, frame.CENSORED).logrank(frame.HST_STGA)
+
+    lr = multivariate_logrank_test(frame.SRV_TIME_MON, frame.HST_STGA, frame.CENSORED)
+    assert np.isclose(res['statistic'], lr.test_statistic)
+    assert res['df'] == frame.HST_STGA.nunique() - 1
+
+    a, b = frame[frame.HST_STGA == 0], frame[frame.HST_STGA == 1]
+    pair = logrank_test(a.SRV_TIME_MON, b.SRV_TIME_MON, a.CENSORED, b.CENSORED)
+    assert np.isclose(res['pairwise_statistic'].loc[0., 1.], pair.test_statistic)
+    assert np.isclose(res['pairwise_p'].loc[0., 1.], pair.p_value)
@@ -0,0 +1,27 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from FlatForest import FlatForest
+
+
+def fit_forest(frame):
+    X = frame[['AGE_DX', 'HST_STGA', 'ERSTATUS', 'RADIATN']].values
+    y = np.digitize(frame.SRV_TIME_MON.values, [12, 60])
+    return RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(X, y), X
+
+
+def test_matches_forest(frame):
+    rf, X = fit_forest(frame)
+    ff = FlatForest(rf)
+
+    assert np.allclose(ff.predict_proba(X, batch_size=333), rf.predict_proba(X))
+    assert (ff.predict(X) == rf.predict(X)).all()
+
+
+def test_save_load(frame, tmp_path):
+    rf, X = fit_forest(frame)
+    fname = str(tmp_path / 'forest.npz')
+    FlatForest(rf).save(fname)
+
+    ff = FlatForest.load(fname)
+    assert ff.n_features_ == X.shape[1]
+    assert np.allclose(ff.predict_proba(X), rf.predict_proba(X))
@@ -0,0 +1,37 @@
+from ResultLog import ResultLog
+
+
+def rec(combo, f1, error=None):
+    return {'style': 'Ridge', 'combo': combo, 'f1': f1, 'error': error}
+
+
+def test_resume(tmp_path):
+    fname = str(tmp_path / 'models.log')
+    settings = {'db': 'abc', 'sample_size': 1000, 'seed': 0}
+
+    ResultLog(fname, settings).append([rec(['AGE_DX'], .5), rec(['RACE'], None, 'ValueError')])
+
+    # failed tasks run again, and a log for other settings resumes nothing
+    done = ResultLog(fname, dict(settings)).load_done()
+    assert list(done) == [ResultLog.key('Ridge', ['AGE_DX'])]
+    assert ResultLog(fname, dict(settings, seed=1)).load_done() == {}
+
+    # the last record of a task wins
+    ResultLog(fname, settings).append([rec(['AGE_DX'], .7)])
+    assert ResultLog(fname, settings).load_done()[ResultLog.key('Ridge', ['AGE_DX'])]['f1'] == .7
+    assert [r['f1'] for r in ResultLog(fname).top(2)] == [.7, .5]
+
+
+def test_partial_line(tmp_path):
+    fname = str(tmp_path / 'models.log')
+    log = ResultLog(fname, {'seed': 0})
+    log.append([rec(['AGE_DX'], .5)])
+
+    # a run killed mid write
+    with open(fname, 'a') as f:
+        f.write('{"style": "Ridge", "com')
+
+    log.append([rec(['RACE'], .6)])
+
+    assert sorted(log.load_done()) == sorted([ResultLog.key('Ridge', ['AGE_DX']), ResultLog.key('Ridge', ['RACE'])])
+    assert len(list(log)) == 2
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from lifelines import AalenAdditiveFitter
+from lifelines.utils import concordance_index as lifelines_concordance
+from AalenFitter import AalenFitter
+from CoxFitter import CoxFitter
+from SurvivalScore import concordance_index, cross_validate
+
+
+@pytest.mark.parametrize('fitter, params, intercept', [
+    (AalenFitter, {}, True),
+    (AalenAdditiveFitter, {'fit_intercept': False}, True),
+    # lifelines adds its own intercept to the frame it predicts
+    (AalenAdditiveFitter, {}, False),
+    (CoxFitter, {}, True)])
+def test_cross_validate(frame, fitter, params, intercept):
+    if not intercept:
+        frame = frame.drop('Intercept', axis=1)
+
+    scores = cross_validate(fitter, frame, params=params, k=3, verbose=False)
+
+    assert list(scores.columns) == ['c_index', 'ibs'] and len(scores) == 3
+    assert (scores.c_index > 0.6).all()
+    assert (scores.ibs > 0).all() and (scores.ibs < 0.25).all()
+
+
+def test_concordance_index(frame):
+    rng = np.random.RandomState(1)
+    # ties in both the times and the predictions
+    predicted = frame.SRV_TIME_MON.values + rng.randint(-30, 30, len(frame))
+
+    expected = lifelines_concordance(frame.SRV_TIME_MON, predicted, frame.CENSORED)
+    assert np.isclose(concordance_index(frame.SRV_TIME_MON, predicted, frame.CENSORED), expected)